@@ -12,21 +12,52 @@
 # -----------------------------------------------
 
 import os
-import re
 import io
-import time
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 import cv2
-import requests
 import plotly.express as px
 
-from io import BytesIO
-from PIL import Image, ImageOps
 from streamlit_gsheets import GSheetsConnection
 from streamlit_option_menu import option_menu
 
+from biocurate.dataset import preparar_base, ler_base, formatar_data
+from biocurate.search import normalizar_codigo, buscar_por_tombo, buscar_imagens_por_tombo, buscar_por_taxon, separar_blocos
+from biocurate.images import (
+    MENSAGENS,
+    download_drive_image,
+    miniatura_drive,
+    preparar_imagem_para_plantnet,
+    identificar_com_plantnet,
+    mensagem_erro,
+    redigir_api_key,
+)
+from biocurate.checklist import checklist_de_arquivo, checklist_local, revisar
+from biocurate.exportacao import FORMATOS, MAX_LINHAS_XLSX, exportar_cacheado, formatos_disponiveis
+from biocurate.graficos import MAX_BARRAS, grafico_contagem
+from biocurate.hash_imagem import indice_hashes
+from biocurate.index import indice_base
+from biocurate.prefetch import aguardar, chave_identificacao
+from biocurate.recorte import recortar_exsicata
+from biocurate.reports import contar_familias, relatorio_familia, relatorio_genero, relatorio_especie
+from biocurate import metrics, profiler, tracing
+from biocurate.ui import (
+    id_sessao,
+    eh_admin,
+    painel_diagnostico,
+    botoes_exportacao,
+    guardar_resultado,
+    resultado_guardado,
+    tabela_paginada,
+    painel_repetidas,
+    exsicatas_parecidas,
+    resumo_links,
+    planilha_imagens,
+    antecipar_imagens,
+)
+
 
 # -----------------------------------------------
 # General Configuration
@@ -37,1081 +68,1333 @@ st.set_page_config(page_title="BioCurate",
     layout="centered"
     )
 
-# Toggle for language selection (PT as default)
-col1, col2, col3 = st.columns([5, 1, 1])
-with col3:
-    is_en = st.toggle("PT / EN", value=False)
-
-# If the selected language is English, redirect to the translated page
-if is_en:
-    from en_app import run as run_en
-    run_en()
-    st.stop()  # Stop execution of the code below
-
-# Session variables
-if 'df' not in st.session_state:
-    st.session_state.df = None
-if 'barcode_col' not in st.session_state:
-    st.session_state.barcode_col = 'collectionCode'
-if 'img_folder' not in st.session_state:
-    st.session_state.img_folder = ''
-
-# -----------------------------------------------
-# Responsive horizontal menu
-# -----------------------------------------------
-
-# Create horizontal navigation bar
-selected = option_menu(
-    None,
-    ["Início", "Base", "Relatório", "Busca", "Imagem"],
-    icons=["house", "database", "bar-chart", "search", "image"],
-    menu_icon="cast",
-    default_index=0,
-    orientation="horizontal",
-    styles={
-    "container": {
-        "padding": "0!important",
-        "background-color": "#00A8A8"  # Azul esverdeado - lateral da logo
-    },
-    "icon": {
-        "color": "#FFFFFF",
-        "font-size": "20px"
-    },
-    "nav-link": {
-        "font-size": "18px",
-        "text-align": "center",
-        "margin": "0px",
-        "color": "#FFFFFF",
-        "--hover-color": "#B2DFDB"  # Verde-água suave
+# Timing spans of this run are grouped per session (see biocurate.tracing)
+# and exported as metrics when BIOCURATE_METRICS_PORT/FILE are set
+metrics.iniciar_exportador()
+tracing.iniciar_rerun(id_sessao())
+profiler.iniciar(id_sessao())
+
+# The run ends in the finally below, also when Streamlit interrupts it
+# (st.stop, st.rerun, a widget changed mid-run): otherwise the sampling
+# thread and the span state of the run would be left behind
+try:
+    # Toggle for language selection (PT as default)
+    col1, col2, col3 = st.columns([5, 1, 1])
+    with col3:
+        is_en = st.toggle("PT / EN", value=False)
+
+    # If the selected language is English, redirect to the translated page
+    if is_en:
+        from en_app import run as run_en
+        run_en()
+        st.stop()  # Stop execution of the code below
+
+    # Session variables
+    if 'df' not in st.session_state:
+        st.session_state.df = None
+    if 'barcode_col' not in st.session_state:
+        st.session_state.barcode_col = 'collectionCode'
+    if 'img_folder' not in st.session_state:
+        st.session_state.img_folder = ''
+
+    # -----------------------------------------------
+    # Responsive horizontal menu
+    # -----------------------------------------------
+
+    # Create horizontal navigation bar
+    selected = option_menu(
+        None,
+        ["Início", "Base", "Relatório", "Busca", "Imagem"],
+        icons=["house", "database", "bar-chart", "search", "image"],
+        menu_icon="cast",
+        default_index=0,
+        orientation="horizontal",
+        styles={
+        "container": {
+            "padding": "0!important",
+            "background-color": "#00A8A8"  # Azul esverdeado - lateral da logo
+        },
+        "icon": {
+            "color": "#FFFFFF",
+            "font-size": "20px"
+        },
+        "nav-link": {
+            "font-size": "18px",
+            "text-align": "center",
+            "margin": "0px",
+            "color": "#FFFFFF",
+            "--hover-color": "#B2DFDB"  # Verde-água suave
+        },
+        "nav-link-selected": {
+            "background-color": "#388E3C"  # Verde escuro
+        },
     },
-    "nav-link-selected": {
-        "background-color": "#388E3C"  # Verde escuro
-    },
-},
-)
-
-# -----------------------------------------------
-# Home Page
-# -----------------------------------------------
-if selected == "Início":
-    col1, col2 = st.columns([1, 2])
-    with col1:
-        st.image("logo.png", width=200)
-    with col2:
-        st.markdown("""
-            O **BioCurate** é uma ferramenta voltada à curadoria de coleções biológicas, com ênfase em herbários.  
-            Melhora a acessibilidade e a precisão na organização de dados, permitindo o cruzamento de informações por leitura de códigos de barras ou entrada manual.  
-            Também integra visualização de imagens e consultas externas a bases como GBIF, Reflora e SpeciesLink.
-            """)
+    )
+    tracing.definir_pagina(selected)
+
+    # -----------------------------------------------
+    # Home Page
+    # -----------------------------------------------
+    if selected == "Início":
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            st.image("logo.png", width=200)
+        with col2:
+            st.markdown("""
+                O **BioCurate** é uma ferramenta voltada à curadoria de coleções biológicas, com ênfase em herbários.  
+                Melhora a acessibilidade e a precisão na organização de dados, permitindo o cruzamento de informações por leitura de códigos de barras ou entrada manual.  
+                Também integra visualização de imagens e consultas externas a bases como GBIF, Reflora e SpeciesLink.
+                """)
     
-    st.markdown("""
-        ##### Recursos do BioCurate
+        st.markdown("""
+            ##### Recursos do BioCurate
 
-        1. **📦 Base de Dados**  
-        Carregue automaticamente a planilha oficial do HUAM ou envie sua própria base em formato CSV (padrão Darwin Core). Ela será usada em todas as buscas.
+            1. **📦 Base de Dados**  
+            Carregue automaticamente a planilha oficial do HUAM ou envie sua própria base em formato CSV (padrão Darwin Core). Ela será usada em todas as buscas.
 
-        2. **📊 Relatório**  
-        Gere relatórios por família, gênero ou espécie, com contagem de amostras, lista de táxons e locais de armazenamento.
+            2. **📊 Relatório**  
+            Gere relatórios por família, gênero ou espécie, com contagem de amostras, lista de táxons e locais de armazenamento.
 
-        3. **📋 Buscar Dados**  
-        Consulte dados detalhados da amostra pelo número de tombo ou código de barras: nome científico, local de coleta e armazenamento.
+            3. **📋 Buscar Dados**  
+            Consulte dados detalhados da amostra pelo número de tombo ou código de barras: nome científico, local de coleta e armazenamento.
 
-        4. **📷 Buscar Imagem**  
-        Visualize a exsicata e envie para o Pl@ntNet para identificação automática da espécie. Funciona apenas com amostras do HUAM, vinculadas ao Google Drive institucional.      
-    """)
+            4. **📷 Buscar Imagem**  
+            Visualize a exsicata e envie para o Pl@ntNet para identificação automática da espécie. Funciona apenas com amostras do HUAM, vinculadas ao Google Drive institucional.      
+        """)
        
-    st.markdown("""
-        ### Sobre o BioCurate
-        Este projeto é uma iniciativa do **Herbário da Universidade Federal do Amazonas (HUAM)** e faz parte da pesquisa de doutorado de **Deisy Saraiva**, vinculada ao **Programa de Pós-Graduação BIONORTE – Rede de Biodiversidade e Biotecnologia da Amazônia Legal**. A pesquisa foca no uso de tecnologias para ampliar o acesso e a curadoria de coleções científicas, principalmente do Herbário do HUAM.
-
-        Contato: deisysaraiva@ufam.edu.br
+        st.markdown("""
+            ### Sobre o BioCurate
+            Este projeto é uma iniciativa do **Herbário da Universidade Federal do Amazonas (HUAM)** e faz parte da pesquisa de doutorado de **Deisy Saraiva**, vinculada ao **Programa de Pós-Graduação BIONORTE – Rede de Biodiversidade e Biotecnologia da Amazônia Legal**. A pesquisa foca no uso de tecnologias para ampliar o acesso e a curadoria de coleções científicas, principalmente do Herbário do HUAM.
 
-        - [Acesse o site do HUAM](http://huam.site)
-        - [A Coleção no site institucional da UFAM](https://www.icb.ufam.edu.br/colecoes/huam.html)
+            Contato: deisysaraiva@ufam.edu.br
 
-        ---
+            - [Acesse o site do HUAM](http://huam.site)
+            - [A Coleção no site institucional da UFAM](https://www.icb.ufam.edu.br/colecoes/huam.html)
 
-        ### Sobre a Identificação Automática com Pl@ntNet
+            ---
 
-        BioCurate integra a identificação automática de espécies por imagem via API Pl@ntNet.  
-        Os resultados são gerados por inteligência artificial e devem ser validados por um especialista.  
-        Mais informações em plantnet.org.  
+            ### Sobre a Identificação Automática com Pl@ntNet
 
-        ---
+            BioCurate integra a identificação automática de espécies por imagem via API Pl@ntNet.  
+            Os resultados são gerados por inteligência artificial e devem ser validados por um especialista.  
+            Mais informações em plantnet.org.  
 
-        ### Sobre o padrão Darwin Core
+            ---
 
-        O **Darwin Core** é um padrão internacional para compartilhamento de dados sobre biodiversidade. Ele define termos recomendados que garantem consistência e interoperabilidade entre bases de dados.
+            ### Sobre o padrão Darwin Core
 
-        - [Repositório Darwin Core](https://github.com/tdwg/dwc)
-        - [Padrão Darwin Core](https://dwc.tdwg.org/terms)
-        - [Modelo de Cabeçalho Darwin Core](https://splink.cria.org.br/digir/darwin2.xsd)
-        - [Vídeo explicativo (YouTube)](https://www.youtube.com/embed/YC0DfctXs5Q)
-    """)
+            O **Darwin Core** é um padrão internacional para compartilhamento de dados sobre biodiversidade. Ele define termos recomendados que garantem consistência e interoperabilidade entre bases de dados.
 
-    with st.expander("Descrição dos Metadados Necessária na Base"):
-        st.markdown("""
-            A base de dados a ser carregada deve seguir o padrão **Darwin Core**, adotando campos fundamentais para curadoria:
-
-            - **collectionCode:** Código único da coleção (número do tombo HUAM).
-            - **catalogNumber:** Número de catálogo interno da amostra.
-            - **recordedBy:** Nome do coletor principal responsável pela amostra.
-            - **addCollector:** Coletores adicionais envolvidos na coleta.
-            - **recordNumber:** Número atribuído pelo coletor à amostra.
-            - **dayCollected / monthCollected / yearCollected:** Datas exatas de coleta da amostra.
-            - **family:** Família botânica a que pertence a amostra.
-            - **scientificName:** Nome científico completo (gênero + espécie + infraespécie, se aplicável).
-            - **genus:** Nome do gênero botânico.
-            - **specificEpithet:** Epíteto específico (nome da espécie).
-            - **scientificNameAuthorship:** Autoridade taxonômica que descreveu o táxon.
-            - **dynamicProperties:** Localização física da amostra na coleção (ex.: armário, prateleira).
-
-            Esses campos garantem que a base de dados seja compatível com padrões de intercâmbio, como **GBIF**, **SpeciesLink** e **Reflora**, e viabilizam sua utilização em **sistemas digitais** como o BioCurate.
+            - [Repositório Darwin Core](https://github.com/tdwg/dwc)
+            - [Padrão Darwin Core](https://dwc.tdwg.org/terms)
+            - [Modelo de Cabeçalho Darwin Core](https://splink.cria.org.br/digir/darwin2.xsd)
+            - [Vídeo explicativo (YouTube)](https://www.youtube.com/embed/YC0DfctXs5Q)
         """)
-    
-    #Supported by
-    st.markdown("---")
-    st.markdown(" ##### Apoio")
-    st.image("SupportedBy.png", use_container_width=True)
-
-# -----------------------------------------------
-# Data Base Page
-# -----------------------------------------------
-elif selected == "Base":
-    st.subheader("📦 Base de Dados")
-    st.subheader("Conexão automática com Base de Dados HUAM")
 
-    # Automatic connection to the HUAM huam
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    df_base = conn.read(worksheet="Metadata", ttl="10m")
+        with st.expander("Descrição dos Metadados Necessária na Base"):
+            st.markdown("""
+                A base de dados a ser carregada deve seguir o padrão **Darwin Core**, adotando campos fundamentais para curadoria:
+
+                - **collectionCode:** Código único da coleção (número do tombo HUAM).
+                - **catalogNumber:** Número de catálogo interno da amostra.
+                - **recordedBy:** Nome do coletor principal responsável pela amostra.
+                - **addCollector:** Coletores adicionais envolvidos na coleta.
+                - **recordNumber:** Número atribuído pelo coletor à amostra.
+                - **dayCollected / monthCollected / yearCollected:** Datas exatas de coleta da amostra.
+                - **family:** Família botânica a que pertence a amostra.
+                - **scientificName:** Nome científico completo (gênero + espécie + infraespécie, se aplicável).
+                - **genus:** Nome do gênero botânico.
+                - **specificEpithet:** Epíteto específico (nome da espécie).
+                - **scientificNameAuthorship:** Autoridade taxonômica que descreveu o táxon.
+                - **dynamicProperties:** Localização física da amostra na coleção (ex.: armário, prateleira).
+
+                Esses campos garantem que a base de dados seja compatível com padrões de intercâmbio, como **GBIF**, **SpeciesLink** e **Reflora**, e viabilizam sua utilização em **sistemas digitais** como o BioCurate.
+            """)
+    
+        #Supported by
+        st.markdown("---")
+        st.markdown(" ##### Apoio")
+        st.image("SupportedBy.png", use_container_width=True)
+
+    # -----------------------------------------------
+    # Data Base Page
+    # -----------------------------------------------
+    elif selected == "Base":
+        st.subheader("📦 Base de Dados")
+        st.subheader("Conexão automática com Base de Dados HUAM")
+
+        # Automatic connection to the HUAM huam
+        conn = st.connection("gsheets", type=GSheetsConnection)
+        with tracing.span("base.planilha"):
+            df_bruto = conn.read(worksheet="Metadata", ttl="10m")
+        df_base = preparar_base(df_bruto)
         
-    st.session_state.df = df_base
-    st.success("✔️ Base de Dados do Herbário HUAM carregada!")
-    st.write(df_base.head())
-
-    # Upload CSV to overwrite existing data
-    st.subheader("Ou envie sua própria base em formato DarwinCore")
-    file = st.file_uploader("Selecione o arquivo CSV", type=["csv"])
-    if file:
-        df_base = pd.read_csv(file)
         st.session_state.df = df_base
-        st.success("Arquivo CSV carregado! Base atualizada.")
+        # Full-text index built once per version of the base
+        with st.spinner("Indexando a base para a busca livre..."):
+            indice_base(df_base).texto
+        st.success("✔️ Base de Dados do Herbário HUAM carregada!")
         st.write(df_base.head())
 
-# -----------------------------------------------
-# Report Page
-# -----------------------------------------------
-elif selected == "Relatório":
-    st.subheader("📊 Relatório de Dados")
-    st.write(
-        "Gere relatórios a partir da base de dados carregada na aba **BASE**. "
-        "Informe o nome de uma **família**, **gênero** ou **espécie** e clique em **Buscar** para visualizar o número de amostras, "
-        "a localização na coleção, a lista de táxons relacionados e os registros completos disponíveis."
-    )
+        # Upload CSV or DwC-A to overwrite existing data
+        st.subheader("Ou envie sua própria base em formato DarwinCore")
+        file = st.file_uploader(
+            "Selecione o arquivo CSV ou Darwin Core Archive (.zip)",
+            type=["csv", "zip"],
+            help="Arquivos .zip exportados do IPT/GBIF são lidos diretamente, sem descompactar."
+        )
+        if file:
+            try:
+                df_base = ler_base(file)
+            except Exception as e:
+                st.error(f"Não foi possível ler o arquivo enviado: {e}")
+            else:
+                st.session_state.df = df_base
+                with st.spinner("Indexando a base para a busca livre..."):
+                    indice_base(df_base).texto
+                if file.name.lower().endswith(".zip"):
+                    st.success(f"Darwin Core Archive carregado! Base atualizada ({len(df_base)} registros).")
+                else:
+                    st.success("Arquivo CSV carregado! Base atualizada.")
+                st.write(df_base.head())
+
+        # Data quality of the loaded base (re-checked only on changed rows
+        # when the spreadsheet is updated)
+        st.subheader("🩺 Qualidade dos dados")
+        with st.spinner("Validando a base..."):
+            validacao = indice_base(st.session_state.df).validacao
+
+        resumo_validacao = validacao.resumo("pt")
+        total_problemas = validacao.total()
+        if total_problemas:
+            st.warning(f"{total_problemas} registro(s) com pelo menos um problema.")
+        else:
+            st.success("Nenhum problema encontrado pelas regras de validação.")
+
+        st.dataframe(
+            resumo_validacao.rename(columns={
+                "regra": "Regra",
+                "descricao": "Descrição",
+                "registros": "Registros",
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
 
-    # Load the database
-    if st.session_state.df is None:
-        st.warning("⚠️ A base de dados precisa ser carregada na aba **BASE**!")	
-    else:
-        df = st.session_state.df.copy()
-
-        # Show all botanical families in the dataset
-        if st.button("Listar Todas as Famílias Botânicas"):
-            contagem_familias = df["family"].value_counts().sort_values(ascending=True)
-            st.session_state["contagem_familias"] = contagem_familias  # salva na sessão
-
-            st.success(f"**Total de famílias encontradas:** {len(contagem_familias)}")
-            st.write(", ".join(contagem_familias.index.tolist()))
-
-        # Show chart button (only if data is available)
-        if "contagem_familias" in st.session_state:
-            if st.button("📊 Exibir Gráfico Interativo por Família"):
-                contagem_familias = st.session_state["contagem_familias"]
-                df_plot = contagem_familias.reset_index()
-                df_plot.columns = ["Família", "Amostras"]
-
-                fig = px.bar(
-                    df_plot,
-                    x="Amostras",
-                    y="Família",
-                    orientation="h",
-                    title="Amostras por Família",
-                    labels={"Amostras": "Quantidade de Amostras", "Família": "Família"},
-                    color_discrete_sequence=["#388E3C"],
-                    height=max(400, len(df_plot) * 20)  # ajusta altura
+        regras_com_problemas = resumo_validacao.loc[resumo_validacao["registros"] > 0, "regra"].tolist()
+        if regras_com_problemas:
+            regra = st.selectbox("Ver registros da regra", regras_com_problemas, key="validacao_regra")
+            problemas = validacao.problemas(regra, "pt").drop(columns=["regra", "descricao", "posicao"]).rename(columns={
+                "tombo": "Tombo",
+                "coluna": "Coluna",
+                "valor": "Valor",
+            })
+            st.dataframe(problemas, use_container_width=True, hide_index=True)
+            botoes_exportacao(problemas, ("validacao", regra), f"problemas_{regra}")
+
+        # Full collection export, written in blocks and cached per version
+        st.subheader("⬇️ Exportar base")
+        col_formato, col_preparar = st.columns([1, 2])
+        with col_formato:
+            formato_base = st.selectbox("Formato", formatos_disponiveis(), key="exportar_base_formato")
+        with col_preparar:
+            preparar_base_arquivo = st.button("Preparar arquivo", key="exportar_base")
+
+        if preparar_base_arquivo:
+            df_exportar = st.session_state.df
+            if formato_base == "xlsx" and len(df_exportar) > MAX_LINHAS_XLSX:
+                st.error(f"A base tem {len(df_exportar)} registros, acima do limite do Excel; use CSV ou Parquet.")
+            else:
+                with st.spinner("Gerando arquivo..."):
+                    arquivo_base = exportar_cacheado(df_exportar, (indice_base(df_exportar).versao, "base"), formato_base)
+                mime, extensao = FORMATOS[formato_base]
+                st.download_button(
+                    f"⬇️ Baixar base ({len(df_exportar)} registros, {len(arquivo_base) / 1024 / 1024:.1f} MB)",
+                    data=arquivo_base,
+                    file_name=f"biocurate_base{extensao}",
+                    mime=mime,
+                    key="exportar_base_baixar"
                 )
 
-                st.plotly_chart(fig, use_container_width=True)        
+    # -----------------------------------------------
+    # Report Page
+    # -----------------------------------------------
+    elif selected == "Relatório":
+        st.subheader("📊 Relatório de Dados")
+        st.write(
+            "Gere relatórios a partir da base de dados carregada na aba **BASE**. "
+            "Informe o nome de uma **família**, **gênero** ou **espécie** e clique em **Buscar** para visualizar o número de amostras, "
+            "a localização na coleção, a lista de táxons relacionados e os registros completos disponíveis."
+        )
 
-        # Family Report
-        st.subheader("Consultar por Família")
-        familia = st.text_input("Digite o nome da família:")
-        if st.button("🔍 Buscar Família"):
-            if familia:
-                df_fam = df[df["family"].str.upper() == familia.upper()]
-                num_material = len(df_fam)
-                generos = df_fam["genus"].dropna().unique()
-                especies = df_fam["scientificName"].dropna().unique()
-                locs = df_fam["dynamicProperties"].dropna().unique()
+        # Load the database
+        if st.session_state.df is None:
+            st.warning("⚠️ A base de dados precisa ser carregada na aba **BASE**!")	
+        else:
+            df = st.session_state.df.copy()
+
+            # Show all botanical families in the dataset
+            if st.button("Listar Todas as Famílias Botânicas"):
+                contagem_familias = contar_familias(df)
+                st.session_state["contagem_familias"] = contagem_familias  # salva na sessão
+
+                st.success(f"**Total de famílias encontradas:** {len(contagem_familias)}")
+                st.write(", ".join(contagem_familias.index.tolist()))
+
+            # Family chart: counts aggregated once per dataset version and the
+            # figure cached; only the top families are drawn
+            if "contagem_familias" in st.session_state:
+                if st.checkbox("📊 Exibir Gráfico Interativo por Família", key="grafico_familias"):
+                    indice_grafico = indice_base(st.session_state.df)
+                    contagem_familias = indice_grafico.contagem_familias()
+
+                    col_top, col_modo = st.columns(2)
+                    with col_top:
+                        top_n = st.slider(
+                            "Famílias exibidas", min_value=5, max_value=min(100, max(5, len(contagem_familias))),
+                            value=min(MAX_BARRAS, max(5, len(contagem_familias))), key="grafico_top"
+                        )
+                    with col_modo:
+                        modo = st.radio(
+                            "Modo", ["Barras", "Pontos (WebGL)"], horizontal=True, key="grafico_modo"
+                        )
+                    modo = "webgl" if modo.startswith("Pontos") else "barras"
 
-                if len(locs) > 0:
-                    locs_str = ", ".join(sorted(map(str, locs)))
-                    st.info(f"**Localização na coleção:** {locs_str}")
+                    familia_grafico = st.selectbox(
+                        "Detalhar gêneros de uma família",
+                        ["Todas as famílias"] + contagem_familias.sort_values(ascending=False).index.tolist(),
+                        key="grafico_familia"
+                    )
 
-                st.info(f"**Total de amostras:** {num_material}")
-                st.info(f"**Total de gêneros:** {len(generos)}")
-                st.write("**Gêneros encontrados:**")
-                st.write(", ".join(sorted(map(str, generos))))
+                    if familia_grafico == "Todas as famílias":
+                        spec = grafico_contagem(
+                            (indice_grafico.versao, None), contagem_familias, top_n, "Outras ({n} famílias)",
+                            "Amostras por Família", "Quantidade de Amostras", "Família", modo
+                        )
+                    else:
+                        spec = grafico_contagem(
+                            (indice_grafico.versao, familia_grafico), indice_grafico.contagem_generos(familia_grafico),
+                            top_n, "Outros ({n} gêneros)",
+                            f"Amostras por Gênero: {familia_grafico}", "Quantidade de Amostras", "Gênero", modo
+                        )
 
-                st.info(f"**Total de espécies:** {len(especies)}")
-                st.write("**Espécies encontradas:**")
-                st.write(", ".join(sorted(map(str, especies))))
-            else:
-                st.warning("Digite o nome da família antes de buscar.")
+                    st.plotly_chart(json.loads(spec), use_container_width=True)
+
+            # Family Report
+            st.subheader("Consultar por Família")
+            familia = st.text_input("Digite o nome da família:")
+            if st.button("🔍 Buscar Família"):
+                if familia:
+                    rel = relatorio_familia(df, familia)
+                    num_material = len(rel["amostras"])
+                    generos = rel["generos"]
+                    especies = rel["especies"]
+                    locs = rel["locais"]
+
+                    if len(locs) > 0:
+                        locs_str = ", ".join(locs)
+                        st.info(f"**Localização na coleção:** {locs_str}")
+
+                    st.info(f"**Total de amostras:** {num_material}")
+                    st.info(f"**Total de gêneros:** {len(generos)}")
+                    st.write("**Gêneros encontrados:**")
+                    st.write(", ".join(generos))
+
+                    st.info(f"**Total de espécies:** {len(especies)}")
+                    st.write("**Espécies encontradas:**")
+                    st.write(", ".join(especies))
+
+                    if num_material:
+                        st.write("**Exportar amostras da família:**")
+                        botoes_exportacao(rel["amostras"], ("familia", familia.strip()), f"familia_{familia.strip()}")
+                else:
+                    st.warning("Digite o nome da família antes de buscar.")
 
-        # Genus Report
-        st.subheader("Consultar por Gênero")
-        genero = st.text_input("Digite o nome do gênero:")
+            # Genus Report
+            st.subheader("Consultar por Gênero")
+            genero = st.text_input("Digite o nome do gênero:")
         
-        if st.button("🔍 Buscar Gênero"):
-            if genero:
-                df_gen = df[df["genus"].str.upper() == genero.upper()]
-                total_amostras = len(df_gen)
-                so_genero = df_gen[df_gen["scientificName"].isna() | (df_gen["scientificName"].str.strip() == "")]
-                especies_por_genero = df_gen["scientificName"].dropna().unique()
-                locs = df_gen["scientificName"].dropna().unique()
-                familias = df_gen["family"].dropna().unique()
-
-                if len(locs) > 0:
-                    locs_str = ", ".join(sorted(map(str, locs)))
-                    st.info(f"**Localização na coleção:** {locs_str}")
-
-                st.info(f"**Família:** {', '.join(sorted(map(str, familias)))}")
-                st.info(f"**Amostras do gênero:** {total_amostras}")
-                st.info(f"**Espécies dentro do gênero:** {len(especies_por_genero)}")
-                st.write("**Espécies encontradas:**")
-                st.write(", ".join(sorted(map(str, especies_por_genero))))
-            else:
-                st.warning("Digite o nome do gênero antes de buscar.")
+            if st.button("🔍 Buscar Gênero"):
+                if genero:
+                    rel = relatorio_genero(df, genero)
+                    total_amostras = len(rel["amostras"])
+                    especies_por_genero = rel["especies"]
+                    locs = rel["locais"]
+                    familias = rel["familias"]
+
+                    if len(locs) > 0:
+                        locs_str = ", ".join(locs)
+                        st.info(f"**Localização na coleção:** {locs_str}")
+
+                    st.info(f"**Família:** {', '.join(familias)}")
+                    st.info(f"**Amostras do gênero:** {total_amostras}")
+                    st.info(f"**Espécies dentro do gênero:** {len(especies_por_genero)}")
+                    st.write("**Espécies encontradas:**")
+                    st.write(", ".join(especies_por_genero))
+
+                    if total_amostras:
+                        st.write("**Exportar amostras do gênero:**")
+                        botoes_exportacao(rel["amostras"], ("genero", genero.strip()), f"genero_{genero.strip()}")
+                else:
+                    st.warning("Digite o nome do gênero antes de buscar.")
 
-        # Species Report
-        st.subheader("Consultar por Espécie")
-        especie = st.text_input("Digite o nome científico da espécie:")
+            # Species Report
+            st.subheader("Consultar por Espécie")
+            especie = st.text_input("Digite o nome científico da espécie:")
        
-        if st.button("🔍 Buscar Espécie"):
-            if especie:
-                df_esp = df[df["scientificName"].str.upper() == especie.upper()]
+            if st.button("🔍 Buscar Espécie"):
+                if especie:
+                    guardar_resultado("especie", (especie.strip(), relatorio_especie(df, especie)))
+                else:
+                    st.warning("Digite o nome da espécie antes de buscar.")
+
+            # Kept in the session, so the table can be paged and sorted
+            especie_guardada = resultado_guardado("especie")
+            if especie_guardada is not None:
+                nome_especie, rel = especie_guardada
+                df_esp = rel["amostras"]
                 total_especie = len(df_esp)
-                locs = df_esp["dynamicProperties"].dropna().unique()
-                familias = df_esp["family"].dropna().unique()
+                locs = rel["locais"]
+                familias = rel["familias"]
 
                 if len(locs) > 0:
-                    locs_str = ", ".join(sorted(map(str, locs)))
+                    locs_str = ", ".join(locs)
                     st.info(f"**Localização na coleção:** {locs_str}")
 
-                st.info(f"**Família:** {', '.join(sorted(map(str, familias)))}")
+                st.info(f"**Família:** {', '.join(familias)}")
                 st.info(f"**Total de amostras da espécie:** {total_especie}")
 
                 if total_especie > 0:
                     st.write("**Detalhe das amostras encontradas:**")
-                    st.dataframe(df_esp, use_container_width=True)
+                    tabela_paginada(df_esp, "tabela_especie")
+                    botoes_exportacao(df_esp, ("especie", nome_especie), f"especie_{nome_especie}")
                 else:
                     st.warning("Nenhuma amostra encontrada para essa espécie.")
+
+            # Period Report
+            st.subheader("Consultar por Período de Coleta")
+            indice = indice_base(st.session_state.df)
+
+            if indice.temporal is None:
+                st.warning("⚠️ Sua base de dados não possui a coluna 'yearCollected'.")
             else:
-                st.warning("Digite o nome da espécie antes de buscar.")
+                col_ini, col_fim, col_fam = st.columns(3)
+                with col_ini:
+                    data_ini = st.text_input("De", placeholder="Ex.: 1980 ou 1980-05")
+                with col_fim:
+                    data_fim = st.text_input("Até", placeholder="Ex.: 1990")
+                with col_fam:
+                    familia_periodo = st.text_input("Família (opcional)")
+
+                if st.button("🔍 Buscar Período"):
+                    consulta_periodo = (data_ini.strip(), data_fim.strip(), familia_periodo.strip())
+                    try:
+                        guardar_resultado("periodo", (consulta_periodo, indice.buscar_periodo(
+                            *(parte or None for parte in consulta_periodo)
+                        )))
+                    except ValueError:
+                        st.warning("⚠️ Data inválida: use 1980, 1980-05 ou 1980-05-12.")
+
+                periodo_guardado = resultado_guardado("periodo")
+                if periodo_guardado is not None:
+                    consulta_periodo, df_periodo = periodo_guardado
+
+                    if df_periodo.empty:
+                        st.warning("Nenhuma amostra coletada nesse período.")
+                    else:
+                        st.info(f"**Amostras coletadas no período:** {len(df_periodo)}")
+                        tabela_paginada(df_periodo, "tabela_periodo")
+                        botoes_exportacao(df_periodo, ("periodo",) + consulta_periodo, "periodo")
+
+                if st.button("📅 Amostras por Ano e Década"):
+                    temporal = indice.temporal
+                    st.info(f"**Amostras sem ano de coleta:** {temporal['sem_data']}")
+
+                    df_decadas = temporal["decadas"].rename_axis("Década").reset_index(name="Amostras")
+                    fig = px.bar(
+                        df_decadas,
+                        x="Década",
+                        y="Amostras",
+                        title="Amostras por Década de Coleta",
+                        color_discrete_sequence=["#388E3C"]
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
 
-# -----------------------------------------------
-# Data Search Page
-# -----------------------------------------------
-elif selected == "Busca":
-    st.subheader("📋 Buscar Dados")
-    st.write(
-        "Consulte informações detalhadas das amostras a partir do número de tombo. "
-        "Digite o código manualmente ou faça a leitura do QR Code para visualizar dados taxonômicos, "
-        "local de armazenamento, coletores e outras informações relevantes."
-    )
+                    st.write("**Amostras por ano:**")
+                    st.dataframe(
+                        temporal["anos"].rename_axis("Ano").reset_index(name="Amostras"),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+            # Collector Report
+            st.subheader("Amostras por Coletor")
+            if "recordedBy" not in df.columns:
+                st.warning("⚠️ Sua base de dados não possui a coluna 'recordedBy'.")
+            elif st.button("🧑‍🔬 Listar Coletores"):
+                contagem_coletores = indice.contagem_coletores.rename(columns={
+                    "coletor": "Coletor",
+                    "principal": "Coletor principal",
+                    "adicional": "Coletor adicional",
+                    "total": "Total",
+                })
+                st.info(f"**Total de coletores:** {len(contagem_coletores)}")
+                st.dataframe(contagem_coletores, use_container_width=True, hide_index=True)
+                botoes_exportacao(contagem_coletores, ("coletores",), "coletores")
+
+            # Storage Location Inventory
+            st.subheader("Inventário da Coleção")
+            if indice.inventario is None:
+                st.warning("⚠️ Sua base de dados não possui a coluna 'dynamicProperties'.")
+            else:
+                inventario = indice.inventario
+                armarios = list(dict.fromkeys(inventario["armario"].dropna()))
+                armario = st.selectbox("Armário", ["Todos"] + armarios)
+
+                if armario != "Todos":
+                    inventario = inventario[inventario["armario"] == armario]
+
+                st.info(
+                    f"**Locais:** {len(inventario)} | "
+                    f"**Amostras:** {int(inventario['amostras'].sum())}"
+                )
+                st.dataframe(
+                    inventario.drop(columns=["armario"]).rename(columns={
+                        "local": "Local",
+                        "prateleira": "Prateleira",
+                        "amostras": "Amostras",
+                        "n_familias": "Famílias",
+                        "n_especies": "Espécies",
+                        "familias": "Lista de famílias",
+                        "especies": "Lista de espécies",
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
-    # -------------------------------------------------
-    # Funções auxiliares
-    # -------------------------------------------------
-    def normalizar_codigo(valor):
-        """
-        Normaliza o código lido manualmente ou por QR Code.
-        Aceita códigos como HUAM001245, 1245 ou URLs contendo o código.
-        """
-        if valor is None:
-            return ""
-
-        texto = str(valor).strip().upper()
-
-        # Caso o QR Code contenha uma URL, tenta extrair HUAM + números
-        match_huam = re.search(r"HUAM\s*0*\d+", texto)
-        if match_huam:
-            return match_huam.group(0).replace(" ", "")
-
-        # Caso contenha apenas números
-        match_num = re.search(r"\d+", texto)
-        if match_num:
-            return match_num.group(0)
-
-        return texto
-
-
-    def buscar_por_tombo(df, codigo_busca):
-        """
-        Busca o tombo na base.
-        Prioriza collectionCode, mas aceita barcode se existir.
-        """
-        codigo_busca = normalizar_codigo(codigo_busca)
-
-        colunas_possiveis = ["collectionCode", "barcode", "catalogNumber"]
-
-        col = None
-        for c in colunas_possiveis:
-            if c in df.columns:
-                col = c
-                break
-
-        if col is None:
-            st.error(
-                "A base não possui coluna de tombo reconhecida. "
-                "Esperado: collectionCode, barcode ou catalogNumber."
+                if armario != "Todos" and st.button("📦 Listar Amostras do Armário"):
+                    amostras_armario = indice.buscar_local(armario=armario)
+                    st.dataframe(amostras_armario, use_container_width=True)
+                    botoes_exportacao(amostras_armario, ("armario", armario), f"armario_{armario}")
+
+                taxon_local = st.text_input("Onde está guardado? Digite uma família, gênero ou espécie:")
+                if st.button("🔍 Buscar Localização"):
+                    if taxon_local:
+                        locais_taxon = indice.onde_esta(taxon_local)
+
+                        if locais_taxon.empty:
+                            st.warning("Nenhuma localização encontrada para esse táxon.")
+                        else:
+                            st.info(f"**{taxon_local.strip()}** está guardado em {len(locais_taxon)} local(is).")
+                            st.dataframe(
+                                locais_taxon.rename(columns={"local": "Local", "amostras": "Amostras"}),
+                                use_container_width=True,
+                                hide_index=True
+                            )
+                    else:
+                        st.warning("Digite o nome do táxon antes de buscar.")
+
+            # Duplicate Specimens
+            st.subheader("Possíveis Duplicatas")
+            st.caption(
+                "Registros do mesmo coletor, número e data de coleta (ou da mesma coleta com outro tombo). "
+                "Grupos com pontuação próxima de 1 são quase certos; revise os demais antes de corrigir a base."
             )
-            return pd.DataFrame(), None
+            limiar_duplicatas = st.slider(
+                "Pontuação mínima", min_value=0.6, max_value=1.0, value=0.85, step=0.05,
+                key="duplicatas_limiar"
+            )
+            if st.button("🧬 Buscar Duplicatas"):
+                with st.spinner("Comparando registros..."):
+                    duplicatas = indice.duplicatas(limiar_duplicatas)
 
-        df = df.copy()
-        df[col] = df[col].fillna("").astype(str).str.upper().str.strip()
+                if duplicatas.empty:
+                    st.success("Nenhuma duplicata provável encontrada.")
+                else:
+                    st.info(
+                        f"**Grupos:** {duplicatas['grupo'].nunique()} | "
+                        f"**Registros envolvidos:** {len(duplicatas)}"
+                    )
+                    duplicatas = duplicatas.rename(columns={
+                        "grupo": "Grupo",
+                        "tamanho": "Registros no grupo",
+                        "pontuacao": "Pontuação",
+                    })
+                    st.dataframe(duplicatas, use_container_width=True, hide_index=True)
+                    botoes_exportacao(duplicatas, ("duplicatas", limiar_duplicatas), "duplicatas")
+
+            # Name Checking against a local checklist
+            st.subheader("Conferência de Nomes")
+            st.caption(
+                "Confere todos os nomes científicos, gêneros e famílias da base com um checklist local "
+                "(ex.: exportação do WFO ou da Flora e Funga do Brasil), sem acessar a internet."
+            )
+            checklist = checklist_local()
+            if checklist is None:
+                arquivo_checklist = st.file_uploader(
+                    "Arquivo do checklist (CSV, TXT ou Darwin Core Archive .zip)",
+                    type=["csv", "txt", "tsv", "zip"],
+                    key="checklist_arquivo"
+                )
+                if arquivo_checklist:
+                    try:
+                        with st.spinner("Carregando o checklist..."):
+                            checklist = checklist_de_arquivo(arquivo_checklist)
+                    except Exception as e:
+                        st.error(f"Não foi possível ler o checklist: {e}")
 
-        result = df[
-            df[col].eq(codigo_busca) |
-            df[col].str.endswith(codigo_busca) |
-            df[col].str.endswith(codigo_busca.zfill(6))
-        ]
+            if checklist is not None:
+                st.caption(f"Checklist com {len(checklist)} nomes.")
 
-        return result, col
+                if st.button("🔤 Conferir Nomes"):
+                    with st.spinner("Conferindo nomes..."):
+                        conferencia = checklist.conferir_base(df)
+                    revisao = revisar(conferencia)
 
+                    st.dataframe(
+                        pd.crosstab(conferencia["campo"], conferencia["nivel"]),
+                        use_container_width=True
+                    )
+                    if revisao.empty:
+                        st.success("Todos os nomes conferem com o checklist.")
+                    else:
+                        st.info(f"**Nomes para revisar:** {len(revisao)} de {len(conferencia)}")
+                        revisao = revisao.rename(columns={
+                            "campo": "Campo",
+                            "nome": "Nome na base",
+                            "autoria_base": "Autoria na base",
+                            "registros": "Registros",
+                            "familia_base": "Família na base",
+                            "nivel": "Correspondência",
+                            "correspondencia": "Nome no checklist",
+                            "autoria": "Autoria",
+                            "status": "Situação",
+                            "aceito": "Nome aceito",
+                            "familia": "Família no checklist",
+                            "motivo": "Motivo",
+                        })
+                        st.dataframe(revisao, use_container_width=True, hide_index=True)
+                        botoes_exportacao(revisao, None, "nomes_revisar")
+
+    # -----------------------------------------------
+    # Data Search Page
+    # -----------------------------------------------
+    elif selected == "Busca":
+        st.subheader("📋 Buscar Dados")
+        st.write(
+            "Consulte informações detalhadas das amostras a partir do número de tombo. "
+            "Digite o código manualmente ou faça a leitura do QR Code para visualizar dados taxonômicos, "
+            "local de armazenamento, coletores e outras informações relevantes."
+        )
 
-    def ler_qrcode(uploaded_image):
-        """
-        Decodifica QR Code a partir da imagem capturada por st.camera_input.
-        """
-        file_bytes = np.asarray(bytearray(uploaded_image.getvalue()), dtype=np.uint8)
-        img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+        # -------------------------------------------------
+        # Funções auxiliares
+        # -------------------------------------------------
+        def ler_qrcode(uploaded_image):
+            """
+            Decodifica QR Code a partir da imagem capturada por st.camera_input.
+            """
+            file_bytes = np.asarray(bytearray(uploaded_image.getvalue()), dtype=np.uint8)
+            img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
 
-        if img is None:
-            return None
+            if img is None:
+                return None
 
-        detector = cv2.QRCodeDetector()
-        data, bbox, _ = detector.detectAndDecode(img)
+            detector = cv2.QRCodeDetector()
+            data, bbox, _ = detector.detectAndDecode(img)
 
-        if data:
-            return data.strip()
+            if data:
+                return data.strip()
 
-        return None
+            return None
 
 
-    def mostrar_dados_amostra(result):
-        """
-        Exibe os dados principais da amostra encontrada.
-        """
-        if result.empty:
-            st.error("Código não encontrado.")
-            return
+        def mostrar_dados_amostra(result, chave_tabela):
+            """
+            Exibe os dados principais da amostra encontrada.
+            """
+            if result.empty:
+                st.error("Código não encontrado.")
+                return
 
-        first = result.iloc[0]
+            first = result.iloc[0]
         
-        #sci modificado para retornar somente genus+species
-        #sci = first.get("scientificName", "")
-        #sci = sci if isinstance(sci, str) and sci.strip() else "Indeterminada"
-        genus = first.get("genus", "")
-        specific_epithet = first.get("specificEpithet", "")
+            #sci modificado para retornar somente genus+species
+            #sci = first.get("scientificName", "")
+            #sci = sci if isinstance(sci, str) and sci.strip() else "Indeterminada"
+            genus = first.get("genus", "")
+            specific_epithet = first.get("specificEpithet", "")
         
-        genus = genus.strip() if isinstance(genus, str) else ""
-        specific_epithet = (
-            specific_epithet.strip()
-            if isinstance(specific_epithet, str)
-            else ""
-        )
+            genus = genus.strip() if isinstance(genus, str) else ""
+            specific_epithet = (
+                specific_epithet.strip()
+                if isinstance(specific_epithet, str)
+                else ""
+            )
         
-        if genus and specific_epithet:
-            sci = f"{genus} {specific_epithet}"
-        elif genus:
-            sci = genus
-        else:
-            sci = "Indeterminada"
+            if genus and specific_epithet:
+                sci = f"{genus} {specific_epithet}"
+            elif genus:
+                sci = genus
+            else:
+                sci = "Indeterminada"
         
 
-        auth = first.get("scientificNameAuthorship", "")
-        if not isinstance(auth, str) or not auth.strip():
-            auth = ""
+            auth = first.get("scientificNameAuthorship", "")
+            if not isinstance(auth, str) or not auth.strip():
+                auth = ""
 
-        if auth:
-            st.markdown(
-                f"<div style='font-size: 24px; font-weight: bold;'><i>{sci}</i> {auth}</div>",
-                unsafe_allow_html=True
-            )
-        else:
-            st.markdown(
-                f"<div style='font-size: 24px; font-weight: bold;'><i>{sci}</i></div>",
-                unsafe_allow_html=True
-            )
+            if auth:
+                st.markdown(
+                    f"<div style='font-size: 24px; font-weight: bold;'><i>{sci}</i> {auth}</div>",
+                    unsafe_allow_html=True
+                )
+            else:
+                st.markdown(
+                    f"<div style='font-size: 24px; font-weight: bold;'><i>{sci}</i></div>",
+                    unsafe_allow_html=True
+                )
 
-        fam = first.get("family")
-        if pd.notna(fam):
-            st.markdown(
-                f"<div style='font-size: 18px;'>Família: {fam}</div>",
-                unsafe_allow_html=True
-            )
+            fam = first.get("family")
+            if pd.notna(fam):
+                st.markdown(
+                    f"<div style='font-size: 18px;'>Família: {fam}</div>",
+                    unsafe_allow_html=True
+                )
 
-        loc = first.get("dynamicProperties")
-        if pd.notna(loc):
-            st.markdown(
-                f"<b>Localização na coleção:</b> {loc}",
-                unsafe_allow_html=True
-            )
+            loc = first.get("dynamicProperties")
+            if pd.notna(loc):
+                st.markdown(
+                    f"<b>Localização na coleção:</b> {loc}",
+                    unsafe_allow_html=True
+                )
 
-        coll = first.get("recordedBy")
-        addcoll = first.get("addCollector")
-        number = first.get("recordNumber")
+            coll = first.get("recordedBy")
+            addcoll = first.get("addCollector")
+            number = first.get("recordNumber")
 
-        collected = f"{number or ''}".strip()
-        if coll or collected or addcoll:
-            st.markdown(
-                f"<b>Coletor(s):</b> {coll or ''} <b>nº</b> {collected} <b>&</b> {addcoll or ''}",
-                unsafe_allow_html=True
-            )
+            collected = f"{number or ''}".strip()
+            if coll or collected or addcoll:
+                st.markdown(
+                    f"<b>Coletor(s):</b> {coll or ''} <b>nº</b> {collected} <b>&</b> {addcoll or ''}",
+                    unsafe_allow_html=True
+                )
 
-        date_parts = []
-        for f in ["dayCollected", "monthCollected", "yearCollected"]:
-            val = first.get(f)
-            if pd.notna(val):
-                try:
-                    date_parts.append(str(int(float(val))))
-                except Exception:
-                    date_parts.append(str(val))
+            data_coleta = formatar_data(first.get("dataColeta"))
+            if data_coleta:
+                st.markdown(
+                    f"<b>Data de coleta:</b> {data_coleta}",
+                    unsafe_allow_html=True
+                )
 
-        if date_parts:
-            st.markdown(
-                f"<b>Data de coleta:</b> {'/'.join(date_parts)}",
-                unsafe_allow_html=True
-            )
+            field_number = first.get("fieldNumber")
+            if pd.notna(field_number) and str(field_number).strip():
+                st.markdown(
+                    f"<b>Número interno (bloco):</b> {field_number}",
+                    unsafe_allow_html=True
+                )
+
+            tabela_paginada(result, chave_tabela)
+
+            nome_busca = ""
+            if isinstance(sci, str) and sci.strip() and sci != "Indeterminada":
+                nome_busca = sci.strip().replace(" ", "+")
+            elif isinstance(fam, str) and fam.strip():
+                nome_busca = fam.strip().replace(" ", "+")
 
-        field_number = first.get("fieldNumber")
-        if pd.notna(field_number) and str(field_number).strip():
             st.markdown(
-                f"<b>Número interno (bloco):</b> {field_number}",
+                """
+                ### 📤 Pesquisar o nome em bases científicas:
+                <div style='display: flex; flex-wrap: wrap; gap: 10px;'>
+                    <a href='https://www.gbif.org/search?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>GBIF</a>
+                    <a href='https://floradobrasil.jbrj.gov.br/consulta/?grupo=6&familia=null&genero=&especie=&autor=&nomeVernaculo=&nomeCompleto=""" + nome_busca + """&formaVida=null&substrato=null&ocorreBrasil=QUALQUER&ocorrencia=OCORRE&endemismo=TODOS&origem=TODOS&regiao=QUALQUER&ilhaOceanica=32767&estado=QUALQUER&domFitogeograficos=QUALQUER&vegetacao=TODOS&mostrarAte=SUBESP_VAR&opcoesBusca=TODOS_OS_NOMES&loginUsuario=Visitante&senhaUsuario=&contexto=consulta-publica&pagina=1#CondicaoTaxonCP' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>Reflora Lista</a>
+                    <a href='https://floradobrasil.jbrj.gov.br/reflora/herbarioVirtual/ConsultaPublicoHVUC/BemVindoConsultaPublicaHVConsultar.do?nomeCientifico=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>Reflora HV</a>
+                    <a href='https://www.worldfloraonline.org/search?query=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>World Flora</a>
+                    <a href='https://powo.science.kew.org/results?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>POWO</a>
+                    <a href='https://www.ipni.org/search?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>IPNI</a>
+                    <a href='https://plants.jstor.org/search?filter=name&so=ps_group_by_genus_species+asc&Query=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>JSTOR Plants</a>
+                    <a href='https://specieslink.net/search/' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>SpeciesLink</a>
+                </div>
+                """,
                 unsafe_allow_html=True
             )
 
-        st.dataframe(result, use_container_width=True)
-
-        nome_busca = ""
-        if isinstance(sci, str) and sci.strip() and sci != "Indeterminada":
-            nome_busca = sci.strip().replace(" ", "+")
-        elif isinstance(fam, str) and fam.strip():
-            nome_busca = fam.strip().replace(" ", "+")
+        # -------------------------------------------------
+        # Verificar base
+        # -------------------------------------------------
+        if "df" not in st.session_state or st.session_state.df is None:
+            st.warning("⚠️ A base de dados precisa ser carregada na aba **BASE**!")
 
-        st.markdown(
-            """
-            ### 📤 Pesquisar o nome em bases científicas:
-            <div style='display: flex; flex-wrap: wrap; gap: 10px;'>
-                <a href='https://www.gbif.org/search?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>GBIF</a>
-                <a href='https://floradobrasil.jbrj.gov.br/consulta/?grupo=6&familia=null&genero=&especie=&autor=&nomeVernaculo=&nomeCompleto=""" + nome_busca + """&formaVida=null&substrato=null&ocorreBrasil=QUALQUER&ocorrencia=OCORRE&endemismo=TODOS&origem=TODOS&regiao=QUALQUER&ilhaOceanica=32767&estado=QUALQUER&domFitogeograficos=QUALQUER&vegetacao=TODOS&mostrarAte=SUBESP_VAR&opcoesBusca=TODOS_OS_NOMES&loginUsuario=Visitante&senhaUsuario=&contexto=consulta-publica&pagina=1#CondicaoTaxonCP' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>Reflora Lista</a>
-                <a href='https://floradobrasil.jbrj.gov.br/reflora/herbarioVirtual/ConsultaPublicoHVUC/BemVindoConsultaPublicaHVConsultar.do?nomeCientifico=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>Reflora HV</a>
-                <a href='https://www.worldfloraonline.org/search?query=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>World Flora</a>
-                <a href='https://powo.science.kew.org/results?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>POWO</a>
-                <a href='https://www.ipni.org/search?q=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>IPNI</a>
-                <a href='https://plants.jstor.org/search?filter=name&so=ps_group_by_genus_species+asc&Query=""" + nome_busca + """' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>JSTOR Plants</a>
-                <a href='https://specieslink.net/search/' target='_blank' style='background: #eee; padding: 8px 12px; border-radius: 5px; text-decoration: none;'>SpeciesLink</a>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
+        else:
+            df = st.session_state.df.copy()
 
-    # -------------------------------------------------
-    # Verificar base
-    # -------------------------------------------------
-    if "df" not in st.session_state or st.session_state.df is None:
-        st.warning("⚠️ A base de dados precisa ser carregada na aba **BASE**!")
+            # -------------------------------------------------
+            # Busca manual por tombo
+            # -------------------------------------------------
+            st.subheader("🔎 Busca manual por tombo")
 
-    else:
-        df = st.session_state.df.copy()
+            codigo = st.text_input(
+                "Digite o número do tombo",
+                value="",
+                placeholder="Ex.: HUAM001245 ou somente 1245"
+            )
 
-        # -------------------------------------------------
-        # Busca manual por tombo
-        # -------------------------------------------------
-        st.subheader("🔎 Busca manual por tombo")
+            if st.button("🔍 Buscar por tombo"):
+                if not codigo:
+                    st.warning("Digite o número do tombo antes de buscar.")
 
-        codigo = st.text_input(
-            "Digite o número do tombo",
-            value="",
-            placeholder="Ex.: HUAM001245 ou somente 1245"
-        )
+                else:
+                    code = normalizar_codigo(codigo)
+                    result, col_usada = buscar_por_tombo(df, code)
+                    st.session_state["last_codigo"] = code
+                    guardar_resultado("tombo", (result, col_usada))
+                    antecipar_imagens(st.connection("gsheets", type=GSheetsConnection), code, "pt")
 
-        if st.button("🔍 Buscar por tombo"):
-            if not codigo:
-                st.warning("Digite o número do tombo antes de buscar.")
-
-            else:
-                code = normalizar_codigo(codigo)
-                result, col_usada = buscar_por_tombo(df, code)
+            tombo_guardado = resultado_guardado("tombo")
+            if tombo_guardado is not None:
+                result, col_usada = tombo_guardado
 
                 if col_usada:
                     st.caption(f"Busca realizada na coluna: {col_usada}")
+                else:
+                    st.error(
+                        "A base não possui coluna de tombo reconhecida. "
+                        "Esperado: collectionCode, barcode ou catalogNumber."
+                    )
 
-                st.session_state["last_codigo"] = code
-                mostrar_dados_amostra(result)
+                mostrar_dados_amostra(result, "tabela_tombo")
 
-        st.markdown("---")
+            st.markdown("---")
 
-        # -------------------------------------------------
-        # Busca por número interno / bloco
-        # -------------------------------------------------
-        st.subheader("🔍 Buscar por número interno")
+            # -------------------------------------------------
+            # Busca por número interno / bloco
+            # -------------------------------------------------
+            st.subheader("🔍 Buscar por número interno")
 
-        num_interno = st.text_input(
-            "Digite o número interno (Número de Bloco)",
-            value="",
-            placeholder="Ex.: 321"
-        )
+            num_interno = st.text_input(
+                "Digite o número interno (Número de Bloco)",
+                value="",
+                placeholder="Ex.: 321 ou vários: 321, 322, 400-405"
+            )
 
-        if st.button("🔍 Buscar por bloco"):
-            if "fieldNumber" not in df.columns:
-                st.warning("⚠️ Sua base de dados não possui a coluna 'fieldNumber'.")
+            if st.button("🔍 Buscar por bloco"):
+                if "fieldNumber" not in df.columns:
+                    st.warning("⚠️ Sua base de dados não possui a coluna 'fieldNumber'.")
 
-            else:
-                df["fieldNumber"] = df["fieldNumber"].astype(str).str.strip()
-                num_interno = num_interno.strip()
-                resultado_bloco = df[df["fieldNumber"] == num_interno]
+                else:
+                    blocos = separar_blocos(num_interno)
+                    guardar_resultado("bloco", (blocos,) + indice_base(st.session_state.df).buscar_blocos(blocos))
+
+            bloco_guardado = resultado_guardado("bloco")
+            if bloco_guardado is not None:
+                blocos, resultado_bloco, faltando = bloco_guardado
 
                 if not resultado_bloco.empty:
                     st.success(
-                        f"{len(resultado_bloco)} amostra(s) encontrada(s) com Número interno '{num_interno}'."
+                        f"{len(resultado_bloco)} amostra(s) encontrada(s) com Número interno '{', '.join(blocos)}'."
                     )
-                    st.dataframe(resultado_bloco, use_container_width=True)
+                    if faltando and len(blocos) > 1:
+                        st.warning(f"Números internos sem amostras: {', '.join(faltando)}")
+                    tabela_paginada(resultado_bloco, "tabela_bloco")
+                    botoes_exportacao(resultado_bloco, ("blocos", tuple(blocos)), "blocos")
                 else:
                     st.warning("Nenhuma amostra encontrada com esse número interno.")
                     
-        # -------------------------------------------------
-        # Leitura por QR Code
-        # -------------------------------------------------
-        st.subheader("📷 Ler QR Code")
-
-        st.info(
-            "Aponte a câmera para o QR Code da exsicata. "
-            "O QR Code deve conter o tombo, por exemplo HUAM001245."
-        )
-
-        qr_image = st.camera_input("Capturar QR Code")
-
-        if qr_image is not None:
-            qr_text = ler_qrcode(qr_image)
-
-            if qr_text:
-                codigo_lido = normalizar_codigo(qr_text)
-
-                st.success(f"QR Code lido: {qr_text}")
-                st.info(f"Código interpretado para busca: {codigo_lido}")
-
-                result, col_usada = buscar_por_tombo(df, codigo_lido)
-
-                if col_usada:
-                    st.caption(f"Busca realizada na coluna: {col_usada}")
-
-                st.session_state["last_codigo"] = codigo_lido
-                mostrar_dados_amostra(result)
-
-            else:
-                st.warning(
-                    "Não foi possível ler o QR Code. "
-                    "Tente aproximar a câmera, melhorar a iluminação ou centralizar melhor o código."
+            # -------------------------------------------------
+            # Busca por coletor e número de coleta
+            # -------------------------------------------------
+            st.subheader("🧑‍🔬 Buscar por coletor")
+
+            col_coletor, col_ano = st.columns([3, 1])
+            with col_coletor:
+                consulta_coletor = st.text_input(
+                    "Coletor e número de coleta",
+                    value="",
+                    placeholder="Ex.: Ducke 1234 ou somente Ducke"
                 )
+            with col_ano:
+                ano_coletor = st.text_input("Ano (opcional)", value="", placeholder="Ex.: 1985")
 
-        st.markdown("---")
-
-# -----------------------------------------------
-# Image Lookup + Pl@ntNet
-# -----------------------------------------------
-elif selected == "Imagem":
-    st.subheader("📷 Buscar Imagem")
-    st.write(
-        "Busque imagens das amostras do HUAM vinculadas à base de dados e utilize o serviço "
-        "**Pl@ntNet** para realizar sugestões automáticas de identificação botânica. "
-        "Informe o número do tombo para visualizar a imagem da exsicata e receber a lista de espécies prováveis."
-    )
-
-    # -------------------------------------------------
-    # Configurações gerais
-    # -------------------------------------------------
-    DRIVE_TIMEOUT = (15, 60)
-    PLANTNET_TIMEOUT = (30, 120)
-    MAX_TENTATIVAS = 3
-    PLANTNET_PROJECT = "all"
-    PLANTNET_URL = f"https://my-api.plantnet.org/v2/identify/{PLANTNET_PROJECT}"
-
-    # -------------------------------------------------
-    # Carregar base
-    # -------------------------------------------------
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    df = conn.read(worksheet="Image", ttl="10m")
-
-    df = df[~df["Subpasta"].astype(str).str.contains("Fotos exsicatas Mike", na=False)]
-
-    # -------------------------------------------------
-    # Funções auxiliares
-    # -------------------------------------------------
-    def redigir_api_key(texto):
-        """
-        Remove a API key de qualquer mensagem de erro antes de exibir na interface.
-        """
-        if texto is None:
-            return ""
-
-        texto = str(texto)
-        texto = re.sub(r"(api-key=)[^&\s]+", r"\1[REMOVIDA]", texto)
-        texto = re.sub(r'("api-key"\s*:\s*")[^"]+(")', r'\1[REMOVIDA]\2', texto)
-        return texto
-
-
-    def drive_link_to_file_id(link):
-        """
-        Extrai o file_id de um link do Google Drive.
-        Aceita links no formato /file/d/ID/view, /d/ID ou URLs com ?id=.
-        """
-        if not isinstance(link, str):
-            return None
-
-        try:
-            if "/d/" in link:
-                return link.split("/d/")[1].split("/")[0]
-
-            if "id=" in link:
-                return link.split("id=")[1].split("&")[0]
-
-        except Exception:
-            return None
-
-        return None
+            if st.button("🔍 Buscar por coletor"):
+                if not consulta_coletor.strip():
+                    st.warning("Digite o nome do coletor antes de buscar.")
 
+                elif "recordedBy" not in df.columns:
+                    st.warning("⚠️ Sua base de dados não possui a coluna 'recordedBy'.")
 
-    def download_drive_image(file_id):
-        """
-        Faz download da imagem do Google Drive com timeout explícito.
-        """
-        url = f"https://drive.google.com/uc?export=view&id={file_id}"
-
-        try:
-            response = requests.get(url, timeout=DRIVE_TIMEOUT)
-
-        except requests.exceptions.Timeout:
-            raise RuntimeError("Timeout ao baixar a imagem do Google Drive.")
-
-        except requests.exceptions.RequestException:
-            raise RuntimeError("Erro de rede ao acessar o Google Drive.")
-
-        if response.status_code != 200:
-            raise RuntimeError(
-                f"Não foi possível carregar a imagem do Drive. Status HTTP: {response.status_code}"
+                else:
+                    indice = indice_base(st.session_state.df)
+                    try:
+                        guardar_resultado("coletor", (
+                            (consulta_coletor.strip(), ano_coletor.strip()),
+                            indice.buscar_coletor(consulta_coletor, ano_coletor.strip() or None)
+                        ))
+                    except ValueError:
+                        st.warning("⚠️ Ano inválido: use, por exemplo, 1985.")
+
+            coletor_guardado = resultado_guardado("coletor")
+            if coletor_guardado is not None:
+                (nome_coletor, ano_busca), resultado_coletor = coletor_guardado
+
+                if not resultado_coletor.empty:
+                    st.success(f"{len(resultado_coletor)} amostra(s) encontrada(s) para '{nome_coletor}'.")
+                    tabela_paginada(resultado_coletor, "tabela_coletor")
+                    botoes_exportacao(resultado_coletor, ("coletor", nome_coletor, ano_busca), "coletor")
+                else:
+                    st.warning("Nenhuma amostra encontrada para esse coletor.")
+
+            # -------------------------------------------------
+            # Busca livre em todos os campos
+            # -------------------------------------------------
+            st.subheader("🔤 Busca livre")
+
+            consulta_livre = st.text_input(
+                "Termos de busca (todos os campos)",
+                value="",
+                placeholder="Ex.: Ducke Lauraceae ou locality:Ducke family:Lauraceae",
+                help="Sem acentos nem maiúsculas. Use campo:valor para restringir a uma coluna "
+                     "e aspas para valores com espaço, como locality:\"Reserva Ducke\"."
             )
 
-        content_type = response.headers.get("Content-Type", "")
+            if st.button("🔍 Busca livre"):
+                if not consulta_livre.strip():
+                    st.warning("Digite ao menos um termo antes de buscar.")
 
-        if "image" not in content_type.lower():
-            raise RuntimeError(
-                "O link do Google Drive não retornou uma imagem válida. "
-                "Verifique se o arquivo está compartilhado publicamente ou acessível pelo app."
+                else:
+                    try:
+                        indice_texto = indice_base(st.session_state.df).texto
+                        total_livre = indice_texto.contar(consulta_livre)
+                        resultado_livre = indice_texto.buscar(consulta_livre)
+                    except ValueError as e:
+                        st.warning(f"Consulta inválida: {e}")
+                    else:
+                        if total_livre:
+                            st.success(
+                                f"{total_livre} amostra(s) encontrada(s); "
+                                f"exibindo as {len(resultado_livre)} mais relevantes."
+                            )
+                            st.dataframe(resultado_livre, use_container_width=True)
+                            # The export holds every match, not only the displayed ones
+                            botoes_exportacao(
+                                indice_texto.buscar(consulta_livre, limite=None),
+                                ("livre", consulta_livre.strip()), "busca_livre"
+                            )
+                        else:
+                            st.warning("Nenhuma amostra encontrada para essa busca.")
+
+            # -------------------------------------------------
+            # Leitura por QR Code
+            # -------------------------------------------------
+            st.subheader("📷 Ler QR Code")
+
+            st.info(
+                "Aponte a câmera para o QR Code da exsicata. "
+                "O QR Code deve conter o tombo, por exemplo HUAM001245."
             )
 
-        return response.content
-
-
-    def preparar_imagem_para_plantnet(image_bytes, max_size_mb=45):
-        """
-        Abre a imagem, corrige orientação EXIF, converte para RGB e gera JPEG.
-        Mantém margem de segurança abaixo do limite de 50 MB aceito pelo Pl@ntNet.
-        """
-        try:
-            img = Image.open(BytesIO(image_bytes))
-            img = ImageOps.exif_transpose(img)
-            img = img.convert("RGB")
-
-        except Exception:
-            raise RuntimeError("Erro ao abrir ou converter a imagem.")
+            qr_image = st.camera_input("Capturar QR Code")
 
-        buffer = BytesIO()
-        img.save(buffer, format="JPEG", quality=90, optimize=True)
-        prepared_bytes = buffer.getvalue()
+            if qr_image is not None:
+                with tracing.span("busca.qrcode"):
+                    qr_text = ler_qrcode(qr_image)
 
-        max_size_bytes = max_size_mb * 1024 * 1024
+                if qr_text:
+                    codigo_lido = normalizar_codigo(qr_text)
 
-        if len(prepared_bytes) > max_size_bytes:
-            img.thumbnail((2500, 2500))
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=85, optimize=True)
-            prepared_bytes = buffer.getvalue()
+                    st.success(f"QR Code lido: {qr_text}")
+                    st.info(f"Código interpretado para busca: {codigo_lido}")
 
-        if len(prepared_bytes) > 50 * 1024 * 1024:
-            raise RuntimeError("A imagem excede 50 MB, limite máximo aceito pelo Pl@ntNet.")
-
-        return img, prepared_bytes
+                    result, col_usada = buscar_por_tombo(df, codigo_lido)
 
+                    if col_usada:
+                        st.caption(f"Busca realizada na coluna: {col_usada}")
+                    else:
+                        st.error(
+                            "A base não possui coluna de tombo reconhecida. "
+                            "Esperado: collectionCode, barcode ou catalogNumber."
+                        )
 
-    def identificar_com_plantnet(image_bytes, organ="auto"):       
-        try:
-            API_KEY = st.secrets["plantnet"]["api_key"]
-        except KeyError:
-            raise RuntimeError("API key do Pl@ntNet não encontrada em st.secrets.")
+                    st.session_state["last_codigo"] = codigo_lido
+                    mostrar_dados_amostra(result, "tabela_qr")
+                    antecipar_imagens(st.connection("gsheets", type=GSheetsConnection), codigo_lido, "pt")
 
-        params = {
-            "api-key": API_KEY,
-            "nb-results": 5,
-            "lang": "en"
-        }
+                else:
+                    st.warning(
+                        "Não foi possível ler o QR Code. "
+                        "Tente aproximar a câmera, melhorar a iluminação ou centralizar melhor o código."
+                    )
 
-        data = None
-        if organ and organ != "auto":
-            data = {
-                "organs": organ
-            }
+            st.markdown("---")
+
+    # -----------------------------------------------
+    # Image Lookup + Pl@ntNet
+    # -----------------------------------------------
+    elif selected == "Imagem":
+        st.subheader("📷 Buscar Imagem")
+        st.write(
+            "Busque imagens das amostras do HUAM vinculadas à base de dados e utilize o serviço "
+            "**Pl@ntNet** para realizar sugestões automáticas de identificação botânica. "
+            "Informe o número do tombo para visualizar a imagem da exsicata e receber a lista de espécies prováveis."
+        )
 
-        ultimo_erro_tipo = None
+        # -------------------------------------------------
+        # Carregar base
+        # -------------------------------------------------
+        # Drive ids parsed once per worksheet; the loops below only see valid links
+        df = planilha_imagens(st.connection("gsheets", type=GSheetsConnection))
+        resumo_links(df, "pt")
 
-        for tentativa in range(1, MAX_TENTATIVAS + 1):
+        # -------------------------------------------------
+        # Funções auxiliares
+        # -------------------------------------------------
+        def identificar_amostra(image_bytes, organ="auto", chave_cache=None):
+            """
+            Envia a imagem ao Pl@ntNet com a API key de st.secrets,
+            avisando na página a cada tentativa que falhar.
+            """
             try:
-                # Recriar BytesIO e files a cada tentativa.
-                # Isso evita que o arquivo seja reenviado vazio após uma falha.
-                files = [
-                    ("images", ("image.jpg", BytesIO(image_bytes), "image/jpeg"))
-                ]
-
-                response = requests.post(
-                    PLANTNET_URL,
-                    params=params,
-                    files=files,
-                    data=data,
-                    timeout=PLANTNET_TIMEOUT
-                )
+                api_key = st.secrets["plantnet"]["api_key"]
+            except KeyError:
+                raise RuntimeError("API key do Pl@ntNet não encontrada em st.secrets.")
 
-                return response
-
-            except requests.exceptions.ConnectTimeout:
-                ultimo_erro_tipo = "ConnectTimeout"
-                st.warning(f"Tentativa {tentativa}: timeout de conexão com o Pl@ntNet.")
-
-            except requests.exceptions.ReadTimeout:
-                ultimo_erro_tipo = "ReadTimeout"
-                st.warning(f"Tentativa {tentativa}: o Pl@ntNet conectou, mas demorou para responder.")
-
-            except requests.exceptions.ConnectionError:
-                ultimo_erro_tipo = "ConnectionError"
-                st.warning(f"Tentativa {tentativa}: erro de conexão com o Pl@ntNet.")
-
-            except requests.exceptions.RequestException:
-                ultimo_erro_tipo = "RequestException"
-                st.warning(f"Tentativa {tentativa}: falha na requisição ao Pl@ntNet.")
-
-            time.sleep(3 * tentativa)
-
-        raise RuntimeError(
-            f"Não foi possível conectar ao Pl@ntNet após {MAX_TENTATIVAS} tentativas. "
-            f"Tipo do último erro: {ultimo_erro_tipo}."
-        )
+            def avisar_falha(tentativa, tipo_erro):
+                st.warning(MENSAGENS["pt"][f"tentativa_{tipo_erro}"].format(tentativa=tentativa))
 
+            return identificar_com_plantnet(
+                image_bytes, api_key, organ=organ, ao_falhar=avisar_falha, chave_cache=chave_cache
+            )
 
-    def mostrar_resultados_plantnet(response):
-        """
-        Exibe os resultados retornados pela API Pl@ntNet.
-        """
-        if response.status_code != 200:
-            try:
-                error_detail = response.json()
-            except Exception:
-                error_detail = response.text
 
-            error_detail = redigir_api_key(error_detail)
+        def mostrar_resultados_plantnet(response):
+            """
+            Exibe os resultados retornados pela API Pl@ntNet.
+            """
+            if response.status_code != 200:
+                try:
+                    error_detail = response.json()
+                except Exception:
+                    error_detail = response.text
 
-            st.error(f"Erro na API Pl@ntNet: {response.status_code}")
-            with st.expander("Detalhes técnicos"):
-                st.write(error_detail)
+                error_detail = redigir_api_key(error_detail, "pt")
 
-            return
+                st.error(f"Erro na API Pl@ntNet: {response.status_code}")
+                with st.expander("Detalhes técnicos"):
+                    st.write(error_detail)
 
-        resultado_json = response.json()
-        results = resultado_json.get("results", [])
+                return
 
-        best_match = resultado_json.get("bestMatch")
-        predicted_organs = resultado_json.get("predictedOrgans", [])
-        version = resultado_json.get("version")
-        remaining = resultado_json.get("remainingIdentificationRequests")
+            resultado_json = response.json()
+            results = resultado_json.get("results", [])
 
-        if best_match:
-            st.write(f"**Melhor correspondência:** *{best_match}*")
+            best_match = resultado_json.get("bestMatch")
+            predicted_organs = resultado_json.get("predictedOrgans", [])
+            version = resultado_json.get("version")
+            remaining = resultado_json.get("remainingIdentificationRequests")
 
-        if predicted_organs:
-            organ_pred = predicted_organs[0].get("organ")
-            organ_score = predicted_organs[0].get("score")
+            if best_match:
+                st.write(f"**Melhor correspondência:** *{best_match}*")
 
-            if organ_pred is not None and organ_score is not None:
-                st.write(f"**Órgão detectado:** {organ_pred} ({organ_score:.2%})")
-            elif organ_pred is not None:
-                st.write(f"**Órgão detectado:** {organ_pred}")
+            if predicted_organs:
+                organ_pred = predicted_organs[0].get("organ")
+                organ_score = predicted_organs[0].get("score")
 
-        if version:
-            st.caption(f"Versão do motor Pl@ntNet: {version}")
+                if organ_pred is not None and organ_score is not None:
+                    st.write(f"**Órgão detectado:** {organ_pred} ({organ_score:.2%})")
+                elif organ_pred is not None:
+                    st.write(f"**Órgão detectado:** {organ_pred}")
 
-        if remaining is not None:
-            st.caption(f"Requisições restantes hoje: {remaining}")
+            if version:
+                st.caption(f"Versão do motor Pl@ntNet: {version}")
 
-        if not results:
-            st.info("Nenhuma correspondência encontrada.")
-            return
+            if remaining is not None:
+                st.caption(f"Requisições restantes hoje: {remaining}")
 
-        st.subheader("Resultados da identificação com a API do Pl@ntNet")
+            if not results:
+                st.info("Nenhuma correspondência encontrada.")
+                return
 
-        for res in results:
-            species_data = res.get("species", {})
-            family_data = species_data.get("family", {})
+            st.subheader("Resultados da identificação com a API do Pl@ntNet")
 
-            species_name = species_data.get("scientificName", "Nome não disponível")
-            species_name_without_author = species_data.get(
-                "scientificNameWithoutAuthor",
-                "Nome não disponível"
-            )
-            family_name = family_data.get("scientificNameWithoutAuthor", "Família não disponível")
-            score = res.get("score", 0)
+            for res in results:
+                species_data = res.get("species", {})
+                family_data = species_data.get("family", {})
 
-            nome_busca = species_name_without_author.strip().replace(" ", "+")
+                species_name = species_data.get("scientificName", "Nome não disponível")
+                species_name_without_author = species_data.get(
+                    "scientificNameWithoutAuthor",
+                    "Nome não disponível"
+                )
+                family_name = family_data.get("scientificNameWithoutAuthor", "Família não disponível")
+                score = res.get("score", 0)
 
-            st.write(
-                f"- **{species_name}** — {family_name} — Confiança: {score:.2%} | "
-                f"[Conferir táxon no GBIF](https://www.gbif.org/search?q={nome_busca})"
-            )
+                nome_busca = species_name_without_author.strip().replace(" ", "+")
 
+                st.write(
+                    f"- **{species_name}** — {family_name} — Confiança: {score:.2%} | "
+                    f"[Conferir táxon no GBIF](https://www.gbif.org/search?q={nome_busca})"
+                )
 
-    def mostrar_logo_plantnet():
-        """
-        Exibe o logo de atribuição do Pl@ntNet ao final da página.
-        Coloque o arquivo powered-by-plantnet.png na mesma pasta do app.py
-        ou dentro de uma pasta assets/.
-        """
-        st.divider()
 
-        caminhos_possiveis = [
-            "powered-by-plantnet.png",
-            "assets/powered-by-plantnet.png",
-            "images/powered-by-plantnet.png"
-        ]
+        def mostrar_logo_plantnet():
+            """
+            Exibe o logo de atribuição do Pl@ntNet ao final da página.
+            Coloque o arquivo powered-by-plantnet.png na mesma pasta do app.py
+            ou dentro de uma pasta assets/.
+            """
+            st.divider()
 
-        logo_path = None
+            caminhos_possiveis = [
+                "powered-by-plantnet.png",
+                "assets/powered-by-plantnet.png",
+                "images/powered-by-plantnet.png"
+            ]
 
-        for caminho in caminhos_possiveis:
-            if os.path.exists(caminho):
-                logo_path = caminho
-                break
+            logo_path = None
 
-        if logo_path:
-            col_logo, _ = st.columns([1, 4])
-            with col_logo:
-                st.image(logo_path, width=180)
-        else:
-            st.caption("Powered by Pl@ntNet")
+            for caminho in caminhos_possiveis:
+                if os.path.exists(caminho):
+                    logo_path = caminho
+                    break
 
+            if logo_path:
+                col_logo, _ = st.columns([1, 4])
+                with col_logo:
+                    st.image(logo_path, width=180)
+            else:
+                st.caption("Powered by Pl@ntNet")
 
-    # -------------------------------------------------
-    # Busca por tombo
-    # -------------------------------------------------
-    st.subheader("🔍 Busca por Tombo")
 
-    codigo = st.text_input(
-        "Digite o número do tombo",
-        value="",
-        placeholder="Ex.: HUAM001245 ou somente 1245",
-        key="tombo_input"
-    )
+        # -------------------------------------------------
+        # Busca por tombo
+        # -------------------------------------------------
+        st.subheader("🔍 Busca por Tombo")
 
-    organ_option = st.selectbox(
-        "Órgão vegetal para envio ao Pl@ntNet",
-        options=["auto", "leaf", "flower", "fruit", "bark"],
-        index=0,
-        help=(
-            "Use 'auto' para exsicata inteira. Use 'leaf', 'flower', 'fruit' ou 'bark' "
-            "quando a imagem estiver claramente recortada para esse órgão."
+        codigo = st.text_input(
+            "Digite o número do tombo",
+            # The code last looked up on the Search page, whose images are prefetched
+            value=st.session_state.get("last_codigo", ""),
+            placeholder="Ex.: HUAM001245 ou somente 1245",
+            key="tombo_input"
         )
-    )
 
-    if st.button("🔍 Buscar por Tombo", key="buscar_tombo", use_container_width=True):
-        if not codigo:
-            st.warning("Digite um número de tombo para buscar.")
+        organ_option = st.selectbox(
+            "Órgão vegetal para envio ao Pl@ntNet",
+            options=["auto", "leaf", "flower", "fruit", "bark"],
+            index=0,
+            help=(
+                "Use 'auto' para exsicata inteira. Use 'leaf', 'flower', 'fruit' ou 'bark' "
+                "quando a imagem estiver claramente recortada para esse órgão."
+            )
+        )
 
-        else:
-            col_codigo = "barcode"
-            df[col_codigo] = df[col_codigo].astype(str).str.upper()
-            codigo_busca = codigo.strip().upper()
-
-            resultado = df[
-                df[col_codigo].eq(codigo_busca) |
-                df[col_codigo].str.endswith(codigo_busca) |
-                df[col_codigo].str.endswith(codigo_busca.zfill(6))
-            ]
+        recortar_planta = st.checkbox(
+            "✂️ Recortar a planta automaticamente",
+            value=True,
+            help=(
+                "Separa a planta do papel, cobre etiqueta, escala e cartela de cores e envia "
+                "alguns recortes da planta numa única identificação, em vez da exsicata inteira."
+            )
+        )
 
-            if resultado.empty:
-                st.session_state.result_image = None
-                st.warning(f"Nenhuma exsicata encontrada para o tombo: {codigo_busca}")
+        if st.button("🔍 Buscar por Tombo", key="buscar_tombo", use_container_width=True):
+            if not codigo:
+                st.warning("Digite um número de tombo para buscar.")
 
             else:
-                st.session_state.result_image = resultado
-                st.success(f"{len(resultado)} resultado(s) encontrado(s):")
-
-                for _, row in st.session_state.result_image.iterrows():
-                    file_id = drive_link_to_file_id(row.get("UrlExsicata"))
+                codigo_busca = codigo.strip().upper()
+                resultado = buscar_imagens_por_tombo(df, codigo_busca)
 
-                    if not file_id:
-                        st.warning("Link do Drive inválido.")
-                        continue
+                if resultado.empty:
+                    st.session_state.result_image = None
+                    st.warning(f"Nenhuma exsicata encontrada para o tombo: {codigo_busca}")
 
-                    try:
-                        image_raw_bytes = download_drive_image(file_id)
-                        img, image_prepared_bytes = preparar_imagem_para_plantnet(image_raw_bytes)
+                else:
+                    st.session_state.result_image = resultado
+                    st.success(f"{len(resultado)} resultado(s) encontrado(s):")
+
+                    invalidos = resultado[~resultado["link_valido"]]
+                    if not invalidos.empty:
+                        st.warning(
+                            "Link do Drive inválido para o(s) tombo(s): "
+                            + ", ".join(invalidos["barcode"].astype(str))
+                        )
 
-                    except Exception as e:
-                        st.error(f"Erro ao carregar/preparar a imagem: {redigir_api_key(e)}")
-                        continue
+                    for _, row in resultado[resultado["link_valido"]].iterrows():
+                        file_id = row["file_id"]
 
-                    col1, col2 = st.columns([2, 1])
+                        try:
+                            aguardar(file_id)
+                            image_raw_bytes = download_drive_image(file_id)
+                            img, image_prepared_bytes = preparar_imagem_para_plantnet(image_raw_bytes)
+                            recortes = recortar_exsicata(img) if recortar_planta else []
+                            indice_hashes().registrar(file_id, img)
 
-                    with col1:
-                        st.subheader("Imagem da Exsicata")
-                        st.image(
-                            img,
-                            caption=row.get("ArchiveName", "Imagem da exsicata"),
-                            use_container_width=True
-                        )
+                        except Exception as e:
+                            st.error(f"Erro ao carregar/preparar a imagem: {mensagem_erro(e, 'pt')}")
+                            continue
 
-                    with col2:
-                        st.subheader("Informações da Amostra")
-                        st.write(f"**Tombo:** {row.get('barcode', 'Não informado')}")
-                        st.write(f"**Arquivo:** {row.get('ArchiveName', 'Não informado')}")
+                        col1, col2 = st.columns([2, 1])
+
+                        with col1:
+                            st.subheader("Imagem da Exsicata")
+                            st.image(
+                                img,
+                                caption=row.get("ArchiveName", "Imagem da exsicata"),
+                                use_container_width=True
+                            )
+                            if recortes:
+                                st.caption("Recortes enviados ao Pl@ntNet:")
+                                st.image([dados for _, dados in recortes], width=160)
+
+                        with col2:
+                            st.subheader("Informações da Amostra")
+                            st.write(f"**Tombo:** {row.get('barcode', 'Não informado')}")
+                            st.write(f"**Arquivo:** {row.get('ArchiveName', 'Não informado')}")
+
+                            if "family" in row.index and pd.notna(row.get("family")):
+                                st.write(f"**Família:** {row.get('family')}")
+
+                            if "scientificName" in row.index and pd.notna(row.get("scientificName")):
+                                st.write(f"**Nome:** *{row.get('scientificName')}*")
+
+                            st.write(f"**URL:** [Abrir imagem original]({row.get('UrlExsicata')})")
+
+                            semelhantes = indice_hashes().semelhantes(file_id)
+                            if semelhantes:
+                                nomes = dict(zip(df["file_id"], df["ArchiveName"]))
+                                st.warning(
+                                    "Possíveis digitalizações repetidas desta imagem:\n\n" + "\n".join(
+                                        f"- {nomes.get(outro, outro)} ({distancia})" for outro, distancia in semelhantes
+                                    )
+                                )
 
-                        if "family" in row.index and pd.notna(row.get("family")):
-                            st.write(f"**Família:** {row.get('family')}")
+                        st.info("Enviando para Pl@ntNet...")
 
-                        if "scientificName" in row.index and pd.notna(row.get("scientificName")):
-                            st.write(f"**Nome:** *{row.get('scientificName')}*")
+                        try:
+                            # The plant crops in one identification, or the whole sheet
+                            plantnet_response = identificar_amostra(
+                                [dados for _, dados in recortes] or image_prepared_bytes,
+                                organ=organ_option,
+                                chave_cache=chave_identificacao(file_id, organ_option, recortar_planta)
+                            )
 
-                        st.write(f"**URL:** [Abrir imagem original]({row.get('UrlExsicata')})")
+                            mostrar_resultados_plantnet(plantnet_response)
 
-                    st.info("Enviando para Pl@ntNet...")
+                        except Exception as e:
+                            st.error(f"Erro ao conectar/processar a resposta do Pl@ntNet: {mensagem_erro(e, 'pt')}")
 
-                    try:
-                        plantnet_response = identificar_com_plantnet(
-                            image_prepared_bytes,
-                            organ=organ_option
-                        )
+                        exsicatas_parecidas(df, file_id, img, "pt")
 
-                        mostrar_resultados_plantnet(plantnet_response)
 
-                    except Exception as e:
-                        st.error(f"Erro ao conectar/processar a resposta do Pl@ntNet: {redigir_api_key(e)}")
+        # -------------------------------------------------
+        # Busca por táxon
+        # -------------------------------------------------
+        st.subheader("🌿 Busca por Táxon")
 
+        taxon_input = st.text_input(
+            "Digite o nome da família ou espécie",
+            placeholder="Ex.: Fabaceae ou Mimosa pudica",
+            key="taxon_input"
+        )
 
-    # -------------------------------------------------
-    # Busca por táxon
-    # -------------------------------------------------
-    st.subheader("🌿 Busca por Táxon")
+        if st.button("Buscar por Táxon", key="buscar_taxon", use_container_width=True):
+            if not taxon_input:
+                st.warning("Digite um nome de família ou espécie para buscar.")
 
-    taxon_input = st.text_input(
-        "Digite o nome da família ou espécie",
-        placeholder="Ex.: Fabaceae ou Mimosa pudica",
-        key="taxon_input"
-    )
-
-    if st.button("Buscar por Táxon", key="buscar_taxon", use_container_width=True):
-        if not taxon_input:
-            st.warning("Digite um nome de família ou espécie para buscar.")
+            else:
+                resultado_taxon = buscar_por_taxon(df, taxon_input)
 
-        else:
-            taxon_busca = taxon_input.strip().upper()
+                if resultado_taxon.empty:
+                    st.warning(f"Nenhuma imagem encontrada para o táxon: {taxon_input}")
 
-            resultado_taxon = df[
-                (df["family"].astype(str).str.upper() == taxon_busca) |
-                (df["scientificName"].astype(str).str.upper() == taxon_busca) |
-                (df["family"].astype(str).str.upper().str.contains(taxon_busca, na=False)) |
-                (df["scientificName"].astype(str).str.upper().str.contains(taxon_busca, na=False))
-            ]
+                else:
+                    st.success(f"{len(resultado_taxon)} imagem(ns) encontrada(s) para o táxon: {taxon_input}")
 
-            if resultado_taxon.empty:
-                st.warning(f"Nenhuma imagem encontrada para o táxon: {taxon_input}")
+                    st.subheader("Dados do Táxon")
 
-            else:
-                st.success(f"{len(resultado_taxon)} imagem(ns) encontrada(s) para o táxon: {taxon_input}")
+                    col_stat1, col_stat2 = st.columns(2)
 
-                st.subheader("Dados do Táxon")
+                    with col_stat1:
+                        especies_unicas = resultado_taxon["scientificName"].nunique()
+                        st.metric("Nomes diferentes", especies_unicas)
 
-                col_stat1, col_stat2 = st.columns(2)
+                    with col_stat2:
+                        st.metric("Total de imagens", len(resultado_taxon))
 
-                with col_stat1:
-                    especies_unicas = resultado_taxon["scientificName"].nunique()
-                    st.metric("Nomes diferentes", especies_unicas)
+                    if especies_unicas > 0:
+                        st.write("**Nomes encontrados:**")
+                        especies_lista = resultado_taxon["scientificName"].dropna().unique()
+                        especies_texto = ""
 
-                with col_stat2:
-                    st.metric("Total de imagens", len(resultado_taxon))
+                        for especie in sorted(especies_lista):
+                            especies_texto += f"• {especie}\n"
 
-                if especies_unicas > 0:
-                    st.write("**Nomes encontrados:**")
-                    especies_lista = resultado_taxon["scientificName"].dropna().unique()
-                    especies_texto = ""
+                        st.text(especies_texto)
 
-                    for especie in sorted(especies_lista):
-                        especies_texto += f"• {especie}\n"
+                    st.subheader("Galeria de Imagens")
 
-                    st.text(especies_texto)
+                    items = list(resultado_taxon[resultado_taxon["link_valido"]].iterrows())
 
-                st.subheader("Galeria de Imagens")
+                    for i in range(0, len(items), 4):
+                        cols = st.columns(4)
 
-                items = list(resultado_taxon.iterrows())
+                        for j in range(4):
+                            if i + j >= len(items):
+                                continue
 
-                for i in range(0, len(items), 4):
-                    cols = st.columns(4)
+                            _, row = items[i + j]
+                            file_id = row["file_id"]
 
-                    for j in range(4):
-                        if i + j >= len(items):
-                            continue
+                            with cols[j]:
+                                try:
+                                    # Visually identical scans share one cached thumbnail
+                                    indice = indice_hashes()
+                                    miniatura = miniatura_drive(file_id, chave=indice.representante(file_id))
+                                    indice.registrar(file_id, miniatura)
 
-                        _, row = items[i + j]
-                        file_id = drive_link_to_file_id(row.get("UrlExsicata"))
+                                    st.image(
+                                        miniatura,
+                                        caption=f"{row.get('barcode', '')}",
+                                        use_container_width=True
+                                    )
 
-                        with cols[j]:
-                            if not file_id:
-                                st.warning("Link inválido")
-                                continue
+                                    st.caption(f"**{row.get('barcode', '')}**")
 
-                            try:
-                                image_raw_bytes = download_drive_image(file_id)
-                                img, _ = preparar_imagem_para_plantnet(image_raw_bytes)
+                                    if pd.notna(row.get("family")):
+                                        st.caption(f"Fam: {row.get('family')}")
 
-                                st.image(
-                                    img,
-                                    caption=f"{row.get('barcode', '')}",
-                                    use_container_width=True
-                                )
+                                    if pd.notna(row.get("scientificName")):
+                                        st.caption(f"*{row.get('scientificName')}*")
 
-                                st.caption(f"**{row.get('barcode', '')}**")
+                                    st.markdown(
+                                        f"[Abrir original]({row.get('UrlExsicata')})",
+                                        unsafe_allow_html=True
+                                    )
 
-                                if pd.notna(row.get("family")):
-                                    st.caption(f"Fam: {row.get('family')}")
+                                except Exception:
+                                    st.error("Erro ao carregar imagem")
 
-                                if pd.notna(row.get("scientificName")):
-                                    st.caption(f"*{row.get('scientificName')}*")
+        # -------------------------------------------------
+        # Digitalizações repetidas
+        # -------------------------------------------------
+        st.subheader("🧬 Digitalizações repetidas")
+        st.write(
+            "Encontre imagens da planilha que são a mesma exsicata digitalizada de novo ou copiada em outra subpasta. "
+            "Imagens visualmente idênticas compartilham a miniatura e a identificação do Pl@ntNet já obtida."
+        )
+        painel_repetidas(df, "pt")
 
-                                st.markdown(
-                                    f"[Abrir original]({row.get('UrlExsicata')})",
-                                    unsafe_allow_html=True
-                                )
+        # -------------------------------------------------
+        # Atribuição Pl@ntNet
+        # -------------------------------------------------
+        mostrar_logo_plantnet()
 
-                            except Exception:
-                                st.error("Erro ao carregar imagem")
+    # -----------------------------------------------
+    # Performance diagnostics (admin only, ?admin=<token>)
+    # -----------------------------------------------
+    if eh_admin():
+        painel_diagnostico("pt")
 
-    # -------------------------------------------------
-    # Atribuição Pl@ntNet
-    # -------------------------------------------------
-    mostrar_logo_plantnet()
+finally:
+    profiler.finalizar(tracing.pagina_atual())
+    tracing.finalizar_rerun()
@@ -0,0 +1,6 @@
+# -----------------------------------------------
+# BioCurate benchmarks
+#
+# Reproducible performance measurements over synthetic data. Run the
+# modules from the repository root, e.g. python -m benchmarks.bench_search
+# -----------------------------------------------
@@ -0,0 +1,136 @@
+# -----------------------------------------------
+# Image pipeline benchmark
+#
+# Drives download_drive_image -> preparar_imagem_para_plantnet ->
+# (recortar_exsicata with --crop) -> identificar_com_plantnet end to end against the local Drive and
+# Pl@ntNet stand-ins, and reports per-stage timings and throughput.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_images --specimens 40 --workers 4 --latency-ms 120
+# -----------------------------------------------
+
+import argparse
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.harness import resumir, formatar
+from benchmarks.mock_servers import DriveFalso, PlantNetFalso, iniciar
+from biocurate import images
+from biocurate.images import ErroImagem
+from biocurate.recorte import recortar_exsicata
+
+
+_local = threading.local()
+
+
+def _sessao():
+    # One HTTP session per worker thread, reusing connections like a browser
+    if not hasattr(_local, "sessao"):
+        _local.sessao = requests.Session()
+    return _local.sessao
+
+
+def processar(file_id, organ, recortar=False):
+    """
+    Runs one specimen through the three stages. Returns
+    ({stage: seconds}, error or None).
+    """
+    tempos = {}
+    sessao = _sessao()
+
+    try:
+        inicio = time.perf_counter()
+        bruto = images.download_drive_image(file_id, sessao=sessao)
+        tempos["download"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        img, preparado = images.preparar_imagem_para_plantnet(bruto)
+        tempos["preparo"] = time.perf_counter() - inicio
+
+        if recortar:
+            inicio = time.perf_counter()
+            preparado = [dados for _, dados in recortar_exsicata(img)] or preparado
+            tempos["recorte"] = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        resposta = images.identificar_com_plantnet(preparado, "benchmark", organ=organ, sessao=sessao, espera=0)
+        resposta.json()
+        tempos["plantnet"] = time.perf_counter() - inicio
+
+    except ErroImagem as e:
+        return tempos, e.tipo
+
+    if resposta.status_code != 200:
+        return tempos, f"plantnet_http_{resposta.status_code}"
+
+    tempos["total"] = sum(tempos.values())
+    return tempos, None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BioCurate image pipeline benchmark (offline).")
+    parser.add_argument("--specimens", type=int, default=20, help="Specimens to process. Default: 20.")
+    parser.add_argument("--workers", type=int, default=1, help="Specimens processed in parallel. Default: 1.")
+    parser.add_argument("--organ", default="auto", choices=["auto", "leaf", "flower", "fruit", "bark"])
+    parser.add_argument("--crop", action="store_true", help="Send plant crops instead of the whole sheet.")
+    parser.add_argument("--width", type=int, default=2400, help="Synthetic scan width in pixels.")
+    parser.add_argument("--height", type=int, default=3600, help="Synthetic scan height in pixels.")
+    parser.add_argument("--tiff-rate", type=float, default=0.0, help="Fraction of scans served as TIFF.")
+    parser.add_argument("--scans", help="Folder with real scans to serve instead of synthetic sheets.")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Drive latency per download.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Drive downloads failing.")
+    parser.add_argument("--non-image-rate", type=float, default=0.0, help="Fraction of Drive answers that are HTML.")
+    parser.add_argument("--plantnet-latency-ms", type=float, default=0)
+    parser.add_argument("--quota", type=int, default=500)
+    parser.add_argument("--rate-limit", type=float, help="Pl@ntNet requests per second before HTTP 429.")
+    args = parser.parse_args(argv)
+
+    drive = DriveFalso(args.latency_ms, 0, args.error_rate, args.non_image_rate, args.tiff_rate,
+                       args.width, args.height, pasta=args.scans)
+    plantnet = PlantNetFalso(args.plantnet_latency_ms, 0, args.quota, args.rate_limit)
+
+    drive_url, plantnet_url, parar = iniciar(drive, plantnet)
+    images.DRIVE_URL = drive_url
+    images.PLANTNET_URL = plantnet_url
+
+    ids = [f"exsicata{i:05d}" for i in range(args.specimens)]
+
+    # Generate the scans up front so the first downloads are not penalized
+    for file_id in ids:
+        drive.imagem(file_id)
+
+    tempos = defaultdict(list)
+    erros = Counter()
+
+    try:
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            for etapas, erro in executor.map(lambda i: processar(i, args.organ, args.crop), ids):
+                for etapa, duracao in etapas.items():
+                    tempos[etapa].append(duracao)
+                if erro:
+                    erros[erro] += 1
+        duracao_total = time.perf_counter() - inicio
+    finally:
+        parar()
+
+    linhas = [resumir(etapa, tempos[etapa]) for etapa in ["download", "preparo", "recorte", "plantnet", "total"] if tempos[etapa]]
+    for l in linhas:
+        l["linhas"] = args.specimens
+
+    print(formatar(linhas))
+    print()
+    print(
+        f"{args.specimens} specimens in {duracao_total:.2f}s with {args.workers} worker(s): "
+        f"{args.specimens / duracao_total:.2f} specimens/s, {len(tempos['total'])} complete"
+    )
+    if erros:
+        print("Errors: " + ", ".join(f"{tipo}={n}" for tipo, n in erros.most_common()))
+
+
+if __name__ == "__main__":
+    main()
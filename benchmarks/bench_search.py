@@ -0,0 +1,119 @@
+# -----------------------------------------------
+# Search and report benchmark
+#
+# Times dataset loading, accession-number search, the Report page queries,
+# the block search, the taxon search and duplicate detection on synthetic
+# datasets of several sizes, and reports throughput, p50/p95 latency and
+# peak memory.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_search
+#   python -m benchmarks.bench_search --sizes 10000 100000 1000000 --json result.json
+# -----------------------------------------------
+
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from benchmarks.harness import medir, formatar
+from benchmarks.synthetic import gerar_base
+from biocurate.dataset import ler_base
+from biocurate.duplicatas import pares_candidatos
+from biocurate.index import IndiceBase
+from biocurate.reports import contar_familias, relatorio_familia, relatorio_genero, relatorio_especie
+from biocurate.search import buscar_por_tombo, buscar_por_bloco, buscar_por_taxon
+
+
+def _consultas(df, n, rng):
+    """
+    Picks query values from the dataset itself (so they hit) plus some
+    misses, in the formats curators actually type.
+    """
+    def amostra(coluna):
+        valores = df[coluna].dropna().unique()
+        return [str(v) for v in rng.choice(valores, size=min(n, len(valores)), replace=False)]
+
+    codigos = amostra("collectionCode")
+    # Mix full codes, bare numbers and codes that do not exist
+    codigos = [c if i % 3 else c.replace("HUAM", "").lstrip("0") for i, c in enumerate(codigos)]
+    codigos[-max(1, n // 10):] = ["HUAM999999"] * max(1, n // 10)
+
+    return {
+        "tombos": codigos,
+        "blocos": amostra("fieldNumber"),
+        "familias": amostra("family"),
+        "generos": amostra("genus"),
+        "especies": amostra("scientificName"),
+        "taxons": [v[:6] for v in amostra("scientificName")],
+    }
+
+
+def _construir_indice(df):
+    indice = IndiceBase(df)
+    indice.tombo
+    indice.bloco
+    return indice
+
+
+def executar(tamanho, n_consultas, seed):
+    rng = np.random.default_rng(seed)
+    linhas = []
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "base.csv")
+        gerar_base(tamanho, seed=seed).to_csv(caminho, index=False)
+
+        repeticoes_carga = 3 if tamanho <= 100_000 else 1
+        linhas.append(medir("carga (CSV -> preparar_base)", ler_base, [(caminho,)], repeticoes_carga))
+        df = ler_base(caminho)
+
+    q = _consultas(df, n_consultas, rng)
+
+    linhas.append(medir("buscar_por_tombo", buscar_por_tombo, [(df, c) for c in q["tombos"]]))
+    linhas.append(medir("relatorio: contar_familias", contar_familias, [(df,)], 3))
+    linhas.append(medir("relatorio: familia", relatorio_familia, [(df, v) for v in q["familias"]]))
+    linhas.append(medir("relatorio: genero", relatorio_genero, [(df, v) for v in q["generos"]]))
+    linhas.append(medir("relatorio: especie", relatorio_especie, [(df, v) for v in q["especies"]]))
+    linhas.append(medir("buscar_por_bloco", buscar_por_bloco, [(df, v) for v in q["blocos"]]))
+    linhas.append(medir("buscar_por_taxon", buscar_por_taxon, [(df, v) for v in q["taxons"]]))
+
+    # Indexed lookups, for comparison with the scans above
+    linhas.append(medir("indice: construcao", _construir_indice, [(df,)]))
+    indice = _construir_indice(df)
+    linhas.append(medir("indice: tombo", indice.buscar_tombo, [(c,) for c in q["tombos"]], 20, memoria=False))
+    linhas.append(medir("indice: bloco", indice.buscar_bloco, [(b,) for b in q["blocos"]], 20, memoria=False))
+
+    # Duplicate detection (blocking + fuzzy comparison inside blocks)
+    linhas.append(medir("duplicatas: pares", pares_candidatos, [(df,)]))
+
+    for l in linhas:
+        l["linhas"] = tamanho
+
+    return linhas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BioCurate search and report benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="Dataset sizes (rows). Default: 10000 100000 1000000.")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per operation. Default: 20.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    resultados = []
+    for tamanho in args.sizes:
+        linhas = executar(tamanho, args.queries, args.seed)
+        resultados.extend(linhas)
+        print(formatar(linhas), end="\n\n", flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
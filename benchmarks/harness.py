@@ -0,0 +1,79 @@
+# -----------------------------------------------
+# Benchmark measurement helpers
+# -----------------------------------------------
+
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def medir(nome, funcao, argumentos, repeticoes=1, memoria=True):
+    """
+    Runs funcao(*args) for each args tuple in `argumentos` (repeated
+    `repeticoes` times) and returns a result row with throughput, p50/p95
+    latency and peak memory.
+
+    Timing and memory are measured in separate passes: tracemalloc slows
+    down allocations, so peak memory comes from one extra traced call.
+    """
+    argumentos = list(argumentos)
+    tempos = []
+
+    gc.collect()
+    for _ in range(repeticoes):
+        for args in argumentos:
+            inicio = time.perf_counter()
+            funcao(*args)
+            tempos.append(time.perf_counter() - inicio)
+
+    pico = None
+    if memoria and argumentos:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funcao(*argumentos[0])
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    linha = resumir(nome, tempos)
+    linha["pico_mb"] = pico / 1024 / 1024 if pico is not None else None
+    return linha
+
+
+def resumir(nome, tempos):
+    """
+    Result row for a list of durations in seconds: number of calls,
+    throughput (sequential calls per second) and p50/p95 latency.
+    """
+    tempos = np.array(tempos, dtype=float)
+    total = tempos.sum()
+    vazio = len(tempos) == 0
+
+    return {
+        "operacao": nome,
+        "chamadas": len(tempos),
+        "ops_s": len(tempos) / total if total > 0 else 0.0,
+        "p50_ms": 0.0 if vazio else float(np.percentile(tempos, 50) * 1000),
+        "p95_ms": 0.0 if vazio else float(np.percentile(tempos, 95) * 1000),
+        "pico_mb": None,
+    }
+
+
+def formatar(linhas):
+    """
+    Formats result rows as a fixed-width text table.
+    """
+    cabecalho = f"{'linhas':>9}  {'operacao':<28} {'chamadas':>8} {'ops/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'pico MB':>9}"
+    saida = [cabecalho, "-" * len(cabecalho)]
+
+    for l in linhas:
+        pico = f"{l['pico_mb']:9.1f}" if l.get("pico_mb") is not None else f"{'-':>9}"
+        saida.append(
+            f"{l.get('linhas', ''):>9}  {l['operacao']:<28} {l['chamadas']:>8} "
+            f"{l['ops_s']:>12,.1f} {l['p50_ms']:>10.3f} {l['p95_ms']:>10.3f} {pico}"
+        )
+
+    return "\n".join(saida)
@@ -0,0 +1,376 @@
+# -----------------------------------------------
+# Local stand-ins for Google Drive and Pl@ntNet
+#
+# Two small HTTP servers that answer like drive.google.com/uc and
+# my-api.plantnet.org/v2/identify, so the Image page and the image
+# benchmark can run offline, with configurable latency, errors and quota.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.mock_servers --latency-ms 80 --error-rate 0.05
+#
+# then start the app pointing at them:
+#   BIOCURATE_DRIVE_URL=http://127.0.0.1:8601/uc \
+#   BIOCURATE_PLANTNET_URL=http://127.0.0.1:8602/v2/identify/all \
+#   streamlit run app.py
+# -----------------------------------------------
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlparse, parse_qs
+
+from PIL import Image, ImageDraw
+
+from benchmarks.synthetic import FAMILIAS, EPITETOS, AUTORES
+
+
+# -------------------------------------------------
+# Synthetic herbarium sheets
+# -------------------------------------------------
+def gerar_exsicata(semente, largura=2400, altura=3600, formato="JPEG"):
+    """
+    Draws a synthetic herbarium sheet: mounting paper, a branch with
+    leaves, a label, a colour chart and a scale bar. The same seed always
+    gives the same image.
+    """
+    rng = random.Random(semente)
+    img = Image.new("RGB", (largura, altura), (236, 231, 214))
+    d = ImageDraw.Draw(img)
+
+    # Stem and leaves
+    x, y = largura // 2, int(altura * 0.85)
+    for _ in range(rng.randint(6, 12)):
+        nx = x + rng.randint(-250, 250)
+        ny = y - rng.randint(150, 350)
+        d.line([(x, y), (nx, ny)], fill=(92, 74, 48), width=14)
+
+        for lado in (-1, 1):
+            cx = nx + lado * rng.randint(120, 260)
+            cy = ny + rng.randint(-80, 80)
+            verde = (rng.randint(40, 90), rng.randint(80, 130), rng.randint(30, 70))
+            d.ellipse([cx - 160, cy - 60, cx + 160, cy + 60], fill=verde, outline=(30, 50, 20))
+
+        x, y = nx, max(ny, int(altura * 0.1))
+
+    # Label (bottom right) with "text" lines
+    lx, ly = int(largura * 0.55), int(altura * 0.82)
+    d.rectangle([lx, ly, largura - 60, altura - 60], fill=(250, 250, 245), outline=(60, 60, 60), width=4)
+    for i in range(6):
+        comprimento = rng.randint(300, largura - lx - 160)
+        d.rectangle([lx + 40, ly + 40 + i * 70, lx + 40 + comprimento, ly + 70 + i * 70], fill=(40, 40, 40))
+
+    # Colour chart and scale bar (top left)
+    cores = [(200, 30, 30), (30, 160, 40), (30, 60, 200), (240, 220, 20), (0, 0, 0), (255, 255, 255)]
+    for i, cor in enumerate(cores):
+        d.rectangle([60 + i * 110, 60, 160 + i * 110, 160], fill=cor)
+    for i in range(10):
+        d.rectangle([60 + i * 60, 190, 120 + i * 60, 220], fill=(0, 0, 0) if i % 2 == 0 else (255, 255, 255))
+
+    buffer = BytesIO()
+    if formato == "TIFF":
+        img.save(buffer, format="TIFF", compression="tiff_lzw")
+    else:
+        img.save(buffer, format="JPEG", quality=92)
+
+    return buffer.getvalue()
+
+
+# -------------------------------------------------
+# Google Drive stand-in
+# -------------------------------------------------
+class DriveFalso:
+    """
+    Configuration and image store of the Drive stand-in.
+
+    latencia_ms / variacao_ms: delay added to each download.
+    taxa_erro: fraction of requests answered with HTTP 500.
+    taxa_nao_imagem: fraction answered with an HTML page (like a Drive
+    sharing or virus-scan warning) instead of the image.
+    taxa_tiff: fraction of files served as TIFF instead of JPEG.
+    pasta: optional folder with real scans, served in rotation by file id.
+    """
+
+    def __init__(self, latencia_ms=0, variacao_ms=0, taxa_erro=0.0, taxa_nao_imagem=0.0,
+                 taxa_tiff=0.0, largura=2400, altura=3600, pasta=None, semente=0):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.taxa_erro = taxa_erro
+        self.taxa_nao_imagem = taxa_nao_imagem
+        self.taxa_tiff = taxa_tiff
+        self.largura = largura
+        self.altura = altura
+        self.rng = random.Random(semente)
+        self.arquivos = sorted(
+            os.path.join(pasta, f) for f in os.listdir(pasta)
+            if f.lower().endswith((".jpg", ".jpeg", ".tif", ".tiff", ".png"))
+        ) if pasta else []
+        self._cache = {}
+        self._trava = threading.Lock()
+
+    def imagem(self, file_id):
+        """Returns (content type, bytes) of a file id, generated once."""
+        with self._trava:
+            if file_id in self._cache:
+                return self._cache[file_id]
+
+        semente = int(hashlib.sha1(file_id.encode()).hexdigest()[:8], 16)
+
+        if self.arquivos:
+            caminho = self.arquivos[semente % len(self.arquivos)]
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            tipo = "image/tiff" if caminho.lower().endswith((".tif", ".tiff")) else "image/jpeg"
+        else:
+            tiff = (semente % 1000) / 1000 < self.taxa_tiff
+            dados = gerar_exsicata(semente, self.largura, self.altura, "TIFF" if tiff else "JPEG")
+            tipo = "image/tiff" if tiff else "image/jpeg"
+
+        with self._trava:
+            self._cache[file_id] = (tipo, dados)
+
+        return tipo, dados
+
+
+class _DriveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    drive = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _enviar(self, status, tipo, dados):
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        drive = self.drive
+        url = urlparse(self.path)
+        file_id = (parse_qs(url.query).get("id") or [""])[0]
+
+        atraso = drive.latencia_ms + drive.rng.uniform(0, drive.variacao_ms)
+        if atraso:
+            time.sleep(atraso / 1000)
+
+        sorteio = drive.rng.random()
+
+        if not file_id or file_id.startswith("inexistente"):
+            self._enviar(404, "text/html; charset=utf-8", b"<html><body>Not Found</body></html>")
+        elif sorteio < drive.taxa_erro:
+            self._enviar(500, "text/html; charset=utf-8", b"<html><body>Internal Error</body></html>")
+        elif sorteio < drive.taxa_erro + drive.taxa_nao_imagem:
+            self._enviar(
+                200, "text/html; charset=utf-8",
+                b"<html><head><title>Google Drive - Virus scan warning</title></head>"
+                b"<body>Google Drive can't scan this file for viruses.</body></html>"
+            )
+        else:
+            tipo, dados = drive.imagem(file_id)
+            self._enviar(200, tipo, dados)
+
+
+# -------------------------------------------------
+# Pl@ntNet stand-in
+# -------------------------------------------------
+class PlantNetFalso:
+    """
+    Configuration and state of the Pl@ntNet stand-in.
+
+    latencia_ms / variacao_ms: identification time.
+    cota: identifications available "today"; when it reaches zero every
+    request gets HTTP 429, like the real daily quota.
+    limite_por_segundo: requests per second before throttling with 429.
+    taxa_erro: fraction of requests answered with HTTP 500.
+    """
+
+    def __init__(self, latencia_ms=0, variacao_ms=0, cota=500, limite_por_segundo=None,
+                 taxa_erro=0.0, semente=0):
+        self.latencia_ms = latencia_ms
+        self.variacao_ms = variacao_ms
+        self.restantes = cota
+        self.limite_por_segundo = limite_por_segundo
+        self.taxa_erro = taxa_erro
+        self.rng = random.Random(semente)
+        self._janela = []
+        self._trava = threading.Lock()
+
+    def _limitado(self):
+        if not self.limite_por_segundo:
+            return False
+
+        agora = time.monotonic()
+        with self._trava:
+            self._janela = [t for t in self._janela if agora - t < 1.0]
+            if len(self._janela) >= self.limite_por_segundo:
+                return True
+            self._janela.append(agora)
+
+        return False
+
+    def resultado(self, organ):
+        """A plausible identification: 5 species with decreasing scores."""
+        familias = list(FAMILIAS)
+        scores = sorted((self.rng.random() ** 2 for _ in range(5)), reverse=True)
+        results = []
+
+        for score in scores:
+            familia = self.rng.choice(familias)
+            genero = self.rng.choice(FAMILIAS[familia])
+            epiteto = self.rng.choice(EPITETOS)
+            autor = self.rng.choice(AUTORES)
+            nome = f"{genero} {epiteto}"
+
+            results.append({
+                "score": round(score * 0.9, 5),
+                "species": {
+                    "scientificNameWithoutAuthor": nome,
+                    "scientificNameAuthorship": autor,
+                    "genus": {"scientificNameWithoutAuthor": genero, "scientificNameAuthorship": "", "scientificName": genero},
+                    "family": {"scientificNameWithoutAuthor": familia, "scientificNameAuthorship": "", "scientificName": familia},
+                    "commonNames": [],
+                    "scientificName": f"{nome} {autor}",
+                },
+                "gbif": {"id": str(self.rng.randint(2_000_000, 9_000_000))},
+                "powo": {"id": f"{self.rng.randint(100000, 999999)}-1"},
+            })
+
+        with self._trava:
+            self.restantes -= 1
+            restantes = self.restantes
+
+        return {
+            "query": {"project": "all", "images": ["image.jpg"], "organs": [organ or "auto"], "includeRelatedImages": False},
+            "predictedOrgans": [{"image": "image.jpg", "filename": "image.jpg", "organ": organ if organ not in (None, "auto") else "leaf", "score": round(self.rng.uniform(0.5, 0.99), 5)}],
+            "language": "en",
+            "preferedReferential": "k-world-flora",
+            "bestMatch": results[0]["species"]["scientificName"],
+            "results": results,
+            "version": "2025-01-17 (7.3)",
+            "remainingIdentificationRequests": restantes,
+        }
+
+
+class _PlantNetHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    plantnet = None
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _enviar(self, status, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        p = self.plantnet
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b""
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if not url.path.startswith("/v2/identify/"):
+            self._enviar(404, {"statusCode": 404, "error": "Not Found", "message": "Not Found"})
+            return
+
+        if not params.get("api-key"):
+            self._enviar(401, {"statusCode": 401, "error": "Unauthorized", "message": "Invalid API key"})
+            return
+
+        if p.restantes <= 0 or p._limitado():
+            self._enviar(429, {"statusCode": 429, "error": "Too Many Requests", "message": "Too Many Requests"})
+            return
+
+        atraso = p.latencia_ms + p.rng.uniform(0, p.variacao_ms)
+        if atraso:
+            time.sleep(atraso / 1000)
+
+        if p.rng.random() < p.taxa_erro:
+            self._enviar(500, {"statusCode": 500, "error": "Internal Server Error", "message": "An internal server error occurred"})
+            return
+
+        organ = None
+        if b'name="organs"' in corpo:
+            organ = corpo.split(b'name="organs"', 1)[1].split(b"\r\n\r\n", 1)[1].split(b"\r\n", 1)[0].decode()
+
+        self._enviar(200, p.resultado(organ))
+
+
+# -------------------------------------------------
+# Start / stop
+# -------------------------------------------------
+def iniciar(drive=None, plantnet=None, host="127.0.0.1", porta_drive=0, porta_plantnet=0):
+    """
+    Starts both stand-ins in background threads. Port 0 picks a free port.
+    Returns (drive_url, plantnet_url, parar), where parar() shuts them down.
+    """
+    drive = drive or DriveFalso()
+    plantnet = plantnet or PlantNetFalso()
+
+    servidores = [
+        ThreadingHTTPServer((host, porta_drive), type("Drive", (_DriveHandler,), {"drive": drive})),
+        ThreadingHTTPServer((host, porta_plantnet), type("PlantNet", (_PlantNetHandler,), {"plantnet": plantnet})),
+    ]
+
+    for servidor in servidores:
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    drive_url = f"http://{host}:{servidores[0].server_address[1]}/uc"
+    plantnet_url = f"http://{host}:{servidores[1].server_address[1]}/v2/identify/all"
+
+    def parar():
+        for servidor in servidores:
+            servidor.shutdown()
+            servidor.server_close()
+
+    return drive_url, plantnet_url, parar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-ins for Google Drive and Pl@ntNet.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--drive-port", type=int, default=8601)
+    parser.add_argument("--plantnet-port", type=int, default=8602)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Drive download latency.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra latency (both servers).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Drive requests failing with 500.")
+    parser.add_argument("--non-image-rate", type=float, default=0.0, help="Fraction of Drive requests returning HTML.")
+    parser.add_argument("--tiff-rate", type=float, default=0.0, help="Fraction of scans served as TIFF.")
+    parser.add_argument("--scans", help="Folder with real scans to serve instead of synthetic sheets.")
+    parser.add_argument("--plantnet-latency-ms", type=float, default=0)
+    parser.add_argument("--plantnet-error-rate", type=float, default=0.0)
+    parser.add_argument("--quota", type=int, default=500, help="Pl@ntNet identifications available.")
+    parser.add_argument("--rate-limit", type=float, help="Pl@ntNet requests per second before HTTP 429.")
+    args = parser.parse_args(argv)
+
+    drive = DriveFalso(args.latency_ms, args.jitter_ms, args.error_rate, args.non_image_rate,
+                       args.tiff_rate, pasta=args.scans)
+    plantnet = PlantNetFalso(args.plantnet_latency_ms, args.jitter_ms, args.quota,
+                             args.rate_limit, args.plantnet_error_rate)
+
+    drive_url, plantnet_url, parar = iniciar(drive, plantnet, args.host, args.drive_port, args.plantnet_port)
+    print(f"BIOCURATE_DRIVE_URL={drive_url}")
+    print(f"BIOCURATE_PLANTNET_URL={plantnet_url}", flush=True)
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# -----------------------------------------------
+# Synthetic Darwin Core datasets for benchmarks
+#
+# Generates HUAM-like Metadata sheets of any size: Amazonian families and
+# genera with a long-tailed distribution, HUAM accession numbers, blocks,
+# collectors, partial dates and storage locations. The same seed always
+# produces the same dataset.
+#
+# Usage:
+#   python -m benchmarks.synthetic 100000 -o base_100k.csv
+# -----------------------------------------------
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+# Family -> genera, roughly following the most collected groups in HUAM.
+FAMILIAS = {
+    "Fabaceae": ["Inga", "Swartzia", "Tachigali", "Parkia", "Dipteryx", "Mimosa", "Machaerium"],
+    "Rubiaceae": ["Psychotria", "Palicourea", "Duroia", "Amaioua", "Faramea"],
+    "Melastomataceae": ["Miconia", "Clidemia", "Bellucia", "Mouriri"],
+    "Lauraceae": ["Ocotea", "Licaria", "Aniba", "Nectandra", "Mezilaurus"],
+    "Myrtaceae": ["Eugenia", "Myrcia", "Calyptranthes", "Psidium"],
+    "Annonaceae": ["Guatteria", "Duguetia", "Xylopia", "Unonopsis"],
+    "Sapotaceae": ["Pouteria", "Micropholis", "Chrysophyllum", "Manilkara"],
+    "Chrysobalanaceae": ["Licania", "Hirtella", "Couepia", "Parinari"],
+    "Lecythidaceae": ["Eschweilera", "Lecythis", "Couratari", "Bertholletia"],
+    "Moraceae": ["Brosimum", "Ficus", "Pseudolmedia", "Naucleopsis"],
+    "Euphorbiaceae": ["Croton", "Mabea", "Hevea", "Micrandra"],
+    "Burseraceae": ["Protium", "Tetragastris", "Trattinnickia"],
+    "Malvaceae": ["Theobroma", "Apeiba", "Lueheopsis", "Scleronema"],
+    "Arecaceae": ["Astrocaryum", "Bactris", "Euterpe", "Oenocarpus", "Attalea"],
+    "Piperaceae": ["Piper", "Peperomia"],
+    "Apocynaceae": ["Aspidosperma", "Himatanthus", "Couma", "Tabernaemontana"],
+    "Clusiaceae": ["Clusia", "Garcinia", "Symphonia"],
+    "Vochysiaceae": ["Qualea", "Vochysia", "Erisma"],
+    "Bignoniaceae": ["Jacaranda", "Handroanthus", "Adenocalymma"],
+    "Orchidaceae": ["Epidendrum", "Maxillaria", "Catasetum", "Sobralia"],
+    "Bromeliaceae": ["Aechmea", "Guzmania", "Pitcairnia"],
+    "Poaceae": ["Paspalum", "Olyra", "Pariana"],
+    "Cyperaceae": ["Rhynchospora", "Scleria", "Cyperus"],
+    "Marantaceae": ["Goeppertia", "Ischnosiphon", "Monotagma"],
+}
+
+EPITETOS = [
+    "guianensis", "amazonica", "paraensis", "duckei", "longifolia", "grandiflora",
+    "macrophylla", "sprucei", "elegans", "cuspidata", "laurifolia", "obtusifolia",
+    "rufescens", "tomentosa", "glabra", "pubescens", "acuminata", "coriacea",
+    "lanceolata", "parviflora", "ferruginea", "rubra", "alba", "nitida",
+]
+
+AUTORES = ["Aubl.", "Benth.", "Ducke", "Mart.", "Spruce ex Benth.", "(Mart.) Miq.", "Kunth", "Huber", "Sandwith"]
+
+COLETORES = [
+    "Ducke, A.", "Prance, G.T.", "Rodrigues, W.A.", "Cid, C.A.", "Vicentini, A.",
+    "Ribeiro, J.E.L.S.", "Hopkins, M.J.G.", "Assunção, P.A.C.L.", "Nascimento, J.R.",
+    "Mori, S.A.", "Loureiro, A.A.", "Ferreira, C.A.C.", "Coêlho, D.F.", "Silva, M.F.",
+    "Lima, M.P.M.", "Souza, M.A.D.", "Zartman, C.E.", "Amaral, I.L.", "Costa, M.A.S.",
+    "Mesquita, R.C.G.",
+]
+
+
+def gerar_base(n, seed=42, taxa_duplicatas=0.02):
+    """
+    Generates a synthetic Metadata sheet with n rows.
+
+    Families follow a Zipf-like distribution (a few very large families and
+    a long tail), about 15% of the specimens are determined only to genus,
+    dates are sometimes partial and a fraction `taxa_duplicatas` of the rows
+    repeats an earlier gathering under a new accession number.
+    """
+    rng = np.random.default_rng(seed)
+
+    familias = np.array(list(FAMILIAS))
+    pesos = 1.0 / np.arange(1, len(familias) + 1) ** 1.1
+    fam_idx = rng.choice(len(familias), size=n, p=pesos / pesos.sum())
+
+    family = familias[fam_idx]
+    genus = np.array([
+        FAMILIAS[familias[i]][j % len(FAMILIAS[familias[i]])]
+        for i, j in zip(fam_idx, rng.integers(0, 1000, size=n))
+    ])
+
+    epiteto = np.array(EPITETOS)[rng.integers(0, len(EPITETOS), size=n)]
+    so_genero = rng.random(n) < 0.15
+    specific_epithet = np.where(so_genero, None, epiteto)
+    scientific_name = np.where(so_genero, None, np.char.add(np.char.add(genus, " "), epiteto))
+    autoria = np.where(so_genero, None, np.array(AUTORES)[rng.integers(0, len(AUTORES), size=n)])
+
+    coletores = np.array(COLETORES)
+    recorded_by = coletores[rng.integers(0, len(coletores), size=n)]
+    add_collector = np.where(
+        rng.random(n) < 0.4,
+        coletores[rng.integers(0, len(coletores), size=n)],
+        None
+    )
+    record_number = rng.integers(1, 20000, size=n).astype(float)
+
+    ano = rng.integers(1930, 2025, size=n).astype(float)
+    mes = rng.integers(1, 13, size=n).astype(float)
+    dia = rng.integers(1, 29, size=n).astype(float)
+    mes[rng.random(n) < 0.08] = np.nan
+    dia[np.isnan(mes) | (rng.random(n) < 0.12)] = np.nan
+    ano[rng.random(n) < 0.03] = np.nan
+
+    # Blocks group ~50 specimens; the sheet returns them as floats (321.0)
+    bloco = (np.arange(n) // 50 + 1).astype(float)
+    armario = fam_idx * 3 + rng.integers(1, 4, size=n)
+    prateleira = rng.integers(1, 9, size=n)
+    local = np.char.add(
+        np.char.add("Armário ", armario.astype(str)),
+        np.char.add(" - Prateleira ", prateleira.astype(str))
+    )
+
+    df = pd.DataFrame({
+        "collectionCode": [f"HUAM{i:06d}" for i in range(1, n + 1)],
+        "catalogNumber": np.arange(1, n + 1),
+        "recordedBy": recorded_by,
+        "addCollector": add_collector,
+        "recordNumber": record_number,
+        "dayCollected": dia,
+        "monthCollected": mes,
+        "yearCollected": ano,
+        "family": family,
+        "genus": genus,
+        "specificEpithet": specific_epithet,
+        "scientificName": scientific_name,
+        "scientificNameAuthorship": autoria,
+        "fieldNumber": bloco,
+        "dynamicProperties": local,
+    })
+
+    # Same gathering entered again under another accession number
+    n_dup = int(n * taxa_duplicatas)
+    if n_dup:
+        origem = rng.choice(n, size=n_dup, replace=False)
+        destino = rng.choice(n, size=n_dup, replace=False)
+        colunas = ["recordedBy", "addCollector", "recordNumber", "dayCollected",
+                   "monthCollected", "yearCollected", "family", "genus",
+                   "specificEpithet", "scientificName", "scientificNameAuthorship"]
+        df.loc[destino, colunas] = df.loc[origem, colunas].to_numpy()
+
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Darwin Core dataset.")
+    parser.add_argument("linhas", type=int, help="Number of rows.")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv or .parquet).")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    df = gerar_base(args.linhas, seed=args.seed)
+    if args.output.lower().endswith(".parquet"):
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# -----------------------------------------------
+# BioCurate – shared engine
+#
+# Data loading, search and image helpers used by both app modules
+# (app.py / en_app.py). Only biocurate.ui imports Streamlit, so the rest
+# can also be used from scripts and the command line.
+# -----------------------------------------------
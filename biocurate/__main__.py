@@ -0,0 +1,4 @@
+from biocurate.cli import main
+
+
+main()
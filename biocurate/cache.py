@@ -0,0 +1,92 @@
+# -----------------------------------------------
+# Process-wide LRU caches with a byte budget
+#
+# Shared by all sessions of the app process (e.g. Drive image bytes).
+# Hits and misses are reported to biocurate.tracing under the cache name.
+# Every cache registers itself, so the memory view can list and empty them.
+# -----------------------------------------------
+
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+from biocurate import tracing
+
+
+_registro = weakref.WeakSet()
+
+
+def caches():
+    """Live caches of the process, by name."""
+    return sorted(_registro, key=lambda c: c.nome)
+
+
+def _tamanho(valor):
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLRU:
+    """
+    Least-recently-used cache limited by the total size of its values.
+    Thread-safe; values larger than the whole budget are not stored.
+    """
+
+    def __init__(self, nome, max_bytes):
+        self.nome = nome
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+        _registro.add(self)
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def get(self, chave, padrao=None):
+        with self._trava:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                valor = self._itens[chave][0]
+                acerto = True
+            else:
+                valor = padrao
+                acerto = False
+
+        tracing.registrar_cache(self.nome, acerto)
+        return valor
+
+    def put(self, chave, valor, tamanho=None):
+        """Stores valor; `tamanho` overrides the size estimate (in bytes)."""
+        tamanho = _tamanho(valor) if tamanho is None else tamanho
+        if tamanho > self.max_bytes:
+            return
+
+        with self._trava:
+            if chave in self._itens:
+                self.bytes -= self._itens.pop(chave)[1]
+
+            self._itens[chave] = (valor, tamanho)
+            self.bytes += tamanho
+
+            while self.bytes > self.max_bytes:
+                _, (_, removido) = self._itens.popitem(last=False)
+                self.bytes -= removido
+
+    def obter_ou_calcular(self, chave, funcao):
+        """Returns the cached value, or computes, stores and returns it."""
+        valor = self.get(chave)
+        if valor is None:
+            valor = funcao()
+            self.put(chave, valor)
+        return valor
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+            self.bytes = 0
@@ -0,0 +1,373 @@
+# -----------------------------------------------
+# Offline name matching against a local checklist
+#
+# Loads a taxonomic backbone exported as a Darwin Core taxon table (WFO
+# classification file, Flora e Funga do Brasil IPT export, CSV/TSV or
+# DwC-A zip) into a compact index of canonical names, and matches every
+# distinct scientificName, genus and family of a dataset in three tiers:
+#
+#   exato     - same name and authorship
+#   canonico  - same name once authorship, rank markers, hybrid signs,
+#               accents and case are removed
+#   fuzzy     - closest name above SIMILARIDADE_MINIMA: the genus is
+#               matched first, then the epithets within that genus
+#
+# Matches are cached per checklist, so re-checking a new version of the
+# dataset only matches names that were not seen before.
+# -----------------------------------------------
+
+import hashlib
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from difflib import get_close_matches
+
+import numpy as np
+import pandas as pd
+
+from biocurate.dwca import ler_dwca
+from biocurate.texto import dobrar
+from biocurate.tracing import span
+
+
+# Checklist loaded at startup when present (offline installations).
+ARQUIVO_CHECKLIST = os.environ.get("BIOCURATE_CHECKLIST")
+
+SIMILARIDADE_MINIMA = 0.85
+
+# Uploaded checklists kept in memory at the same time.
+MAX_CHECKLISTS = 2
+
+# Columns read from the checklist (when present).
+COLUNAS_CHECKLIST = [
+    "taxonID", "scientificName", "scientificNameAuthorship", "taxonomicStatus", "acceptedNameUsageID", "acceptedNameUsage", "family",
+]
+
+# Dataset columns checked
+CAMPOS = ["scientificName", "genus", "family"]
+
+# Rank and qualifier markers, and the ASCII hybrid sign ("Inga x bourgonii")
+MARCADORES = {"var", "subsp", "ssp", "f", "forma", "fo", "subvar", "cf", "aff", "nothosubsp", "nothovar", "x"}
+
+_trava = threading.Lock()
+_checklists = OrderedDict()
+_checklist_local = None
+
+
+def nome_canonico(nome):
+    """
+    Canonical form of a scientific name: accent-free, lower case, without
+    authorship, rank markers or hybrid signs.
+    "Inga edulis Mart." -> "inga edulis"; "Ocotea ×foo var. bar (Nees) Mez"
+    -> "ocotea foo bar"; "Inga x bourgonii" -> "inga bourgonii";
+    "Lauraceae" -> "lauraceae".
+    """
+    if not isinstance(nome, str):
+        return ""
+
+    palavras = nome.replace("×", " ").split()
+    if not palavras:
+        return ""
+
+    partes = [palavras[0]]
+    for palavra in palavras[1:]:
+        limpa = palavra.strip(".,;")
+        if limpa.lower() in MARCADORES:
+            continue
+        # Authorship starts at the first capitalized word, "(" or "&"
+        if not limpa or not limpa[0].isalpha() or not limpa[0].islower() or palavra.endswith("."):
+            break
+        partes.append(limpa)
+
+    return " ".join(dobrar(p) for p in partes)
+
+
+def _nome_completo(nome, autoria):
+    texto = f"{nome} {autoria}" if isinstance(autoria, str) and autoria.strip() and autoria not in nome else nome
+    return re.sub(r"\s+", " ", dobrar(texto)).strip()
+
+
+def _status(status):
+    texto = dobrar(status)
+    if "aceit" in texto or "accepted" in texto:
+        return "aceito"
+    if "sinon" in texto or "synonym" in texto:
+        return "sinonimo"
+    return texto or "desconhecido"
+
+
+def _separador(arquivo):
+    """Tab when the header line has tabs (WFO classification.csv), else comma."""
+    if hasattr(arquivo, "read"):
+        posicao = arquivo.tell()
+        cabecalho = arquivo.readline()
+        arquivo.seek(posicao)
+    else:
+        with open(arquivo, "rb") as f:
+            cabecalho = f.readline()
+    if isinstance(cabecalho, bytes):
+        cabecalho = cabecalho.decode("utf-8", errors="ignore")
+    return "\t" if cabecalho.count("\t") > cabecalho.count(",") else ","
+
+
+@span("checklist.carregar")
+def ler_checklist(arquivo, nome=None):
+    """
+    Reads a checklist file (CSV/TSV or DwC-A zip, path or file-like
+    object) and builds its Checklist.
+    """
+    nome = (nome or getattr(arquivo, "name", "") or str(arquivo)).lower()
+
+    if nome.endswith(".zip"):
+        df = ler_dwca(arquivo)
+    else:
+        df = pd.read_csv(
+            arquivo,
+            sep=_separador(arquivo),
+            dtype=str,
+            keep_default_na=False,
+            na_values=[""],
+            usecols=lambda c: c in COLUNAS_CHECKLIST,
+            quoting=3 if nome.endswith((".txt", ".tsv")) else 0,
+        )
+
+    return Checklist(df)
+
+
+class Checklist:
+    """
+    Compact index of a checklist: one row per name with its canonical key,
+    status, accepted name and family, plus lookup tables by full name,
+    canonical key and genus. match() results are cached.
+    """
+
+    def __init__(self, df):
+        if "scientificName" not in df.columns:
+            raise ValueError("The checklist has no scientificName column.")
+
+        vazio = pd.Series(np.nan, index=df.index, dtype=object)
+        nomes = df["scientificName"].astype(str)
+        autoria = df.get("scientificNameAuthorship", vazio)
+
+        tabela = pd.DataFrame({
+            "nome": nomes.to_numpy(),
+            "autoria": autoria.to_numpy(),
+            "status": pd.Categorical(df.get("taxonomicStatus", vazio).map(_status)),
+            "familia": pd.Categorical(df.get("family", vazio)),
+        })
+        tabela["chave"] = nomes.map(nome_canonico).to_numpy()
+        tabela["completo"] = [_nome_completo(n, a) for n, a in zip(tabela["nome"], tabela["autoria"])]
+
+        # Accepted name of synonyms, through acceptedNameUsageID when given
+        aceito = df.get("acceptedNameUsage", vazio).to_numpy(dtype=object)
+        if "acceptedNameUsageID" in df.columns and "taxonID" in df.columns:
+            por_id = pd.Series(nomes.to_numpy(), index=df["taxonID"].to_numpy())
+            por_id = por_id[~por_id.index.duplicated()]
+            resolvido = df["acceptedNameUsageID"].map(por_id).to_numpy(dtype=object)
+            aceito = np.where(pd.isna(resolvido), aceito, resolvido)
+        tabela["aceito"] = np.where(tabela["status"].to_numpy() == "aceito", tabela["nome"], aceito)
+
+        # Accepted names first, so each key points to the accepted usage
+        prioridade = (tabela["status"].to_numpy() != "aceito").astype(int)
+        tabela = tabela.iloc[np.argsort(prioridade, kind="stable")]
+        tabela = tabela[tabela["chave"] != ""].reset_index(drop=True)
+        self.tabela = tabela
+
+        # First row (accepted, when there is one) of each full name and key
+        self._por_completo = dict(zip(tabela["completo"][::-1], tabela.index[::-1]))
+        self._por_chave = dict(zip(tabela["chave"][::-1], tabela.index[::-1]))
+
+        self._colunas = {c: tabela[c].to_numpy(dtype=object) for c in ("nome", "autoria", "status", "aceito", "familia")}
+
+        chaves = pd.Series(list(self._por_chave))
+        genero = chaves.str.split(" ", n=1).str[0]
+        self._generos = sorted(set(genero[chaves.str.contains(" ")]) | set(chaves[~chaves.str.contains(" ")]))
+        self._por_genero = chaves.groupby(genero.to_numpy()).agg(list).to_dict()
+
+        self._cache = {}
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self.tabela)
+
+    def _fuzzy(self, chave):
+        """Closest canonical key: genus first, then epithets in that genus."""
+        genero, _, resto = chave.partition(" ")
+
+        if genero not in self._por_genero:
+            parecidos = get_close_matches(
+                genero, [g for g in self._generos if g[:1] == genero[:1]], n=1, cutoff=SIMILARIDADE_MINIMA
+            )
+            if not parecidos:
+                return None
+            genero = parecidos[0]
+            if not resto:
+                return genero if genero in self._por_chave else None
+
+        candidatos = [c for c in self._por_genero.get(genero, []) if c.count(" ") == chave.count(" ")]
+        alvo = f"{genero} {resto}".strip()
+        if alvo in self._por_chave:
+            return alvo
+
+        parecidos = get_close_matches(alvo, candidatos, n=1, cutoff=SIMILARIDADE_MINIMA)
+        return parecidos[0] if parecidos else None
+
+    def match(self, nome, autoria=None):
+        """
+        Match of one name: dict with nivel (exato, canonico, fuzzy or
+        sem_correspondencia), correspondencia, autoria, status, aceito and
+        familia of the matched checklist name.
+        """
+        chave_cache = (nome, autoria)
+        resultado = self._cache.get(chave_cache)
+        if resultado is not None:
+            return resultado
+
+        linha = None
+        nivel = "sem_correspondencia"
+        chave = nome_canonico(nome)
+
+        completo = _nome_completo(nome, autoria) if isinstance(nome, str) else ""
+        if completo in self._por_completo and (autoria or completo != chave):
+            linha, nivel = self._por_completo[completo], "exato"
+        elif chave in self._por_chave:
+            linha, nivel = self._por_chave[chave], "canonico"
+        elif chave:
+            parecido = self._fuzzy(chave)
+            if parecido is not None:
+                linha, nivel = self._por_chave[parecido], "fuzzy"
+
+        resultado = {"nivel": nivel}
+        if linha is not None:
+            resultado.update({
+                saida: self._colunas[coluna][linha]
+                for saida, coluna in (("correspondencia", "nome"), ("autoria", "autoria"), ("status", "status"),
+                                      ("aceito", "aceito"), ("familia", "familia"))
+            })
+
+        with self._trava:
+            self._cache[chave_cache] = resultado
+        return resultado
+
+    @span("checklist.conferir")
+    def conferir_base(self, df):
+        """
+        Matches every distinct scientificName, genus and family of the
+        dataset. One row per (campo, nome) with the number of records,
+        the match tier and the matched name, status, accepted name and
+        family (for scientificName and genus, "familia_base" is the
+        family used in the dataset when it differs from the checklist).
+        """
+        partes = []
+
+        for campo in CAMPOS:
+            if campo not in df.columns:
+                continue
+
+            chaves = [campo]
+            if campo == "scientificName" and "scientificNameAuthorship" in df.columns:
+                chaves.append("scientificNameAuthorship")
+            com_familia = campo != "family" and "family" in df.columns
+
+            dados = df[chaves + (["family"] if com_familia else [])].dropna(subset=[campo])
+            contagem = dados.groupby(chaves, dropna=False, sort=False).size().rename("registros").reset_index()
+
+            if com_familia:
+                # Most common family of each name in the dataset
+                familias = (
+                    dados.value_counts(dropna=False).reset_index(name="n")
+                    .drop_duplicates(chaves)
+                    .rename(columns={"family": "familia_base"})
+                    .drop(columns="n")
+                )
+                contagem = contagem.merge(familias, on=chaves, how="left")
+
+            autoria = contagem[chaves[1]] if len(chaves) > 1 else [None] * len(contagem)
+            resultados = pd.DataFrame(
+                [self.match(n, a if isinstance(a, str) else None) for n, a in zip(contagem[campo], autoria)],
+                index=contagem.index,
+            )
+
+            parte = pd.concat([contagem.rename(columns={campo: "nome"}), resultados], axis=1)
+            parte.insert(0, "campo", campo)
+            partes.append(parte)
+
+        if not partes:
+            return pd.DataFrame(columns=["campo", "nome", "registros", "nivel"])
+
+        resultado = pd.concat(partes, ignore_index=True)
+        for coluna in ("correspondencia", "status", "aceito", "familia"):
+            if coluna not in resultado.columns:
+                resultado[coluna] = None
+        return resultado.rename(columns={"scientificNameAuthorship": "autoria_base"})
+
+
+def revisar(conferencia):
+    """
+    Names that need a curator's attention: no match, fuzzy matches,
+    synonyms and names filed under a family other than the checklist's.
+    Adds a "motivo" column.
+    """
+    motivos = pd.Series("", index=conferencia.index)
+
+    familia_base = conferencia.get("familia_base", pd.Series(np.nan, index=conferencia.index))
+    familia_diferente = (
+        familia_base.notna() & conferencia["familia"].notna()
+        & (familia_base.astype(str).str.upper() != conferencia["familia"].astype(str).str.upper())
+    )
+
+    for mascara, motivo in (
+        (conferencia["nivel"] == "sem_correspondencia", "sem_correspondencia"),
+        (conferencia["nivel"] == "fuzzy", "grafia"),
+        (conferencia["status"] == "sinonimo", "sinonimo"),
+        (familia_diferente, "familia"),
+    ):
+        motivos[mascara] = np.where(motivos[mascara] == "", motivo, motivos[mascara] + ", " + motivo)
+
+    revisao = conferencia.assign(motivo=motivos)
+    return revisao[revisao["motivo"] != ""].sort_values("registros", ascending=False).reset_index(drop=True)
+
+
+def checklist_de_arquivo(arquivo, nome=None):
+    """
+    Checklist of an uploaded file, shared by every session that sends the
+    same content (the last MAX_CHECKLISTS files are kept), so its match
+    cache is reused.
+    """
+    conteudo = arquivo.getvalue() if hasattr(arquivo, "getvalue") else arquivo.read()
+    chave = hashlib.sha1(conteudo).hexdigest()
+
+    with _trava:
+        checklist = _checklists.get(chave)
+        if checklist is not None:
+            _checklists.move_to_end(chave)
+            return checklist
+
+    fluxo = io.BytesIO(conteudo)
+    fluxo.name = nome or getattr(arquivo, "name", "")
+    checklist = ler_checklist(fluxo)
+
+    with _trava:
+        _checklists[chave] = checklist
+        while len(_checklists) > MAX_CHECKLISTS:
+            _checklists.popitem(last=False)
+
+    return checklist
+
+
+def checklist_local():
+    """
+    Checklist of BIOCURATE_CHECKLIST, loaded once per process, or None
+    when the variable is not set.
+    """
+    global _checklist_local
+
+    if not ARQUIVO_CHECKLIST:
+        return None
+
+    with _trava:
+        if _checklist_local is None:
+            _checklist_local = ler_checklist(ARQUIVO_CHECKLIST)
+    return _checklist_local
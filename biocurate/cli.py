@@ -0,0 +1,205 @@
+# -----------------------------------------------
+# BioCurate command line
+#
+# Usage:
+#   python -m biocurate lookup codes.txt --db snapshot.parquet -o result.csv
+#   python -m biocurate serve --db snapshot.parquet --port 8502
+#   python -m biocurate names --db snapshot.parquet --checklist classification.csv -o names.csv
+# -----------------------------------------------
+
+import argparse
+import sys
+import time
+from itertools import islice
+
+from biocurate.dataset import ler_base
+from biocurate.exportacao import SaidaCSV, SaidaParquet, SaidaXLSX
+from biocurate.search import tabela_chaves, juntar_tombos
+
+
+def _ler_codigos(arquivo, tamanho):
+    """
+    Reads the codes file (one code per line, as in imaging logs) in blocks
+    of `tamanho` lines. Blank lines are skipped.
+    """
+    while True:
+        linhas = [l.strip() for l in islice(arquivo, tamanho)]
+        if not linhas:
+            return
+
+        linhas = [l for l in linhas if l]
+        if linhas:
+            yield linhas
+
+
+def _abrir_saida(caminho, formato):
+    if formato is None:
+        extensao = caminho.lower().rsplit(".", 1)[-1] if caminho else ""
+        formato = extensao if extensao in ("parquet", "xlsx") else "csv"
+
+    if formato in ("parquet", "xlsx"):
+        if not caminho or caminho == "-":
+            raise SystemExit(f"{formato.capitalize()} output needs a file name (-o result.{formato}).")
+        return SaidaParquet(caminho) if formato == "parquet" else SaidaXLSX(caminho)
+
+    if not caminho or caminho == "-":
+        return SaidaCSV(sys.stdout)
+
+    return SaidaCSV(open(caminho, "w", encoding="utf-8", newline=""))
+
+
+def comando_lookup(args):
+    inicio = time.perf_counter()
+    df = ler_base(args.db)
+    base_chaves = tabela_chaves(df, args.column)
+    carga = time.perf_counter() - inicio
+
+    colunas = args.columns.split(",") if args.columns else None
+    if colunas:
+        faltando = [c for c in colunas if c not in base_chaves.columns]
+        if faltando:
+            raise SystemExit(f"Unknown columns: {', '.join(faltando)}")
+
+    entrada = sys.stdin if args.codes == "-" else open(args.codes, encoding="utf-8")
+    saida = _abrir_saida(args.output, args.format)
+
+    total = encontrados = 0
+    inicio = time.perf_counter()
+
+    try:
+        for codigos in _ler_codigos(entrada, args.chunk_size):
+            resultado = juntar_tombos(codigos, base_chaves, colunas)
+
+            # Each code not found produces exactly one row
+            nao_encontrados = int((~resultado["encontrado"]).sum())
+            total += len(codigos)
+            encontrados += len(codigos) - nao_encontrados
+
+            if args.only_found:
+                resultado = resultado[resultado["encontrado"]]
+
+            saida.escrever(resultado)
+    finally:
+        saida.fechar()
+        if entrada is not sys.stdin:
+            entrada.close()
+
+    duracao = time.perf_counter() - inicio
+    taxa = total / duracao if duracao > 0 else float("inf")
+
+    print(
+        f"{total} codes, {encontrados} found, {total - encontrados} not found | "
+        f"dataset loaded in {carga:.2f}s, lookup {duracao:.2f}s ({taxa:,.0f} codes/s)",
+        file=sys.stderr
+    )
+
+
+def comando_names(args):
+    from biocurate.checklist import ler_checklist, revisar
+
+    inicio = time.perf_counter()
+    df = ler_base(args.db)
+    checklist = ler_checklist(args.checklist)
+    carga = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    conferencia = checklist.conferir_base(df)
+    duracao = time.perf_counter() - inicio
+
+    saida = _abrir_saida(args.output, args.format)
+    try:
+        saida.escrever(conferencia if args.all else revisar(conferencia))
+    finally:
+        saida.fechar()
+
+    niveis = conferencia["nivel"].value_counts()
+    print(
+        f"{len(conferencia)} distinct names | "
+        + ", ".join(f"{nivel} {quantidade}" for nivel, quantidade in niveis.items())
+        + f" | checklist of {len(checklist)} names loaded in {carga:.2f}s, matching {duracao:.2f}s",
+        file=sys.stderr
+    )
+
+
+def comando_serve(args):
+    from biocurate.server import ServicoLookup, criar_servidor
+
+    inicio = time.perf_counter()
+    servico = ServicoLookup(ler_base(args.db))
+    servidor = criar_servidor(servico, args.host, args.port)
+
+    print(
+        f"{servico.total} records indexed in {time.perf_counter() - inicio:.2f}s | "
+        f"listening on http://{args.host}:{args.port}",
+        file=sys.stderr
+    )
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="biocurate",
+        description="BioCurate command line tools."
+    )
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    lookup = sub.add_parser(
+        "lookup",
+        help="Resolve a list of accession numbers against a dataset.",
+        description=(
+            "Resolve accession numbers (one per line, HUAM001245, 1245 or URLs) "
+            "against a dataset snapshot and write the matching records."
+        )
+    )
+    lookup.add_argument("codes", help="Text file with one code per line, or - for stdin.")
+    lookup.add_argument("--db", required=True, help="Dataset snapshot: .csv, .parquet or DwC-A .zip.")
+    lookup.add_argument("-o", "--output", default="-", help="Output file (.csv, .parquet or .xlsx). Default: stdout.")
+    lookup.add_argument("--format", choices=["csv", "parquet", "xlsx"], help="Output format. Default: from the file extension.")
+    lookup.add_argument("--column", help="Accession-number column. Default: collectionCode, barcode or catalogNumber.")
+    lookup.add_argument("--columns", help="Comma-separated dataset columns to include in the output.")
+    lookup.add_argument("--only-found", action="store_true", help="Omit codes that were not found.")
+    lookup.add_argument("--chunk-size", type=int, default=200_000, help="Codes processed per block.")
+    lookup.set_defaults(func=comando_lookup)
+
+    names = sub.add_parser(
+        "names",
+        help="Check the names of a dataset against a local checklist.",
+        description=(
+            "Match every distinct scientificName, genus and family of a dataset against "
+            "a checklist file (WFO classification, Flora e Funga do Brasil DwC-A, or any "
+            "Darwin Core taxon table), offline, and write the names needing review."
+        )
+    )
+    names.add_argument("--db", required=True, help="Dataset snapshot: .csv, .parquet or DwC-A .zip.")
+    names.add_argument("--checklist", required=True, help="Checklist: .csv/.txt/.tsv taxon table or DwC-A .zip.")
+    names.add_argument("-o", "--output", default="-", help="Output file (.csv, .parquet or .xlsx). Default: stdout.")
+    names.add_argument("--format", choices=["csv", "parquet", "xlsx"], help="Output format. Default: from the file extension.")
+    names.add_argument("--all", action="store_true", help="Write every name, not only those needing review.")
+    names.set_defaults(func=comando_names)
+
+    serve = sub.add_parser(
+        "serve",
+        help="Run the HTTP/JSON lookup service for barcode scanners.",
+        description=(
+            "Keep the accession and block indexes of a dataset snapshot in memory "
+            "and answer lookups over HTTP: GET /tombo/<code>, GET /bloco/<number>, "
+            "POST /lote."
+        )
+    )
+    serve.add_argument("--db", required=True, help="Dataset snapshot: .csv, .parquet or DwC-A .zip.")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on. Default: 127.0.0.1.")
+    serve.add_argument("--port", type=int, default=8502, help="Port to listen on. Default: 8502.")
+    serve.set_defaults(func=comando_serve)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
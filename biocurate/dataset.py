@@ -0,0 +1,166 @@
+# -----------------------------------------------
+# Dataset loading and typed ingestion
+# -----------------------------------------------
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from biocurate.dwca import ler_dwca
+from biocurate.tracing import span
+
+
+# Darwin Core columns that must always be handled as text, even when the
+# spreadsheet or the CSV parser sees them as numbers (e.g. 1245.0).
+COLUNAS_TEXTO = [
+    "collectionCode",
+    "catalogNumber",
+    "barcode",
+    "recordedBy",
+    "addCollector",
+    "recordNumber",
+    "fieldNumber",
+    "family",
+    "genus",
+    "specificEpithet",
+    "scientificName",
+    "scientificNameAuthorship",
+    "dynamicProperties",
+]
+
+# Date parts stored as separate columns in the HUAM layout.
+COLUNAS_DATA = ["dayCollected", "monthCollected", "yearCollected"]
+
+# Darwin Core collection date, as given by the source (it may hold
+# ranges or times). Only read at load, to fill missing date parts.
+COLUNA_EVENTO = "eventDate"
+
+# Normalized collection date derived at load from the date parts (ISO
+# 8601, possibly partial: "1985", "1985-03" or "1985-03-12"). A column of
+# its own, so eventDate is exported as it was read.
+COLUNA_DATA = "dataColeta"
+
+# Standard Darwin Core terms mapped to the column names used by the HUAM
+# layout. Only applied when the HUAM column is missing.
+ALIASES_HUAM = {
+    "day": "dayCollected",
+    "month": "monthCollected",
+    "year": "yearCollected",
+}
+
+
+def _coluna_texto(col):
+    """
+    Converts a column to text (str or NaN), removing spaces and the ".0"
+    added when integer values were parsed as floats.
+    """
+    texto = col.astype("string").str.strip()
+    texto = texto.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+    texto = texto.mask(texto == "")
+    return texto.astype(object).where(texto.notna(), np.nan)
+
+
+def _partes_evento(evento):
+    """
+    Year, month and day of ISO 8601 dates (full or partial; ranges such
+    as "1985-03-01/1985-03-05" use their start), as Int64 columns.
+    """
+    partes = evento.astype("string").str.extract(r"^\s*(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?")
+    return [pd.to_numeric(partes[i], errors="coerce").astype("Int64") for i in (0, 1, 2)]
+
+
+def montar_data_evento(dia, mes, ano):
+    """
+    Builds the partial ISO date from day, month and year columns. Invalid
+    months or days are dropped, keeping the coarser part ("1985-13-40"
+    becomes "1985"); records without a year get no date.
+    """
+    ano = ano.where((ano >= 1000) & (ano <= 9999))
+    mes = mes.where(ano.notna() & (mes >= 1) & (mes <= 12))
+    dia = dia.where(mes.notna() & (dia >= 1) & (dia <= 31))
+
+    texto = ano.astype("string").str.zfill(4)
+    texto = texto.where(mes.isna(), texto + "-" + mes.astype("string").str.zfill(2))
+    texto = texto.where(dia.isna(), texto + "-" + dia.astype("string").str.zfill(2))
+    return texto.astype(object).where(texto.notna(), np.nan)
+
+
+def formatar_data(evento):
+    """
+    Collection date as shown on the pages: day/month/year without padding,
+    only the known parts ("12/3/1985", "3/1985", "1985").
+    """
+    if not isinstance(evento, str) or not evento:
+        return ""
+    return "/".join(str(int(p)) for p in reversed(evento.split("-")))
+
+
+@span("base.preparar")
+def preparar_base(df):
+    """
+    Typed ingestion path shared by every data source (HUAM sheet, CSV, DwC-A).
+    Normalizes column names, maps standard DwC terms to the HUAM layout,
+    converts text columns to str and date parts to nullable integers, and
+    derives the normalized collection date (COLUNA_DATA) from the date
+    parts.
+    """
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+
+    renomear = {
+        origem: destino
+        for origem, destino in ALIASES_HUAM.items()
+        if origem in df.columns and destino not in df.columns
+    }
+    if renomear:
+        df = df.rename(columns=renomear)
+
+    for c in COLUNAS_TEXTO:
+        if c in df.columns:
+            df[c] = _coluna_texto(df[c])
+
+    for c in COLUNAS_DATA:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").round().astype("Int64")
+
+    # Date parts missing but eventDate present (e.g. some DwC exports)
+    if COLUNA_EVENTO in df.columns:
+        for c, parte in zip(reversed(COLUNAS_DATA), _partes_evento(df[COLUNA_EVENTO])):
+            df[c] = df[c].fillna(parte) if c in df.columns else parte
+
+    if "yearCollected" in df.columns:
+        vazio = pd.Series(pd.NA, index=df.index, dtype="Int64")
+        df[COLUNA_DATA] = montar_data_evento(
+            df.get("dayCollected", vazio),
+            df.get("monthCollected", vazio),
+            df["yearCollected"],
+        )
+
+    # Version used to share indexes between sessions (biocurate.index).
+    # Row order and column names are part of it: results carry row labels
+    # of the shared index, so a reordered dataset must not share one
+    versao = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    versao.update("\x1f".join(map(str, df.columns)).encode())
+    df.attrs["versao"] = versao.hexdigest()[:16]
+
+    return df
+
+
+@span("base.arquivo")
+def ler_base(arquivo, nome=None):
+    """
+    Reads a dataset sent by the user. Accepts a plain CSV, a Darwin Core
+    Archive (zip with meta.xml) or a Parquet snapshot, detected by the file
+    extension.
+    """
+    nome = (nome or getattr(arquivo, "name", "") or str(arquivo)).lower()
+
+    if nome.endswith(".zip"):
+        df = ler_dwca(arquivo)
+    elif nome.endswith(".parquet"):
+        df = pd.read_parquet(arquivo)
+    else:
+        df = pd.read_csv(arquivo)
+
+    return preparar_base(df)
@@ -0,0 +1,283 @@
+# -----------------------------------------------
+# Duplicate specimen detection
+#
+# Finds records that describe the same gathering: the same collector,
+# number and date entered twice, or the same gathering under two
+# accession numbers. Records are only compared inside blocks of rows
+# sharing a hashed blocking key, so the work grows with the number of
+# rows, not with its square:
+#
+#   collector surname + recordNumber
+#   collector surname + full date + family   (number missing or mistyped)
+#   recordNumber + full date                 (collector name mistyped)
+#
+# Each candidate pair gets a weighted score from collector name
+# similarity (fuzzy, computed once per distinct pair of names), number,
+# date and family agreement. Pairs above a threshold are joined into
+# clusters for review.
+# -----------------------------------------------
+
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from biocurate.search import coluna_tombo, normalizar_bloco
+from biocurate.texto import dobrar_serie
+from biocurate.tracing import span
+
+
+# Blocks larger than this are too generic to be a single gathering
+# (e.g. a collector with a very common surname and no number) and are
+# skipped instead of producing a quadratic number of pairs.
+MAX_BLOCO = 200
+
+# Pairs scoring below PISO are discarded right away; LIMIAR is the
+# default threshold for joining a pair into a cluster.
+PISO = 0.6
+LIMIAR = 0.85
+
+PESOS = {"coletor": 0.30, "numero": 0.30, "data": 0.25, "familia": 0.15}
+
+CHAVES = [
+    ("sobrenome", "numero"),
+    ("sobrenome", "evento", "familia"),
+    ("numero", "evento"),
+]
+
+COLUNAS_RELATORIO = [
+    "recordedBy", "recordNumber", "dataColeta", "family",
+    "scientificName", "dynamicProperties",
+]
+
+
+def _por_valor(serie, funcao):
+    """
+    Applies a vectorized Series transformation once per distinct value,
+    which is much cheaper for repetitive columns (collector, family, date).
+    """
+    codigos, valores = pd.factorize(serie)
+    resultado = funcao(pd.Series(valores, dtype="string"))
+    if not len(valores):
+        # Missing or entirely empty column: nothing to take from
+        return pd.Series(pd.NA, index=range(len(codigos)), dtype=resultado.dtype)
+    saida = resultado.take(np.where(codigos >= 0, codigos, 0))
+    return saida.where(codigos >= 0).reset_index(drop=True)
+
+
+def _nome_coletor(serie):
+    nome = dobrar_serie(serie).str.replace(r"[^a-z0-9]+", " ", regex=True).str.strip()
+    return nome.mask(nome == "")
+
+
+def _familia(serie):
+    familia = dobrar_serie(serie).str.strip()
+    return familia.mask(familia == "")
+
+
+def _campos(df):
+    """
+    Normalized fields used by blocking and comparison, one row per record
+    (missing values as <NA>), with the year, month and day of the date.
+    """
+    def coluna(nome):
+        if nome in df.columns:
+            return df[nome].reset_index(drop=True)
+        return pd.Series(pd.NA, index=range(len(df)), dtype="string")
+
+    coletor = _por_valor(coluna("recordedBy"), _nome_coletor)
+
+    # Numbers without digits ("s.n.", "sem numero") identify nothing
+    numero = _por_valor(coluna("recordNumber"), normalizar_bloco)
+    numero = numero.where(numero.str.contains(r"\d", na=False))
+
+    evento = coluna("dataColeta").astype("string")
+
+    campos = pd.DataFrame({
+        "coletor": coletor,
+        "sobrenome": _por_valor(coletor, lambda c: c.str.extract(r"([a-z0-9]{2,})", expand=False)),
+        "numero": numero,
+        "evento": evento,
+        "familia": _por_valor(coluna("family"), _familia),
+    })
+
+    # Only full dates are precise enough to block on
+    campos["evento_bloco"] = evento.where(evento.str.len() == 10)
+    for nome, inicio, fim in (("ano", 0, 4), ("mes", 5, 7), ("dia", 8, 10)):
+        parte = _por_valor(evento, lambda e: pd.to_numeric(e.str[inicio:fim], errors="coerce"))
+        campos[nome] = parte.fillna(0).to_numpy(dtype=np.int32)
+
+    return campos
+
+
+def _pares_bloco(campos, colunas):
+    """
+    Candidate pairs (a < b, row positions) of the rows sharing the hashed
+    key of `colunas`; rows missing any part of the key are left out.
+    """
+    colunas = ["evento_bloco" if c == "evento" else c for c in colunas]
+    validas = campos[colunas].notna().all(axis=1).to_numpy()
+    if validas.sum() < 2:
+        return np.empty((0, 2), dtype=np.int64)
+
+    chave = pd.util.hash_pandas_object(campos.loc[validas, colunas], index=False).to_numpy()
+    linhas = pd.DataFrame({"chave": chave, "posicao": np.flatnonzero(validas)})
+
+    tamanhos = linhas["chave"].map(linhas["chave"].value_counts())
+    linhas = linhas[(tamanhos > 1) & (tamanhos <= MAX_BLOCO)]
+
+    pares = linhas.merge(linhas, on="chave", suffixes=("_a", "_b"))
+    pares = pares[pares["posicao_a"] < pares["posicao_b"]]
+    return pares[["posicao_a", "posicao_b"]].to_numpy(dtype=np.int64)
+
+
+def _similaridade_nomes(nomes, a, b):
+    """
+    Fuzzy similarity (0..1) of the collector names of rows a[i] and b[i],
+    NaN when either is missing. Each distinct pair of names is compared
+    once.
+    """
+    codigos, valores = pd.factorize(nomes)
+    ca, cb = codigos[a], codigos[b]
+    resultado = np.full(len(a), np.nan)
+    presentes = (ca >= 0) & (cb >= 0)
+
+    pares = pd.DataFrame({"a": ca[presentes], "b": cb[presentes]})
+    distintos = pares.drop_duplicates()
+    distintos["sim"] = [
+        1.0 if x == y else SequenceMatcher(None, valores[x], valores[y]).ratio()
+        for x, y in zip(distintos["a"], distintos["b"])
+    ]
+    resultado[presentes] = pares.merge(distintos, on=["a", "b"], how="left")["sim"].to_numpy()
+    return resultado
+
+
+def pontuar_pares(campos, pares):
+    """
+    Score of each candidate pair and of each compared field, as a
+    DataFrame with posicao_a, posicao_b, coletor, numero, data, familia
+    and pontuacao. Missing values count as half agreement; "vaga" is the
+    position of the record with fewer known fields in such pairs (-1
+    when every field was compared).
+    """
+    a, b = pares[:, 0], pares[:, 1]
+
+    def comparar(coluna):
+        codigos = pd.factorize(campos[coluna])[0]
+        x, y = codigos[a], codigos[b]
+        return np.where((x < 0) | (y < 0), 0.5, (x == y).astype(float))
+
+    coletor = _similaridade_nomes(campos["coletor"], a, b)
+    coletor = np.where(np.isnan(coletor), 0.5, coletor)
+
+    # Dates: identical 1, compatible partial dates ("1985" vs
+    # "1985-03-12") 0.7, one or both missing 0.5, conflicting 0
+    compativel = np.ones(len(pares), dtype=bool)
+    for parte in ("ano", "mes", "dia"):
+        pa, pb = campos[parte].to_numpy()[a], campos[parte].to_numpy()[b]
+        compativel &= (pa == pb) | (pa == 0) | (pb == 0)
+    faltando = (campos["ano"].to_numpy()[a] == 0) | (campos["ano"].to_numpy()[b] == 0)
+    identica = comparar("evento") == 1
+    data = np.select([faltando, identica, compativel], [0.5, 1.0, 0.7], 0.0)
+
+    resultado = pd.DataFrame({
+        "posicao_a": a,
+        "posicao_b": b,
+        "coletor": coletor.round(3),
+        "numero": comparar("numero"),
+        "data": data,
+        "familia": comparar("familia"),
+    })
+    resultado["pontuacao"] = sum(resultado[c] * peso for c, peso in PESOS.items()).round(3)
+
+    conhecidos = (
+        campos[["coletor", "numero", "familia"]].notna().sum(axis=1).to_numpy()
+        + (campos["ano"].to_numpy() > 0)
+    )
+    incompleto = (resultado[list(PESOS)] == 0.5).any(axis=1).to_numpy()
+    resultado["vaga"] = np.where(
+        incompleto,
+        np.where(conhecidos[a] < conhecidos[b], a, b),
+        -1,
+    )
+    return resultado
+
+
+@span("relatorio.duplicatas_pares")
+def pares_candidatos(df, piso=PISO):
+    """
+    Scored candidate pairs of the dataset (see pontuar_pares), keeping
+    those scoring at least `piso`.
+    """
+    campos = _campos(df)
+    pares = np.concatenate([_pares_bloco(campos, chave) for chave in CHAVES])
+
+    # The same pair may come from several blocking keys
+    n = max(len(campos), 1)
+    unicos = np.unique(pares[:, 0] * n + pares[:, 1])
+    pares = np.column_stack([unicos // n, unicos % n])
+
+    pontuados = pontuar_pares(campos, pares)
+    return pontuados[pontuados["pontuacao"] >= piso].reset_index(drop=True)
+
+
+def agrupar_pares(n, a, b):
+    """
+    Connected components of the pairs (a[i], b[i]) over n rows: the
+    smallest row position of its component for every row.
+    """
+    rotulos = np.arange(n)
+
+    while True:
+        menor = np.minimum(rotulos[a], rotulos[b])
+        anterior = rotulos.copy()
+        np.minimum.at(rotulos, a, menor)
+        np.minimum.at(rotulos, b, menor)
+        # Pointer jumping: follow the labels to their own labels
+        rotulos = rotulos[rotulos]
+        if np.array_equal(rotulos, anterior):
+            return rotulos
+
+
+@span("relatorio.duplicatas")
+def relatorio_duplicatas(df, pares, limiar=LIMIAR):
+    """
+    Clusters of probable duplicates from the scored pairs, one row per
+    record, with the cluster number, its size and the best score linking
+    the record to the cluster. Largest and most certain clusters first.
+
+    A record missing a field (e.g. no date) only joins the cluster of its
+    best match, so it cannot chain unrelated gatherings together.
+    """
+    pares = pares[pares["pontuacao"] >= limiar]
+    fracos = pares[pares["vaga"] >= 0].sort_values("pontuacao", ascending=False, kind="stable")
+    pares = pd.concat([pares[pares["vaga"] < 0], fracos.drop_duplicates("vaga")])
+    if pares.empty:
+        return pd.DataFrame(columns=["grupo", "tamanho", "pontuacao"])
+
+    a = pares["posicao_a"].to_numpy()
+    b = pares["posicao_b"].to_numpy()
+    rotulos = agrupar_pares(len(df), a, b)
+
+    melhor = (
+        pd.concat([
+            pd.Series(pares["pontuacao"].to_numpy(), index=a),
+            pd.Series(pares["pontuacao"].to_numpy(), index=b),
+        ])
+        .groupby(level=0).max()
+    )
+
+    posicoes = melhor.index.to_numpy()
+    grupos = pd.DataFrame({"posicao": posicoes, "raiz": rotulos[posicoes], "pontuacao": melhor.to_numpy()})
+    grupos["tamanho"] = grupos.groupby("raiz")["posicao"].transform("size")
+    grupos["certeza"] = grupos.groupby("raiz")["pontuacao"].transform("max")
+    grupos = grupos.sort_values(["tamanho", "certeza", "raiz", "posicao"], ascending=[False, False, True, True])
+    grupos["grupo"] = pd.factorize(grupos["raiz"])[0] + 1
+
+    colunas = [c for c in [coluna_tombo(df)] + COLUNAS_RELATORIO if c and c in df.columns]
+    registros = df.iloc[grupos["posicao"].to_numpy()][colunas].reset_index(drop=True)
+
+    return pd.concat([
+        grupos[["grupo", "tamanho", "pontuacao"]].reset_index(drop=True),
+        registros,
+    ], axis=1)
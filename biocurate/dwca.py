@@ -0,0 +1,175 @@
+# -----------------------------------------------
+# Darwin Core Archive (DwC-A) reader
+#
+# Reads meta.xml to find the occurrence table, its delimiters, encoding and
+# column mapping, then streams the table directly out of the zip into
+# pandas, without extracting anything to disk.
+# -----------------------------------------------
+
+import csv
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+
+NS_DWCA = "{http://rs.tdwg.org/dwc/text/}"
+ROWTYPE_OCCURRENCE = "http://rs.tdwg.org/dwc/terms/Occurrence"
+
+# Escape sequences allowed in the meta.xml delimiter attributes.
+_ESCAPES = {"\\t": "\t", "\\n": "\n", "\\r": "\r", "\\\\": "\\"}
+
+
+def _decodificar(valor, padrao):
+    """
+    Converts a meta.xml delimiter attribute ("\\t", "\\n", '"') to the
+    actual character. Missing attributes fall back to the DwC-A defaults.
+    """
+    if valor is None:
+        return padrao
+
+    for escape, caractere in _ESCAPES.items():
+        valor = valor.replace(escape, caractere)
+
+    return valor
+
+
+def nome_termo(termo):
+    """
+    Returns the short name of a Darwin Core term URI.
+    Ex.: http://rs.tdwg.org/dwc/terms/family -> family
+    """
+    return termo.rstrip("/").rsplit("/", 1)[-1].rsplit("#", 1)[-1]
+
+
+def ler_meta(zf):
+    """
+    Parses meta.xml and returns the description of the occurrence table:
+    file name, delimiters, encoding, header lines and field mapping.
+    Uses the core when it is an Occurrence table, otherwise the first
+    Occurrence extension.
+    """
+    if "meta.xml" not in zf.namelist():
+        # Archives without meta.xml: tab-separated occurrence.txt with header
+        return {
+            "arquivo": "occurrence.txt",
+            "delimitador": "\t",
+            "aspas": "",
+            "linhas_ignoradas": 1,
+            "encoding": "utf-8",
+            "campos": None,
+            "padroes": {},
+        }
+
+    with zf.open("meta.xml") as f:
+        raiz = ET.parse(f).getroot()
+
+    tabelas = [raiz.find(f"{NS_DWCA}core")] + raiz.findall(f"{NS_DWCA}extension")
+    tabelas = [t for t in tabelas if t is not None]
+
+    tabela = next(
+        (t for t in tabelas if t.get("rowType") == ROWTYPE_OCCURRENCE),
+        tabelas[0] if tabelas else None
+    )
+
+    if tabela is None:
+        raise ValueError("meta.xml does not describe any data table.")
+
+    local = tabela.find(f"{NS_DWCA}files/{NS_DWCA}location")
+    if local is None or not (local.text or "").strip():
+        raise ValueError("meta.xml does not declare the data file location.")
+
+    campos = {}
+    padroes = {}
+
+    for campo in tabela.findall(f"{NS_DWCA}field"):
+        nome = nome_termo(campo.get("term", ""))
+        indice = campo.get("index")
+
+        if indice is not None:
+            campos.setdefault(int(indice), nome)
+        elif campo.get("default") is not None:
+            padroes[nome] = campo.get("default")
+
+    # The id column is kept as "id" when it is not also mapped to a term
+    id_tag = tabela.find(f"{NS_DWCA}id")
+    if id_tag is None:
+        id_tag = tabela.find(f"{NS_DWCA}coreid")
+    if id_tag is not None and id_tag.get("index") is not None:
+        campos.setdefault(int(id_tag.get("index")), "id")
+
+    return {
+        "arquivo": local.text.strip(),
+        "delimitador": _decodificar(tabela.get("fieldsTerminatedBy"), ","),
+        "aspas": _decodificar(tabela.get("fieldsEnclosedBy"), '"'),
+        "linhas_ignoradas": int(tabela.get("ignoreHeaderLines", "0") or 0),
+        "encoding": tabela.get("encoding") or "utf-8",
+        "campos": campos,
+        "padroes": padroes,
+    }
+
+
+def ler_dwca(arquivo, chunksize=None):
+    """
+    Reads the occurrence table of a DwC-A zip (path or file-like object).
+    The table is decompressed as a stream and parsed by pandas with the
+    delimiters and encoding declared in meta.xml. All values are read as
+    text; types are assigned later by the common ingestion path.
+
+    With chunksize, returns an iterator of DataFrames instead.
+    """
+    zf = zipfile.ZipFile(arquivo)
+    meta = ler_meta(zf)
+
+    if meta["arquivo"] not in zf.namelist():
+        zf.close()
+        raise ValueError(f"File {meta['arquivo']} declared in meta.xml is missing from the archive.")
+
+    opcoes = {
+        "sep": meta["delimitador"],
+        "encoding": meta["encoding"],
+        "dtype": str,
+        "keep_default_na": False,
+        "na_values": [""],
+        "engine": "c" if len(meta["delimitador"]) == 1 else "python",
+    }
+
+    if meta["aspas"]:
+        opcoes["quotechar"] = meta["aspas"]
+    else:
+        opcoes["quoting"] = csv.QUOTE_NONE
+
+    campos = meta["campos"]
+    if campos is None:
+        opcoes["header"] = 0
+    else:
+        opcoes["header"] = None
+        opcoes["skiprows"] = meta["linhas_ignoradas"]
+        opcoes["usecols"] = sorted(campos)
+
+    def _nomear(df):
+        if campos is not None:
+            df = df.rename(columns=campos)
+        for nome, valor in meta["padroes"].items():
+            if nome not in df.columns:
+                df[nome] = valor
+        return df
+
+    fluxo = zf.open(meta["arquivo"])
+
+    if chunksize:
+        def _blocos():
+            try:
+                for bloco in pd.read_csv(fluxo, chunksize=chunksize, **opcoes):
+                    yield _nomear(bloco)
+            finally:
+                fluxo.close()
+                zf.close()
+
+        return _blocos()
+
+    try:
+        return _nomear(pd.read_csv(fluxo, **opcoes))
+    finally:
+        fluxo.close()
+        zf.close()
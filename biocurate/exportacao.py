@@ -0,0 +1,150 @@
+# -----------------------------------------------
+# Export of result sets to CSV, Parquet and XLSX
+#
+# Rows are written in blocks of TAMANHO_BLOCO straight into the output
+# (file or in-memory buffer), so a full-collection export never holds a
+# second converted copy of the whole table. The same writers serve the
+# command line (biocurate.cli) and the download buttons of the app.
+#
+# Exported files are cached by (dataset version, query, format), so
+# downloading the same result again costs a cache lookup. XLSX needs the
+# optional openpyxl package.
+# -----------------------------------------------
+
+import io
+
+from biocurate.cache import CacheLRU
+from biocurate.tracing import span
+
+
+TAMANHO_BLOCO = 50_000
+EXPORT_CACHE_MB = 128
+
+# Largest sheet Excel can open
+MAX_LINHAS_XLSX = 1_048_575
+
+FORMATOS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+}
+
+_cache_exportacao = CacheLRU("exportacao", EXPORT_CACHE_MB * 1024 * 1024)
+
+
+class SaidaCSV:
+    def __init__(self, destino):
+        self.destino = destino
+        self.cabecalho = True
+
+    def escrever(self, bloco):
+        bloco.to_csv(self.destino, index=False, header=self.cabecalho)
+        self.cabecalho = False
+
+    def fechar(self):
+        self.destino.flush()
+
+
+class SaidaParquet:
+    def __init__(self, destino):
+        import pyarrow  # noqa: F401 - fail early when pyarrow is missing
+
+        self.destino = destino
+        self.writer = None
+
+    def escrever(self, bloco):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Text columns are written as strings so every block has the same schema
+        bloco = bloco.astype({c: "string" for c in bloco.columns if bloco[c].dtype == object})
+        tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.destino, tabela.schema)
+        else:
+            tabela = tabela.cast(self.writer.schema)
+
+        self.writer.write_table(tabela)
+
+    def fechar(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class SaidaXLSX:
+    """Single-sheet workbook written row by row (openpyxl write-only mode)."""
+
+    def __init__(self, destino):
+        from openpyxl import Workbook
+
+        self.destino = destino
+        self.livro = Workbook(write_only=True)
+        self.planilha = self.livro.create_sheet("BioCurate")
+        self.cabecalho = True
+
+    def escrever(self, bloco):
+        if self.cabecalho:
+            self.planilha.append([str(c) for c in bloco.columns])
+            self.cabecalho = False
+
+        # Missing values become empty cells; other values go as Python scalars
+        valores = bloco.astype(object).where(bloco.notna(), None)
+        for linha in valores.itertuples(index=False, name=None):
+            self.planilha.append(linha)
+
+    def fechar(self):
+        self.livro.save(self.destino)
+
+
+_SAIDAS = {"csv": SaidaCSV, "parquet": SaidaParquet, "xlsx": SaidaXLSX}
+
+
+def formatos_disponiveis():
+    """Formats whose optional dependencies are installed."""
+    disponiveis = ["csv"]
+    for formato, modulo in (("parquet", "pyarrow"), ("xlsx", "openpyxl")):
+        try:
+            __import__(modulo)
+        except ImportError:
+            continue
+        disponiveis.append(formato)
+    return disponiveis
+
+
+def escrever_blocos(df, saida, tamanho_bloco=TAMANHO_BLOCO):
+    """Writes df to an open Saida* in blocks of rows."""
+    try:
+        for inicio in range(0, max(len(df), 1), tamanho_bloco):
+            saida.escrever(df.iloc[inicio:inicio + tamanho_bloco])
+    finally:
+        saida.fechar()
+
+
+@span("exportacao.arquivo")
+def exportar(df, formato, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    df in the given format ("csv", "parquet" or "xlsx"), as bytes.
+    Raises ValueError for unknown formats or sheets too large for Excel.
+    """
+    if formato not in _SAIDAS:
+        raise ValueError(f"Unknown export format: {formato}")
+    if formato == "xlsx" and len(df) > MAX_LINHAS_XLSX:
+        raise ValueError(f"Too many rows for an Excel sheet: {len(df)} (max. {MAX_LINHAS_XLSX}).")
+
+    if formato == "csv":
+        buffer = io.StringIO()
+        escrever_blocos(df, SaidaCSV(buffer), tamanho_bloco)
+        return buffer.getvalue().encode("utf-8")
+
+    buffer = io.BytesIO()
+    escrever_blocos(df, _SAIDAS[formato](buffer), tamanho_bloco)
+    return buffer.getvalue()
+
+
+def exportar_cacheado(df, chave, formato):
+    """
+    exportar(df, formato), cached by (chave, formato). `chave` must
+    identify the rows of df: the dataset version and the query.
+    """
+    return _cache_exportacao.obter_ou_calcular((chave, formato), lambda: exportar(df, formato))
@@ -0,0 +1,219 @@
+# -----------------------------------------------
+# Full-text search over the text columns of a dataset
+#
+# One inverted index per column, over accent- and case-folded tokens
+# (biocurate.texto), ranked with BM25 summed over the matching fields.
+# Queries combine free terms and field-qualified terms, all required:
+#
+#   ducke lauraceae
+#   locality:Ducke family:Lauraceae
+#   locality:"Reserva Ducke" flor
+#
+# A term with no exact token in a field matches the tokens starting with
+# it ("laur" -> "lauraceae", "laurus"). When the dataset changes,
+# atualizado() re-tokenizes only the rows whose text changed.
+# -----------------------------------------------
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from biocurate.texto import contagem_tokens, dobrar, tokens
+from biocurate.tracing import span
+
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Above this fraction of changed rows a column is simply rebuilt.
+MAX_FRACAO_INCREMENTAL = 0.5
+
+_VAZIO = np.empty(0, dtype=np.int64)
+
+
+def colunas_texto(df):
+    """Columns indexed by default: every text (object/string) column."""
+    return [
+        c for c in df.columns
+        if not str(c).startswith("_")
+        and (pd.api.types.is_object_dtype(df[c]) or pd.api.types.is_string_dtype(df[c]))
+    ]
+
+
+def _hashes(serie):
+    return pd.util.hash_pandas_object(serie, index=False).to_numpy()
+
+
+class _Campo:
+    """
+    Inverted index of one column: postings sorted by token, each with the
+    row position and term frequency, and the token count of every row.
+    """
+
+    def __init__(self, contagem, comprimentos, hashes):
+        self.tokens = contagem["token"].to_numpy(dtype=object)
+        self.posicoes = contagem["posicao"].to_numpy(dtype=np.int64)
+        self.tf = contagem["tf"].to_numpy(dtype=np.float32)
+        self.comprimentos = comprimentos
+        self.hashes = hashes
+
+        # Postings are sorted by token: each token starts where it changes
+        inicio = np.flatnonzero(np.r_[True, self.tokens[1:] != self.tokens[:-1]]) if len(self.tokens) else _VAZIO
+        self.vocabulario = self.tokens[inicio]
+        self.limites = np.append(inicio, len(self.tokens))
+        self.media = max(float(comprimentos.mean()) if len(comprimentos) else 0.0, 1.0)
+
+    @classmethod
+    def construir(cls, serie):
+        contagem, comprimentos = contagem_tokens(serie)
+        return cls(contagem, comprimentos, _hashes(serie))
+
+    def atualizado(self, serie):
+        """
+        Index of a new version of the column. Rows are matched by position;
+        only rows whose text changed (or were added) are tokenized again.
+        """
+        hashes = _hashes(serie)
+        comum = min(len(hashes), len(self.hashes))
+        mudou = np.flatnonzero(hashes[:comum] != self.hashes[:comum])
+        novas = np.arange(comum, len(hashes))
+        refazer = np.concatenate([mudou, novas])
+
+        if len(refazer) == 0 and len(hashes) == len(self.hashes):
+            return self
+        if len(refazer) > MAX_FRACAO_INCREMENTAL * max(len(hashes), 1):
+            return _Campo.construir(serie)
+
+        # Keep the postings of unchanged rows that still exist
+        manter = (self.posicoes < len(hashes)) & ~np.isin(self.posicoes, mudou)
+        antigas = pd.DataFrame({
+            "token": self.tokens[manter],
+            "posicao": self.posicoes[manter],
+            "tf": self.tf[manter],
+        })
+
+        contagem, comprimentos_novos = contagem_tokens(serie.iloc[refazer])
+        contagem["posicao"] = refazer[contagem["posicao"].to_numpy()]
+
+        comprimentos = np.zeros(len(hashes), dtype=np.int32)
+        comprimentos[:comum] = self.comprimentos[:comum]
+        comprimentos[refazer] = comprimentos_novos
+
+        juntas = pd.concat([antigas, contagem], ignore_index=True)
+        juntas = juntas.sort_values(["token", "posicao"], kind="stable", ignore_index=True)
+        return _Campo(juntas, comprimentos, hashes)
+
+    def faixas(self, termo):
+        """Posting ranges (start, end) of the term: exact token, or prefix."""
+        i = np.searchsorted(self.vocabulario, termo, "left")
+        if i < len(self.vocabulario) and self.vocabulario[i] == termo:
+            return [(self.limites[i], self.limites[i + 1])]
+
+        fim = np.searchsorted(self.vocabulario, termo + "\uffff", "left")
+        return [(self.limites[j], self.limites[j + 1]) for j in range(i, fim)]
+
+    def pontuar(self, termo, pontuacao):
+        """Adds the BM25 score of the term to `pontuacao` (one per row)."""
+        n = len(self.comprimentos)
+
+        for inicio, fim in self.faixas(termo):
+            posicoes = self.posicoes[inicio:fim]
+            tf = self.tf[inicio:fim]
+
+            idf = np.log(1 + (n - len(posicoes) + 0.5) / (len(posicoes) + 0.5))
+            norma = K1 * (1 - B + B * self.comprimentos[posicoes] / self.media)
+            np.add.at(pontuacao, posicoes, idf * tf * (K1 + 1) / (tf + norma))
+
+
+def interpretar_consulta(consulta):
+    """
+    Splits a query into (field or None, term) pairs. Quoted values
+    ("Reserva Ducke") give one pair per token of the value.
+    """
+    pares = []
+
+    for campo, citado, simples in re.findall(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))', consulta or ""):
+        for termo in tokens(citado or simples):
+            pares.append((campo or None, termo))
+
+    return pares
+
+
+class IndiceTexto:
+    """
+    Full-text index over the text columns of a dataset. Build it once per
+    dataset version; use atualizado(df) for the next version.
+    """
+
+    def __init__(self, df, colunas=None, _campos=None):
+        self.df = df
+        self.colunas = list(colunas) if colunas is not None else colunas_texto(df)
+        self._campos = _campos if _campos is not None else {
+            c: _Campo.construir(df[c]) for c in self.colunas
+        }
+        self._nomes = {dobrar(c): c for c in self.colunas}
+
+    def atualizado(self, df):
+        """
+        Index of a new version of the dataset. Unchanged columns are shared
+        with this index; changed columns are updated row by row.
+        """
+        colunas = colunas_texto(df)
+        campos = {
+            c: self._campos[c].atualizado(df[c]) if c in self._campos else _Campo.construir(df[c])
+            for c in colunas
+        }
+        return IndiceTexto(df, colunas, campos)
+
+    def campo(self, nome):
+        """Column for a field name of a query, case- and accent-insensitive."""
+        coluna = self._nomes.get(dobrar(nome))
+        if coluna is None:
+            raise ValueError(f"Unknown field: {nome}")
+        return coluna
+
+    def pontuacoes(self, consulta):
+        """
+        BM25 score of every row and the mask of rows matching every term.
+        """
+        n = len(self.df)
+        total = np.zeros(n, dtype=np.float64)
+        todos = np.ones(n, dtype=bool)
+        pares = interpretar_consulta(consulta)
+
+        if not pares:
+            return total, np.zeros(n, dtype=bool)
+
+        for campo, termo in pares:
+            colunas = [self.campo(campo)] if campo else self.colunas
+            pontuacao = np.zeros(n, dtype=np.float64)
+
+            for coluna in colunas:
+                self._campos[coluna].pontuar(termo, pontuacao)
+
+            total += pontuacao
+            todos &= pontuacao > 0
+
+        return total, todos
+
+    @span("busca.texto")
+    def buscar(self, consulta, limite=200):
+        """
+        Records matching every term of the query, best first, with the
+        score in a "_pontuacao" column. Raises ValueError for unknown
+        fields.
+        """
+        total, todos = self.pontuacoes(consulta)
+        posicoes = np.flatnonzero(todos)
+        ordem = np.argsort(-total[posicoes], kind="stable")[:limite]
+        posicoes = posicoes[ordem]
+
+        resultado = self.df.iloc[posicoes].copy()
+        resultado.insert(0, "_pontuacao", np.round(total[posicoes], 3))
+        return resultado
+
+    def contar(self, consulta):
+        """Number of records matching the query."""
+        return int(self.pontuacoes(consulta)[1].sum())
@@ -0,0 +1,87 @@
+# -----------------------------------------------
+# Report page charts
+#
+# Charts are built from counts aggregated once per dataset version
+# (IndiceBase.familias_generos) and kept as Plotly JSON specs in a
+# process-wide cache, keyed by dataset version and chart options, so
+# redrawing a chart on a rerun costs a cache lookup.
+#
+# Only the top N bars are drawn, with the remaining categories summed in
+# an "other" bar, which keeps the payload small for hundreds of
+# families. The "webgl" mode draws a dot plot with Scattergl instead of
+# SVG bars.
+# -----------------------------------------------
+
+import plotly.graph_objects as go
+
+from biocurate.cache import CacheLRU
+from biocurate.tracing import span
+
+
+MAX_BARRAS = 30
+ALTURA_BARRA = 22
+COR = "#388E3C"
+
+_cache_graficos = CacheLRU("graficos", 16 * 1024 * 1024)
+
+
+def agrupar_top(contagem, top_n, rotulo_outras):
+    """
+    The top_n largest counts (descending) plus one bar with the sum of the
+    others, labelled rotulo_outras.format(n=number of categories summed).
+    """
+    contagem = contagem.sort_values(ascending=False)
+    if top_n is None or len(contagem) <= top_n:
+        return contagem
+
+    topo = contagem.iloc[:top_n].copy()
+    resto = contagem.iloc[top_n:]
+    topo[rotulo_outras.format(n=len(resto))] = int(resto.sum())
+    return topo
+
+
+def figura_contagem(contagem, titulo, eixo_x, eixo_y, modo="barras"):
+    """
+    Horizontal chart of a count Series (largest on top) as Plotly JSON.
+    modo="webgl" draws a Scattergl dot plot.
+    """
+    rotulos = [str(r) for r in contagem.index[::-1]]
+    valores = [int(v) for v in contagem.to_numpy()[::-1]]
+
+    if modo == "webgl":
+        traco = go.Scattergl(
+            x=valores, y=rotulos, mode="markers",
+            marker={"color": COR, "size": 10},
+            hovertemplate="%{y}: %{x}<extra></extra>",
+        )
+    else:
+        traco = go.Bar(
+            x=valores, y=rotulos, orientation="h",
+            marker_color=COR,
+            hovertemplate="%{y}: %{x}<extra></extra>",
+        )
+
+    figura = go.Figure(traco)
+    figura.update_layout(
+        title=titulo,
+        xaxis_title=eixo_x,
+        yaxis_title=eixo_y,
+        height=max(400, len(rotulos) * ALTURA_BARRA + 120),
+        margin={"l": 10, "r": 10, "t": 50, "b": 40},
+    )
+    return figura.to_json()
+
+
+@span("relatorio.grafico")
+def grafico_contagem(chave, contagem, top_n, rotulo_outras, titulo, eixo_x, eixo_y, modo="barras"):
+    """
+    Cached figure spec (JSON text) of agrupar_top + figura_contagem.
+    `chave` must identify the data (e.g. dataset version and family);
+    the other arguments are added to it.
+    """
+    chave = (chave, top_n, rotulo_outras, titulo, eixo_x, eixo_y, modo)
+
+    def construir():
+        return figura_contagem(agrupar_top(contagem, top_n, rotulo_outras), titulo, eixo_x, eixo_y, modo)
+
+    return _cache_graficos.obter_ou_calcular(chave, construir)
@@ -0,0 +1,349 @@
+# -----------------------------------------------
+# Perceptual hashes of the image collection
+#
+# Each Drive scan listed in the Image worksheet gets a 64-bit perceptual
+# hash (DCT of a 32x32 grey copy, as in pHash): re-scans and copies of
+# the same sheet in other subfolders differ in a few bits, while other
+# sheets differ in many. The hashes are kept in a multi-index hash table
+# (IndiceMultiplo), so the scans within a Hamming distance of a new one
+# are found without comparing it with the whole collection. (A BK-tree
+# degrades to a near-full scan on herbarium sheets, whose hashes are all
+# fairly close to each other.)
+#
+#   DISTANCIA_IDENTICA  - visually the same scan: such scans share one
+#                         representative, which keys the Pl@ntNet and
+#                         thumbnail caches (biocurate.images)
+#   DISTANCIA_DUPLICATA - flagged as a possible duplicate for review
+#
+# The collection is indexed by a background thread (indexar_em_segundo_plano)
+# that downloads each scan once for every index it fills (these hashes
+# and the visual descriptors of biocurate.similares); images downloaded
+# by the Image page are hashed as they are shown. With BIOCURATE_HASHES
+# set, the hashes are kept in that CSV file across restarts.
+# -----------------------------------------------
+
+import os
+import threading
+from array import array
+from collections import defaultdict
+from functools import lru_cache
+from io import BytesIO
+from itertools import combinations
+
+import cv2
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image, ImageOps
+
+from biocurate.images import ErroImagem, download_drive_image, file_ids
+from biocurate.tracing import span
+
+
+DISTANCIA_IDENTICA = 4
+DISTANCIA_DUPLICATA = 8
+
+LADO_HASH = 32
+
+ARQUIVO_HASHES = os.environ.get("BIOCURATE_HASHES")
+
+# Scans indexed between two writes of the index files
+SALVAR_A_CADA = 200
+
+# Set bits of each byte value, for vectorized Hamming distances
+_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_trava = threading.Lock()
+_indice = None
+_tarefa = None
+
+
+def hash_perceptual(img):
+    """64-bit perceptual hash of a PIL image, as an int."""
+    cinza = img.convert("L").resize((LADO_HASH, LADO_HASH), Image.BILINEAR, reducing_gap=2.0)
+    dct = cv2.dct(np.asarray(cinza, dtype=np.float32))[:8, :8].ravel()
+    # Bits above the median of the low frequencies, DC term left out
+    bits = dct > np.median(dct[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hash_de_bytes(dados):
+    """
+    hash_perceptual of an encoded image. JPEGs are decoded at a reduced
+    size, so a full scan costs a few milliseconds.
+    """
+    try:
+        img = Image.open(BytesIO(dados))
+        img.draft("L", (4 * LADO_HASH, 4 * LADO_HASH))
+        img = ImageOps.exif_transpose(img)
+    except Exception:
+        raise ErroImagem("imagem_invalida")
+
+    return hash_perceptual(img)
+
+
+def distancia(a, b):
+    """Hamming distance between two hashes."""
+    return bin(a ^ b).count("1")
+
+
+@lru_cache(maxsize=None)
+def _mascaras(bits, raio):
+    """Every `bits`-bit mask with at most `raio` bits set."""
+    mascaras = [0]
+    for n in range(1, raio + 1):
+        mascaras += [sum(1 << b for b in combinacao) for combinacao in combinations(range(bits), n)]
+    return mascaras
+
+
+class IndiceMultiplo:
+    """
+    Multi-index hashing of 64-bit hashes under the Hamming distance. Each
+    hash is split into PARTES chunks of 16 bits, with one table per chunk;
+    two hashes within distance r agree, by the pigeonhole principle, on at
+    least one chunk up to r // PARTES bits. A search probes those chunk
+    values and checks the candidates' full distance in one vectorized step.
+    """
+
+    PARTES = 4
+    BITS = 16
+
+    def __init__(self):
+        self._valores = array("Q")
+        self._chaves = []
+        self._tabelas = [defaultdict(list) for _ in range(self.PARTES)]
+
+    def __len__(self):
+        return len(self._valores)
+
+    def _partes(self, valor):
+        return [(valor >> (self.BITS * k)) & 0xFFFF for k in range(self.PARTES)]
+
+    def adicionar(self, valor, chave):
+        posicao = len(self._valores)
+        self._valores.append(valor)
+        self._chaves.append(chave)
+        for tabela, parte in zip(self._tabelas, self._partes(valor)):
+            tabela[parte].append(posicao)
+
+    def buscar(self, valor, raio):
+        """(distance, key) of every hash within `raio` of valor, nearest first."""
+        mascaras = _mascaras(self.BITS, raio // self.PARTES)
+
+        candidatos = set()
+        for tabela, parte in zip(self._tabelas, self._partes(valor)):
+            for mascara in mascaras:
+                posicoes = tabela.get(parte ^ mascara)
+                if posicoes:
+                    candidatos.update(posicoes)
+        if not candidatos:
+            return []
+
+        posicoes = np.fromiter(candidatos, dtype=np.intp, count=len(candidatos))
+        valores = np.frombuffer(self._valores, dtype=np.uint64)[posicoes] ^ np.uint64(valor)
+        distancias = _BITS[valores.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+        perto = distancias <= raio
+        ordem = np.argsort(distancias[perto], kind="stable")
+        return [(int(d), self._chaves[p]) for d, p in zip(distancias[perto][ordem], posicoes[perto][ordem])]
+
+
+class IndiceHashes:
+    """
+    Perceptual hashes of the collection by Drive file id, with the pairs
+    of possible duplicates and the representative of each scan (the
+    first hashed scan visually identical to it, or the scan itself).
+    """
+
+    def __init__(self, arquivo=None):
+        self.arquivo = arquivo
+        self.hashes = {}
+        self._multiplo = IndiceMultiplo()
+        self._vizinhos = defaultdict(dict)
+        self._representantes = {}
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, file_id):
+        return file_id in self.hashes
+
+    def adicionar(self, file_id, valor):
+        with self._trava:
+            if file_id in self.hashes:
+                return
+
+            proximos = self._multiplo.buscar(valor, DISTANCIA_DUPLICATA)
+            for d, outro in proximos:
+                self._vizinhos[file_id][outro] = d
+                self._vizinhos[outro][file_id] = d
+
+            identico = proximos[0][1] if proximos and proximos[0][0] <= DISTANCIA_IDENTICA else None
+            self._representantes[file_id] = self._representantes[identico] if identico else file_id
+
+            self._multiplo.adicionar(valor, file_id)
+            self.hashes[file_id] = valor
+
+    def registrar(self, file_id, imagem):
+        """Hashes an image already at hand (PIL image or encoded bytes) if file_id is new."""
+        if file_id and file_id not in self.hashes:
+            self.adicionar(file_id, hash_perceptual(imagem) if isinstance(imagem, Image.Image) else hash_de_bytes(imagem))
+
+    def representante(self, file_id):
+        """File id whose cached thumbnail and identification serve file_id."""
+        return self._representantes.get(file_id, file_id)
+
+    def semelhantes(self, file_id):
+        """(file id, distance) of the possible duplicates of a scan, nearest first."""
+        return sorted(self._vizinhos.get(file_id, {}).items(), key=lambda v: v[1])
+
+    def grupos(self):
+        """Groups of two or more scans linked by possible-duplicate pairs."""
+        with self._trava:
+            vizinhos = {f: list(v) for f, v in self._vizinhos.items()}
+
+        vistos, grupos = set(), []
+        for inicio in vizinhos:
+            if inicio in vistos:
+                continue
+            grupo, pilha = [], [inicio]
+            vistos.add(inicio)
+            while pilha:
+                atual = pilha.pop()
+                grupo.append(atual)
+                for outro in vizinhos.get(atual, ()):
+                    if outro not in vistos:
+                        vistos.add(outro)
+                        pilha.append(outro)
+            grupos.append(sorted(grupo))
+
+        return sorted(grupos, key=lambda g: (-len(g), g[0]))
+
+    @span("imagem.repetidas")
+    def duplicatas(self, planilha):
+        """
+        Possible duplicate scans among the rows of the Image worksheet: one
+        row per scan with its group number, the distance to the nearest
+        scan of the group and the worksheet columns that identify it.
+        """
+        colunas = [c for c in ("barcode", "ArchiveName", "Subpasta", "UrlExsicata") if c in planilha.columns]
+        vazio = pd.DataFrame(columns=["grupo", "distancia", "file_id"] + colunas)
+        if "UrlExsicata" not in planilha.columns:
+            return vazio
+
+        linhas = []
+        for numero, grupo in enumerate(self.grupos(), 1):
+            for file_id in grupo:
+                linhas.append({
+                    "grupo": numero,
+                    "distancia": min(self._vizinhos[file_id].values()),
+                    "file_id": file_id,
+                })
+        if not linhas:
+            return vazio
+
+        dados = planilha[colunas].assign(file_id=file_ids(planilha))
+        dados = dados.dropna(subset=["file_id"]).drop_duplicates("file_id")
+        return pd.DataFrame(linhas).merge(dados, on="file_id", how="left")
+
+    def salvar(self, caminho=None):
+        caminho = caminho or self.arquivo
+        with self._trava:
+            tabela = pd.DataFrame({
+                "file_id": list(self.hashes),
+                "hash": [f"{h:016x}" for h in self.hashes.values()],
+            })
+        temporario = f"{caminho}.tmp"
+        tabela.to_csv(temporario, index=False)
+        os.replace(temporario, caminho)
+
+    def carregar(self, caminho):
+        tabela = pd.read_csv(caminho, dtype=str)
+        for file_id, valor in zip(tabela["file_id"], tabela["hash"]):
+            self.adicionar(file_id, int(valor, 16))
+
+
+def indice_hashes():
+    """The process-wide IndiceHashes, loaded from ARQUIVO_HASHES when present."""
+    global _indice
+    with _trava:
+        if _indice is None:
+            _indice = IndiceHashes(ARQUIVO_HASHES)
+            if ARQUIVO_HASHES and os.path.exists(ARQUIVO_HASHES):
+                with span("imagem.hashes_carregar"):
+                    _indice.carregar(ARQUIVO_HASHES)
+        return _indice
+
+
+class TarefaIndexacao(threading.Thread):
+    """
+    Downloads Drive scans one by one in a daemon thread and registers
+    each in every index given (IndiceHashes, similares.IndiceVisual), so
+    a scan is downloaded once for all of them. feitos / total / erros
+    report the progress; parar() stops it after the current scan.
+    """
+
+    def __init__(self, indices, ids):
+        super().__init__(name="biocurate-indexacao", daemon=True)
+        self.indices = indices
+        self.pendentes = [
+            f for f in dict.fromkeys(ids)
+            if f and any(f not in indice for indice in indices)
+        ]
+        self.total = len(self.pendentes)
+        self.feitos = 0
+        self.erros = 0
+        self._fim = threading.Event()
+
+    def parar(self):
+        self._fim.set()
+
+    def _salvar(self):
+        for indice in self.indices:
+            if indice.arquivo:
+                indice.salvar()
+
+    def run(self):
+        sessao = requests.Session()
+
+        for file_id in self.pendentes:
+            if self._fim.is_set():
+                break
+
+            try:
+                # Not kept in the Drive cache: the job would evict the
+                # scans the users are looking at
+                dados = download_drive_image(file_id, sessao=sessao, cache=False)
+                with span("imagem.indexar", bytes=len(dados)):
+                    for indice in self.indices:
+                        indice.registrar(file_id, dados)
+            except Exception:
+                self.erros += 1
+
+            self.feitos += 1
+            if self.feitos % SALVAR_A_CADA == 0:
+                self._salvar()
+
+        self._salvar()
+
+
+def indexar_em_segundo_plano(ids, indices=None):
+    """
+    Starts indexing the Drive files `ids` that are missing from any of
+    `indices` (default: the perceptual hashes), unless a job is already
+    running. Returns the job.
+    """
+    global _tarefa
+    indices = indices or [indice_hashes()]
+
+    with _trava:
+        if _tarefa is None or not _tarefa.is_alive():
+            _tarefa = TarefaIndexacao(indices, ids)
+            _tarefa.start()
+        return _tarefa
+
+
+def tarefa_atual():
+    """The last indexing job started in this process, or None."""
+    return _tarefa
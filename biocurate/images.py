@@ -0,0 +1,423 @@
+# -----------------------------------------------
+# Image pipeline: Google Drive download, JPEG preparation and Pl@ntNet
+#
+# Shared by the Image page of both app modules and by the benchmarks.
+# Errors are raised as ErroImagem with a type code; mensagem_erro turns
+# them into the message shown to the user in each language.
+#
+# The service URLs can be pointed at local stand-ins (see
+# benchmarks/mock_servers.py) with the BIOCURATE_DRIVE_URL and
+# BIOCURATE_PLANTNET_URL environment variables.
+#
+# Each stage is timed with biocurate.tracing spans (imagem.download,
+# imagem.preparo, imagem.plantnet), which also carry the bytes, CPU time,
+# attempts and remaining Pl@ntNet quota used by biocurate.metrics. Downloaded scans are kept in a
+# process-wide LRU cache, so the gallery does not fetch them again on
+# every rerun. Gallery thumbnails and successful Pl@ntNet answers have
+# caches of their own, keyed by the caller: the Image page uses the
+# representative scan of biocurate.hash_imagem, so visually identical
+# scans share them.
+# -----------------------------------------------
+
+import hashlib
+import os
+import re
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import requests
+from PIL import Image, ImageOps
+
+from biocurate.cache import CacheLRU
+from biocurate.tracing import span
+
+
+DRIVE_TIMEOUT = (15, 60)
+PLANTNET_TIMEOUT = (30, 120)
+MAX_TENTATIVAS = 3
+MAX_IMAGENS_PLANTNET = 5
+DRIVE_CACHE_MB = int(os.environ.get("BIOCURATE_DRIVE_CACHE_MB", "256"))
+MINIATURAS_CACHE_MB = 32
+PLANTNET_CACHE_MB = 8
+LADO_MINIATURA = 480
+PLANTNET_PROJECT = "all"
+
+DRIVE_URL = os.environ.get("BIOCURATE_DRIVE_URL", "https://drive.google.com/uc")
+DRIVE_MINIATURA_URL = "https://drive.google.com/thumbnail"
+PLANTNET_URL = os.environ.get(
+    "BIOCURATE_PLANTNET_URL",
+    f"https://my-api.plantnet.org/v2/identify/{PLANTNET_PROJECT}"
+)
+
+
+MENSAGENS = {
+    "pt": {
+        "drive_timeout": "Timeout ao baixar a imagem do Google Drive.",
+        "drive_rede": "Erro de rede ao acessar o Google Drive.",
+        "drive_status": "Não foi possível carregar a imagem do Drive. Status HTTP: {status}",
+        "drive_nao_imagem": (
+            "O link do Google Drive não retornou uma imagem válida. "
+            "Verifique se o arquivo está compartilhado publicamente ou acessível pelo app."
+        ),
+        "imagem_invalida": "Erro ao abrir ou converter a imagem.",
+        "imagem_grande": "A imagem excede 50 MB, limite máximo aceito pelo Pl@ntNet.",
+        "plantnet_sem_conexao": (
+            "Não foi possível conectar ao Pl@ntNet após {tentativas} tentativas. "
+            "Tipo do último erro: {detalhe}."
+        ),
+        "tentativa_ConnectTimeout": "Tentativa {tentativa}: timeout de conexão com o Pl@ntNet.",
+        "tentativa_ReadTimeout": "Tentativa {tentativa}: o Pl@ntNet conectou, mas demorou para responder.",
+        "tentativa_ConnectionError": "Tentativa {tentativa}: erro de conexão com o Pl@ntNet.",
+        "tentativa_RequestException": "Tentativa {tentativa}: falha na requisição ao Pl@ntNet.",
+        "redigido": "[REMOVIDA]",
+    },
+    "en": {
+        "drive_timeout": "Timeout while downloading the image from Google Drive.",
+        "drive_rede": "Network error while accessing Google Drive.",
+        "drive_status": "Could not load the image from Drive. HTTP status: {status}",
+        "drive_nao_imagem": (
+            "The Google Drive link did not return a valid image. "
+            "Check whether the file is publicly shared or accessible by the app."
+        ),
+        "imagem_invalida": "Error opening or converting the image.",
+        "imagem_grande": "The image exceeds 50 MB, the maximum limit accepted by Pl@ntNet.",
+        "plantnet_sem_conexao": (
+            "Could not connect to Pl@ntNet after {tentativas} attempts. "
+            "Last error type: {detalhe}."
+        ),
+        "tentativa_ConnectTimeout": "Attempt {tentativa}: connection timeout with Pl@ntNet.",
+        "tentativa_ReadTimeout": "Attempt {tentativa}: Pl@ntNet connected but took too long to respond.",
+        "tentativa_ConnectionError": "Attempt {tentativa}: connection error with Pl@ntNet.",
+        "tentativa_RequestException": "Attempt {tentativa}: request failure to Pl@ntNet.",
+        "redigido": "[REDACTED]",
+    },
+}
+
+
+# Drive file ids are 25-44 URL-safe characters; shorter matches are not ids
+PADRAO_FILE_ID = r"/d/([\w-]{10,})|[?&]id=([\w-]{10,})"
+_padrao_file_id = re.compile(PADRAO_FILE_ID)
+
+_cache_drive = CacheLRU("drive", DRIVE_CACHE_MB * 1024 * 1024)
+_cache_links = CacheLRU("links_drive", 32 * 1024 * 1024)
+_cache_miniaturas = CacheLRU("miniaturas", MINIATURAS_CACHE_MB * 1024 * 1024)
+_cache_plantnet = CacheLRU("plantnet", PLANTNET_CACHE_MB * 1024 * 1024)
+
+
+class ErroImagem(RuntimeError):
+    """
+    Failure in the image pipeline. `tipo` is a key of MENSAGENS; `status`
+    and `detalhe` fill in the message when it has placeholders.
+    """
+
+    def __init__(self, tipo, status=None, detalhe=None):
+        self.tipo = tipo
+        self.status = status
+        self.detalhe = detalhe
+        super().__init__(mensagem_erro(self, "en"))
+
+
+def mensagem_erro(erro, idioma="pt"):
+    """
+    Message for an error of the image pipeline in the interface language.
+    Other exceptions are shown as they are, with the API key removed.
+    """
+    if isinstance(erro, ErroImagem):
+        return MENSAGENS[idioma][erro.tipo].format(
+            status=erro.status,
+            detalhe=erro.detalhe,
+            tentativas=MAX_TENTATIVAS
+        )
+
+    return redigir_api_key(erro, idioma)
+
+
+def redigir_api_key(texto, idioma="pt"):
+    """
+    Removes the API key from any error message before displaying it in the interface.
+    """
+    if texto is None:
+        return ""
+
+    marcador = MENSAGENS[idioma]["redigido"]
+    texto = str(texto)
+    texto = re.sub(r"(api-key=)[^&\s]+", r"\1" + marcador, texto)
+    texto = re.sub(r'("api-key"\s*:\s*")[^"]+(")', r"\1" + marcador + r"\2", texto)
+    return texto
+
+
+def drive_link_to_file_id(link):
+    """
+    Extracts the file_id from a Google Drive link.
+    Accepts links in the format /file/d/ID/view, /d/ID, or URLs with ?id=.
+    For whole worksheets, use resolver_links.
+    """
+    if not isinstance(link, str):
+        return None
+
+    encontrado = _padrao_file_id.search(link)
+    if not encontrado:
+        return None
+    return encontrado.group(1) or encontrado.group(2)
+
+
+def _resolver(links):
+    texto = links.astype("string")
+    partes = texto.str.extract(PADRAO_FILE_ID)
+    file_id = partes[0].fillna(partes[1])
+    valido = file_id.notna().to_numpy()
+
+    vazio = (texto.str.strip().fillna("") == "").to_numpy()
+    ids = file_id.to_numpy(dtype=object, na_value=None)
+    return pd.DataFrame({
+        "file_id": ids,
+        "link_valido": valido,
+        "url_imagem": np.where(valido, DRIVE_URL + "?export=view&id=" + file_id.fillna(""), None),
+        "url_miniatura": np.where(
+            valido, DRIVE_MINIATURA_URL + "?id=" + file_id.fillna("") + f"&sz=w{LADO_MINIATURA}", None
+        ),
+        "problema_link": np.select([vazio, ~valido], ["vazio", "formato"], default=""),
+    })
+
+
+@span("imagem.links")
+def resolver_links(planilha):
+    """
+    Copy of the Image worksheet with its UrlExsicata links resolved once:
+    file_id, link_valido, url_imagem (direct download), url_miniatura
+    (Drive thumbnail) and problema_link ("vazio", "formato" or ""). The
+    parsed columns are cached by the content of UrlExsicata, so reruns
+    with the same worksheet only hash the column.
+    """
+    if "UrlExsicata" in planilha.columns:
+        links = planilha["UrlExsicata"]
+    else:
+        links = pd.Series(None, index=planilha.index, dtype=object)
+
+    # Order-sensitive: the resolved columns are assigned by position
+    chave = hashlib.sha1(pd.util.hash_pandas_object(links, index=False).to_numpy().tobytes()).hexdigest()
+    resolvidos = _cache_links.obter_ou_calcular(chave, lambda: _resolver(links))
+    return planilha.assign(**{coluna: resolvidos[coluna].to_numpy() for coluna in resolvidos.columns})
+
+
+def links_quebrados(planilha):
+    """Rows of a resolved worksheet (resolver_links) whose UrlExsicata has no usable file id."""
+    colunas = [c for c in ("barcode", "ArchiveName", "Subpasta", "UrlExsicata", "problema_link") if c in planilha.columns]
+    return planilha.loc[~planilha["link_valido"], colunas]
+
+
+def file_ids(planilha):
+    """Drive file id of each row of the Image worksheet (None for broken links)."""
+    if "file_id" in planilha.columns:
+        return planilha["file_id"]
+    if "UrlExsicata" in planilha.columns:
+        return planilha["UrlExsicata"].map(drive_link_to_file_id)
+    return pd.Series(None, index=planilha.index, dtype=object)
+
+
+def download_drive_image(file_id, sessao=None, cache=True, timeout=DRIVE_TIMEOUT):
+    """
+    Downloads the image from Google Drive with an explicit timeout
+    ((connect, read) seconds). A requests.Session may be passed to reuse
+    connections. Successful downloads are cached by file_id unless
+    cache=False.
+    """
+    if cache:
+        conteudo = _cache_drive.get(file_id)
+        if conteudo is not None:
+            return conteudo
+
+    url = f"{DRIVE_URL}?export=view&id={file_id}"
+    cliente = sessao or requests
+
+    with span("imagem.download", file_id=file_id) as atributos:
+        try:
+            response = cliente.get(url, timeout=timeout)
+
+        except requests.exceptions.Timeout:
+            raise ErroImagem("drive_timeout")
+
+        except requests.exceptions.RequestException:
+            raise ErroImagem("drive_rede")
+
+        atributos["status"] = response.status_code
+
+        if response.status_code != 200:
+            raise ErroImagem("drive_status", status=response.status_code)
+
+        content_type = response.headers.get("Content-Type", "")
+
+        if "image" not in content_type.lower():
+            raise ErroImagem("drive_nao_imagem")
+
+        atributos["bytes"] = len(response.content)
+
+    if cache:
+        _cache_drive.put(file_id, response.content)
+
+    return response.content
+
+
+def imagem_em_cache(file_id):
+    """Whether download_drive_image(file_id) would be answered by the cache."""
+    return file_id in _cache_drive
+
+
+def preparar_imagem_para_plantnet(image_bytes, max_size_mb=45):
+    """
+    Opens the image, fixes EXIF orientation, converts it to RGB and generates a JPEG.
+    Keeps a safety margin below the 50 MB limit accepted by Pl@ntNet.
+    """
+    with span("imagem.preparo", bytes=len(image_bytes)) as atributos:
+        cpu_inicio = time.thread_time()
+
+        try:
+            img = Image.open(BytesIO(image_bytes))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGB")
+
+        except Exception:
+            raise ErroImagem("imagem_invalida")
+
+        buffer = BytesIO()
+        img.save(buffer, format="JPEG", quality=90, optimize=True)
+        prepared_bytes = buffer.getvalue()
+
+        max_size_bytes = max_size_mb * 1024 * 1024
+
+        if len(prepared_bytes) > max_size_bytes:
+            img.thumbnail((2500, 2500))
+            buffer = BytesIO()
+            img.save(buffer, format="JPEG", quality=85, optimize=True)
+            prepared_bytes = buffer.getvalue()
+
+        atributos["cpu_s"] = time.thread_time() - cpu_inicio
+
+        if len(prepared_bytes) > 50 * 1024 * 1024:
+            raise ErroImagem("imagem_grande")
+
+        return img, prepared_bytes
+
+
+def _miniatura(image_bytes, lado):
+    try:
+        img = Image.open(BytesIO(image_bytes))
+        img.draft("RGB", (lado, lado))
+        img = ImageOps.exif_transpose(img).convert("RGB")
+    except Exception:
+        raise ErroImagem("imagem_invalida")
+
+    img.thumbnail((lado, lado))
+    buffer = BytesIO()
+    img.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def miniatura_drive(file_id, chave=None, lado=LADO_MINIATURA, timeout=DRIVE_TIMEOUT):
+    """
+    JPEG thumbnail of a Drive image for the gallery, cached by `chave`
+    (default: file_id). JPEG scans are decoded at a reduced size.
+    """
+    return _cache_miniaturas.obter_ou_calcular(
+        (chave or file_id, lado),
+        lambda: _miniatura(download_drive_image(file_id, timeout=timeout), lado)
+    )
+
+
+def _cota_restante(response):
+    """remainingIdentificationRequests of a Pl@ntNet answer, when present."""
+    if response.status_code != 200:
+        return None
+    try:
+        return response.json().get("remainingIdentificationRequests")
+    except ValueError:
+        return None
+
+
+def identificar_com_plantnet(image_bytes, api_key, organ="auto", ao_falhar=None, sessao=None, espera=3,
+                             chave_cache=None, timeout=PLANTNET_TIMEOUT):
+    """
+    Sends the prepared JPEG, or a list of JPEGs of the same specimen (e.g.
+    the crops of biocurate.recorte, up to MAX_IMAGENS_PLANTNET), to
+    Pl@ntNet in one identification and returns the HTTP response.
+    Connection failures are retried up to MAX_TENTATIVAS times, waiting
+    `espera` * attempt seconds; ao_falhar(tentativa, tipo_erro) is called
+    after each failure so the page can warn the user. With chave_cache,
+    successful answers are cached under that key and not requested again.
+    """
+    if chave_cache is not None:
+        guardada = _cache_plantnet.get(chave_cache)
+        if guardada is not None:
+            return guardada
+
+    imagens = [image_bytes] if isinstance(image_bytes, (bytes, bytearray)) else list(image_bytes)
+    imagens = imagens[:MAX_IMAGENS_PLANTNET]
+
+    params = {
+        "api-key": api_key,
+        "nb-results": 5,
+        "lang": "en"
+    }
+
+    data = None
+    if organ and organ != "auto":
+        data = {
+            "organs": [organ] * len(imagens)
+        }
+
+    cliente = sessao or requests
+
+    with span("imagem.plantnet", organ=organ, imagens=len(imagens), bytes=sum(map(len, imagens))) as atributos:
+        ultimo_erro_tipo = None
+
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            atributos["tentativas"] = tentativa
+
+            try:
+                # Recreate BytesIO and files on each attempt.
+                # This prevents the file from being resent empty after a failure.
+                files = [
+                    ("images", (f"image{i}.jpg", BytesIO(imagem), "image/jpeg"))
+                    for i, imagem in enumerate(imagens, 1)
+                ]
+
+                response = cliente.post(
+                    PLANTNET_URL,
+                    params=params,
+                    files=files,
+                    data=data,
+                    timeout=timeout
+                )
+
+                atributos["status"] = response.status_code
+                atributos["restantes"] = _cota_restante(response)
+
+                if chave_cache is not None and response.status_code == 200:
+                    _cache_plantnet.put(chave_cache, response, len(response.content))
+                return response
+
+            except requests.exceptions.ConnectTimeout:
+                ultimo_erro_tipo = "ConnectTimeout"
+
+            except requests.exceptions.ReadTimeout:
+                ultimo_erro_tipo = "ReadTimeout"
+
+            except requests.exceptions.ConnectionError:
+                ultimo_erro_tipo = "ConnectionError"
+
+            except requests.exceptions.RequestException:
+                ultimo_erro_tipo = "RequestException"
+
+            if ao_falhar:
+                ao_falhar(tentativa, ultimo_erro_tipo)
+
+            time.sleep(espera * tentativa)
+
+        raise ErroImagem("plantnet_sem_conexao", detalhe=ultimo_erro_tipo)
+
+
+def identificacao_em_cache(chave_cache):
+    """Whether a successful Pl@ntNet answer is cached under chave_cache."""
+    return chave_cache in _cache_plantnet
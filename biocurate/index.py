@@ -0,0 +1,529 @@
+# -----------------------------------------------
+# In-memory lookup indexes
+#
+# Hash indexes from accession number and block (fieldNumber) to row
+# positions, built once per dataset and shared by every lookup.
+#
+# Text fields (collectors) use inverted indexes over accent-folded tokens
+# (biocurate.texto), intersected with the record-number and date indexes.
+#
+# indice_base(df) returns the IndiceBase of a dataset version, shared by
+# every session that loaded the same data (see versao_base).
+# -----------------------------------------------
+
+import re
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from biocurate.duplicatas import LIMIAR, pares_candidatos, relatorio_duplicatas
+from biocurate.fulltext import IndiceTexto
+from biocurate.reports import (
+    contar_coletores,
+    contar_familias_generos,
+    contar_por_periodo,
+    inventario_locais,
+    locais_por_taxon,
+    partes_local,
+)
+from biocurate.search import (
+    chave_bloco,
+    chave_tombo,
+    chaves_tombo,
+    coluna_tombo,
+    normalizar_bloco,
+    partes_tombos,
+    prefixo_tombo,
+    prefixos_compativeis,
+)
+from biocurate.texto import dobrar_serie, tokens, tokens_serie
+from biocurate.tracing import span
+from biocurate.validacao import validar_base
+
+
+_VAZIO = np.empty(0, dtype=np.intp)
+
+# Dataset versions whose indexes are kept in memory at the same time.
+MAX_INDICES = 4
+
+# Structures updated row by row from the previous dataset version.
+INCREMENTAIS = ("texto", "validacao")
+
+_trava = threading.Lock()
+_indices = OrderedDict()
+
+
+def chave_data(texto, fim=False):
+    """
+    Numeric key yyyymmdd of a (possibly partial) ISO date. Missing parts
+    become the start of the period, or its end when fim=True, so that
+    ("1980", "1990") covers 1980-01-01 to 1990-12-31. Accepts int years.
+    """
+    if texto is None or (not isinstance(texto, str) and pd.isna(texto)):
+        return None
+
+    m = re.match(r"^\s*(\d{4})(?:-(\d{1,2}))?(?:-(\d{1,2}))?", str(texto))
+    if not m:
+        return None
+
+    ano = int(m.group(1))
+    mes = int(m.group(2)) if m.group(2) else (12 if fim else 0)
+    dia = int(m.group(3)) if m.group(3) else (31 if fim else 0)
+    return ano * 10000 + mes * 100 + dia
+
+
+def _limite_data(valor, fim=False):
+    """chave_data of a period bound, or ValueError when it is not a date."""
+    chave = chave_data(valor, fim)
+    if chave is None:
+        raise ValueError(f"Unrecognized date: {valor!r} (expected 1980, 1980-05 or 1980-05-12).")
+    return chave
+
+
+def chaves_data(eventos):
+    """
+    Vectorized chave_data (start of period) for the dataColeta column built
+    by preparar_base ("yyyy", "yyyy-mm" or "yyyy-mm-dd"), as a float array
+    with NaN for records without a date.
+    """
+    texto = pd.Series(eventos).astype("string")
+    ano = pd.to_numeric(texto.str[:4], errors="coerce")
+    mes = pd.to_numeric(texto.str[5:7], errors="coerce").fillna(0)
+    dia = pd.to_numeric(texto.str[8:10], errors="coerce").fillna(0)
+    return (ano * 10000 + mes * 100 + dia).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _agrupar(chaves):
+    """
+    Returns a dict {key: array of row positions} for a key Series.
+    Rows without a key are left out.
+    """
+    chaves = pd.Series(chaves).reset_index(drop=True)
+    chaves = chaves[chaves.notna()]
+
+    if chaves.empty:
+        return {}
+
+    posicoes = chaves.index.to_numpy()
+    grupos = pd.Series(posicoes).groupby(chaves.to_numpy()).indices
+    return {chave: posicoes[i] for chave, i in grupos.items()}
+
+
+def _invertido(tokens):
+    """
+    Inverted index {token: sorted row positions} from a Series of tokens
+    indexed by row position (see texto.tokens_serie).
+    """
+    if tokens.empty:
+        return {}
+
+    posicoes = tokens.index.to_numpy()
+    grupos = pd.Series(posicoes).groupby(tokens.to_numpy()).indices
+    return {token: np.unique(posicoes[i]) for token, i in grupos.items()}
+
+
+def _interseccao(conjuntos):
+    resultado = None
+    for posicoes in conjuntos:
+        resultado = posicoes if resultado is None else np.intersect1d(resultado, posicoes, assume_unique=True)
+    return _VAZIO if resultado is None else resultado
+
+
+class IndiceBase:
+    """
+    Indexes over one dataset. Each index is built on first use and kept for
+    the lifetime of the object, so build one IndiceBase per dataset version.
+    """
+
+    def __init__(self, df, anteriores=None):
+        self.df = df
+        self.versao = versao_base(df)
+        # Structures of the previous version that can be updated
+        # incrementally ({"texto": IndiceTexto, "validacao": Validacao})
+        self._anteriores = dict(anteriores or {})
+        self._postos = {}
+
+    @cached_property
+    def coluna_tombo(self):
+        return coluna_tombo(self.df)
+
+    @cached_property
+    def tombo(self):
+        """Accession number (numeric part) -> row positions."""
+        if self.coluna_tombo is None:
+            return {}
+        return _agrupar(chaves_tombo(self.df[self.coluna_tombo]))
+
+    @cached_property
+    def bloco(self):
+        """Normalized block number (fieldNumber) -> row positions."""
+        if "fieldNumber" not in self.df.columns:
+            return {}
+        return _agrupar(normalizar_bloco(self.df["fieldNumber"]))
+
+    @cached_property
+    def familia(self):
+        """Family (upper case) -> row positions."""
+        if "family" not in self.df.columns:
+            return {}
+        return _agrupar(self.df["family"].astype("string").str.strip().str.upper())
+
+    @cached_property
+    def datas(self):
+        """
+        Sorted date keys (see chave_data) and the row position of each,
+        for range queries with searchsorted. Records without a date are
+        left out.
+        """
+        if "dataColeta" not in self.df.columns:
+            return np.empty(0), _VAZIO
+
+        chaves = chaves_data(self.df["dataColeta"])
+        posicoes = np.flatnonzero(~np.isnan(chaves))
+        ordem = np.argsort(chaves[posicoes], kind="stable")
+        return chaves[posicoes][ordem], posicoes[ordem]
+
+    @cached_property
+    def temporal(self):
+        """Specimens per year and per decade of the whole dataset."""
+        if "yearCollected" not in self.df.columns:
+            return None
+        return contar_por_periodo(self.df)
+
+    @cached_property
+    def texto(self):
+        """Full-text index over every text column (see biocurate.fulltext)."""
+        anterior = self._anteriores.pop("texto", None)
+        if anterior is not None:
+            return anterior.atualizado(self.df)
+        return IndiceTexto(self.df)
+
+    @cached_property
+    def validacao(self):
+        """Data-quality issues of the dataset (see biocurate.validacao)."""
+        anterior = self._anteriores.pop("validacao", None)
+        if anterior is not None:
+            return anterior.atualizado(self.df)
+        return validar_base(self.df)
+
+    @cached_property
+    def familias_generos(self):
+        """Specimens per (family, genus), for the Report page charts."""
+        return contar_familias_generos(self.df)
+
+    def contagem_familias(self):
+        """Specimens per family (families with a name only)."""
+        contagem = self.familias_generos.groupby(level=0).sum()
+        return contagem[contagem.index.notna()]
+
+    def contagem_generos(self, familia):
+        """Specimens per genus of one family (case-insensitive)."""
+        contagem = self.familias_generos
+        familias = contagem.index.get_level_values(0)
+        selecao = contagem[familias.str.upper() == str(familia).strip().upper()]
+        selecao = selecao.groupby(level=1, dropna=False).sum()
+        return selecao.rename(index=lambda g: g if isinstance(g, str) else "?")
+
+    @cached_property
+    def coletores(self):
+        """
+        Accent-folded name token of recordedBy / addCollector -> row
+        positions, with the sorted vocabulary for prefix queries.
+        """
+        partes = [
+            tokens_serie(self.df[c])
+            for c in ("recordedBy", "addCollector")
+            if c in self.df.columns
+        ]
+        if not partes:
+            return {}, np.empty(0, dtype=object)
+
+        invertido = _invertido(pd.concat(partes))
+        return invertido, np.array(sorted(invertido), dtype=object)
+
+    @cached_property
+    def numero_coleta(self):
+        """Normalized recordNumber -> row positions."""
+        if "recordNumber" not in self.df.columns:
+            return {}
+        return _agrupar(normalizar_bloco(self.df["recordNumber"]))
+
+    @cached_property
+    def contagem_coletores(self):
+        """Specimens per collector (main and additional) of the whole dataset."""
+        return contar_coletores(self.df)
+
+    @cached_property
+    def locais(self):
+        """
+        Storage location (dynamicProperties) and cabinet -> row positions:
+        ({location: positions}, {cabinet: positions}).
+        """
+        if "dynamicProperties" not in self.df.columns:
+            return {}, {}
+
+        partes = partes_local(self.df["dynamicProperties"])
+        return _agrupar(partes["local"]), _agrupar(partes["armario"])
+
+    @cached_property
+    def inventario(self):
+        """Precomputed inventory per storage location (see inventario_locais)."""
+        if "dynamicProperties" not in self.df.columns:
+            return None
+        return inventario_locais(self.df)
+
+    @cached_property
+    def locais_taxon(self):
+        """
+        Specimens per (taxon in upper case, location), for onde_esta.
+        None without locations or taxon columns.
+        """
+        if "dynamicProperties" not in self.df.columns:
+            return None
+        return locais_por_taxon(self.df)
+
+    @cached_property
+    def pares_duplicatas(self):
+        """Scored candidate duplicate pairs (see biocurate.duplicatas)."""
+        return pares_candidatos(self.df)
+
+    def duplicatas(self, limiar=LIMIAR):
+        """Clusters of probable duplicates above the threshold."""
+        return relatorio_duplicatas(self.df, self.pares_duplicatas, limiar)
+
+    def posto(self, coluna):
+        """
+        Rank of every row in the sort order of a column (-1 when missing),
+        computed once per column, so result tables sort by comparing
+        integers. Columns whose values are all numbers sort numerically,
+        the others as accent-folded text.
+        """
+        posto = self._postos.get(coluna)
+        if posto is None:
+            # Ranked once per distinct value
+            codigos, unicos = pd.factorize(self.df[coluna])
+            chaves = pd.to_numeric(pd.Series(unicos), errors="coerce")
+            if chaves.isna().any():
+                chaves = dobrar_serie(unicos).str.strip()
+                chaves = chaves.mask(chaves == "")
+            postos_unicos = pd.factorize(chaves, sort=True)[0]
+            posto = np.where(codigos >= 0, postos_unicos[np.maximum(codigos, 0)], -1)
+            self._postos[coluna] = posto
+        return posto
+
+    def posicoes_tombo(self, codigo):
+        posicoes = self.tombo.get(chave_tombo(codigo), _VAZIO)
+        if not len(posicoes):
+            return posicoes
+
+        # Same number in another collection (see prefixo_tombo)
+        prefixo = prefixo_tombo(codigo)
+        if prefixo:
+            registros = [prefixo_tombo(v) for v in self.df[self.coluna_tombo].iloc[posicoes]]
+            posicoes = posicoes[prefixos_compativeis(prefixo, registros)]
+        return posicoes
+
+    def posicoes_tombos(self, codigos):
+        """
+        posicoes_tombo for many codes at once, with one parsing pass over
+        the codes and one over the stored codes they matched. Returns a
+        list with the positions of each code.
+        """
+        prefixos, chaves = partes_tombos(pd.Series(codigos, dtype=object))
+        resultado = [self.tombo.get(c, _VAZIO) for c in chaves.tolist()]
+
+        verificar = [i for i, p in enumerate(resultado) if len(p) and prefixos[i]]
+        if not verificar:
+            return resultado
+
+        # Same number in another collection (see prefixo_tombo)
+        todas = np.concatenate([resultado[i] for i in verificar])
+        registros = partes_tombos(self.df[self.coluna_tombo].to_numpy()[todas])[0]
+        consultas = np.repeat(prefixos[verificar], [len(resultado[i]) for i in verificar])
+        compativeis = np.split(
+            prefixos_compativeis(consultas, registros),
+            np.cumsum([len(resultado[i]) for i in verificar])[:-1],
+        )
+        for i, manter in zip(verificar, compativeis):
+            resultado[i] = resultado[i][manter]
+
+        return resultado
+
+    def posicoes_bloco(self, bloco):
+        return self.bloco.get(chave_bloco(bloco), _VAZIO)
+
+    def buscar_tombo(self, codigo):
+        return self.df.iloc[self.posicoes_tombo(codigo)]
+
+    def buscar_bloco(self, bloco):
+        return self.df.iloc[self.posicoes_bloco(bloco)]
+
+    @span("busca.bloco")
+    def buscar_blocos(self, blocos):
+        """
+        Specimens of several blocks, grouped in the given order, and the
+        blocks that were not found.
+        """
+        encontrados = []
+        faltando = []
+
+        for bloco in blocos:
+            posicoes = self.posicoes_bloco(bloco)
+            if len(posicoes):
+                encontrados.append(posicoes)
+            else:
+                faltando.append(bloco)
+
+        posicoes = np.concatenate(encontrados) if encontrados else _VAZIO
+        return self.df.iloc[posicoes], faltando
+
+    def posicoes_familia(self, familia):
+        return self.familia.get(str(familia).strip().upper(), _VAZIO)
+
+    def posicoes_periodo(self, inicio=None, fim=None):
+        """
+        Row positions (in date order) of records collected between inicio
+        and fim, inclusive. Both accept "1980", "1980-05", "1980-05-12" or
+        an int year; None leaves that side open. Raises ValueError for
+        bounds that are not such dates ("05/1980", "80").
+        """
+        chaves, posicoes = self.datas
+        baixo = 0 if inicio is None else np.searchsorted(chaves, _limite_data(inicio), "left")
+        alto = len(chaves) if fim is None else np.searchsorted(chaves, _limite_data(fim, fim=True), "right")
+        return posicoes[baixo:alto]
+
+    def posicoes_termo_coletor(self, termo):
+        """
+        Rows whose collectors contain the token, or, when no name has
+        exactly that token, a token starting with it ("duck" -> "ducke").
+        """
+        invertido, vocabulario = self.coletores
+        if termo in invertido:
+            return invertido[termo]
+
+        inicio = np.searchsorted(vocabulario, termo, "left")
+        fim = np.searchsorted(vocabulario, termo + "\uffff", "left")
+        if inicio == fim:
+            return _VAZIO
+        return np.unique(np.concatenate([invertido[t] for t in vocabulario[inicio:fim]]))
+
+    def posicoes_coletor(self, nome="", numero=None, ano=None):
+        """
+        Row positions matching every name token of `nome` and, when given,
+        the record number and the collection year.
+        """
+        conjuntos = [self.posicoes_termo_coletor(t) for t in tokens(nome)]
+
+        if numero:
+            conjuntos.append(self.numero_coleta.get(chave_bloco(numero), _VAZIO))
+        if ano:
+            conjuntos.append(np.sort(self.posicoes_periodo(ano, ano)))
+
+        return _interseccao(conjuntos)
+
+    @span("busca.coletor")
+    def buscar_coletor(self, consulta, ano=None):
+        """
+        Records for a "collector number" query such as "Ducke 1234",
+        "Ducke" or "Rodrigues W 9178", optionally from one year. Tokens
+        with digits are taken as the record number.
+        """
+        termos = tokens(consulta)
+        nome = " ".join(t for t in termos if not t.isdigit())
+        numeros = [t for t in termos if t.isdigit()]
+        numero = numeros[-1] if numeros else None
+
+        return self.df.iloc[self.posicoes_coletor(nome, numero, ano)]
+
+    @span("busca.local")
+    def buscar_local(self, local=None, armario=None):
+        """
+        Specimens stored in one location ("Armário 12 - Prateleira 3") or in
+        a whole cabinet ("12"), in dataset order.
+        """
+        por_local, por_armario = self.locais
+
+        if local is not None:
+            posicoes = por_local.get(" ".join(str(local).split()), _VAZIO)
+        else:
+            posicoes = por_armario.get(str(armario).strip(), _VAZIO)
+
+        return self.df.iloc[np.sort(posicoes)]
+
+    def onde_esta(self, taxon):
+        """
+        Where a family, genus or species (case-insensitive) is stored:
+        DataFrame with local and amostras, largest first.
+        """
+        if self.locais_taxon is None:
+            return pd.DataFrame(columns=["local", "amostras"])
+
+        chave = str(taxon).strip().upper()
+        if chave not in self.locais_taxon.index.levels[0]:
+            return pd.DataFrame(columns=["local", "amostras"])
+
+        return (
+            self.locais_taxon.loc[chave]
+            .sort_values(ascending=False)
+            .rename_axis("local")
+            .reset_index()
+        )
+
+    @span("busca.periodo")
+    def buscar_periodo(self, inicio=None, fim=None, familia=None):
+        """
+        Records collected between inicio and fim, optionally of one family
+        (e.g. all Myrtaceae from 1980 to 1990), in date order.
+        """
+        posicoes = self.posicoes_periodo(inicio, fim)
+        if familia:
+            posicoes = posicoes[np.isin(posicoes, self.posicoes_familia(familia))]
+        return self.df.iloc[posicoes]
+
+
+def versao_base(df):
+    """
+    Version of a dataset: a hash of its contents computed once at load by
+    preparar_base and kept in df.attrs (copies keep it). Falls back to the
+    object id for DataFrames that did not go through preparar_base.
+    """
+    return df.attrs.get("versao", f"id-{id(df)}")
+
+
+def indice_base(df):
+    """
+    IndiceBase shared by every session using the same dataset version.
+    The last MAX_INDICES versions are kept.
+    """
+    versao = versao_base(df)
+
+    with _trava:
+        indice = _indices.get(versao)
+        if indice is not None:
+            _indices.move_to_end(versao)
+            return indice
+
+        # A new version of the dataset reuses the full-text index and the
+        # validation of the most recent one, when they were built, so only
+        # changed rows are processed again
+        anterior = next(reversed(_indices.values()), None)
+        anteriores = {
+            nome: anterior.__dict__[nome]
+            for nome in INCREMENTAIS
+            if anterior is not None and nome in anterior.__dict__
+        }
+
+        indice = _indices[versao] = IndiceBase(df, anteriores)
+        while len(_indices) > MAX_INDICES:
+            _indices.popitem(last=False)
+
+    return indice
+
+
+def indices_ativos():
+    """{version: IndiceBase} kept in memory (used by the memory view)."""
+    with _trava:
+        return dict(_indices)
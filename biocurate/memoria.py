@@ -0,0 +1,158 @@
+# -----------------------------------------------
+# Memory accounting
+#
+# Attributes memory to datasets (per column, deep), indexes, caches and
+# session state, and reads the resident memory of the process. Objects
+# shared between owners (e.g. the same DataFrame in two sessions) are
+# counted once, for the first owner measured.
+#
+# The high-water alert threshold comes from BIOCURATE_MEMORIA_ALERTA_MB
+# (0 disables it) and can be changed at runtime with definir_limite_mb.
+# -----------------------------------------------
+
+import os
+import sys
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+from biocurate import cache
+
+
+LIMITE_ALERTA_MB = float(os.environ.get("BIOCURATE_MEMORIA_ALERTA_MB", "0"))
+
+
+def definir_limite_mb(limite_mb):
+    global LIMITE_ALERTA_MB
+    LIMITE_ALERTA_MB = float(limite_mb)
+
+
+def rss_bytes():
+    """Current resident memory of the process (peak where unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return pico_rss_bytes()
+
+
+def pico_rss_bytes():
+    """
+    Peak resident memory of the process. Without the resource module
+    (Windows), the peak of the Python allocations traced by tracemalloc,
+    or 0 when it is not tracing.
+    """
+    if resource is None:
+        return tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def alerta(rss=None):
+    """
+    True when the resident memory is above the configured threshold.
+    """
+    if LIMITE_ALERTA_MB <= 0:
+        return False
+    rss = rss_bytes() if rss is None else rss
+    return rss > LIMITE_ALERTA_MB * 1024 * 1024
+
+
+def colunas_dataframe(df):
+    """
+    Deep memory per column of a DataFrame, largest first, as a DataFrame
+    with coluna, tipo and bytes.
+    """
+    uso = df.memory_usage(deep=True, index=True)
+
+    return (
+        pd.DataFrame({
+            "coluna": uso.index.astype(str),
+            "tipo": [str(df[c].dtype) if c in df.columns else "index" for c in uso.index],
+            "bytes": uso.to_numpy(),
+        })
+        .sort_values("bytes", ascending=False)
+        .reset_index(drop=True)
+    )
+
+
+def tamanho(obj, vistos=None):
+    """
+    Approximate deep size of an object in bytes. DataFrames, Series and
+    NumPy arrays are measured by pandas/NumPy; containers and plain
+    objects are followed recursively. Objects whose id is already in
+    `vistos` count as zero.
+    """
+    if vistos is None:
+        vistos = set()
+
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True, index=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (bytes, bytearray, str)):
+        return sys.getsizeof(obj)
+    if isinstance(obj, cache.CacheLRU):
+        return obj.bytes
+
+    total = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        total += sum(tamanho(k, vistos) + tamanho(v, vistos) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        total += sum(tamanho(v, vistos) for v in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        total += tamanho(vars(obj), vistos)
+
+    return total
+
+
+def relatorio(datasets=None, indices=None, sessoes=None):
+    """
+    One row per owner: datasets ({name: DataFrame}), indexes ({name:
+    IndiceBase}), the registered caches and sessions ({id: {key: value}}).
+    Measured in that order, so a dataset kept in session state is
+    attributed to the dataset, not to the session.
+    """
+    vistos = set()
+    linhas = []
+
+    for nome, df in (datasets or {}).items():
+        linhas.append({"grupo": "dataset", "nome": nome, "bytes": tamanho(df, vistos)})
+
+    for nome, indice in (indices or {}).items():
+        # The index keeps a reference to its dataset; do not count it here
+        if hasattr(indice, "df"):
+            vistos.add(id(indice.df))
+        linhas.append({"grupo": "indice", "nome": nome, "bytes": tamanho(indice, vistos)})
+
+    for c in cache.caches():
+        linhas.append({"grupo": "cache", "nome": c.nome, "bytes": c.bytes, "itens": len(c)})
+
+    for sessao, estado in (sessoes or {}).items():
+        linhas.append({"grupo": "sessao", "nome": str(sessao), "bytes": tamanho(dict(estado), vistos)})
+
+    return linhas
+
+
+def esvaziar_caches():
+    """Empties every registered cache and returns the bytes released."""
+    liberado = sum(c.bytes for c in cache.caches())
+    for c in cache.caches():
+        c.limpar()
+    return liberado
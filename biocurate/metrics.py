@@ -0,0 +1,309 @@
+# -----------------------------------------------
+# Prometheus-style metrics
+#
+# Turns the tracing spans into counters, gauges and latency histograms
+# and renders them in the Prometheus text format. They can be scraped
+# over HTTP (GET /metrics) or written periodically to a file for the
+# node_exporter textfile collector:
+#
+#   BIOCURATE_METRICS_PORT=9464             serve /metrics on this port
+#   BIOCURATE_METRICS_FILE=/var/lib/...     rewrite this file
+#   BIOCURATE_METRICS_INTERVAL=15           seconds between writes
+#
+# Both apps call iniciar_exportador() once per process; the lookup
+# service (python -m biocurate serve) answers GET /metrics itself.
+# -----------------------------------------------
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from biocurate import memoria, tracing
+
+
+# Upper bounds in seconds, from indexed lookups to Pl@ntNet round trips
+BUCKETS_S = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Upper bounds in bytes for Drive downloads
+BUCKETS_BYTES = (100_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000)
+
+_trava = threading.Lock()
+_metricas = []
+
+
+def _rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(f'{k}="{_escapar(v)}"' for k, v in rotulos)
+    return "{" + pares + "}"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _numero(valor):
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nome, ajuda):
+        self.nome = nome
+        self.ajuda = ajuda
+        self._series = {}
+        with _trava:
+            _metricas.append(self)
+
+    def _chave(self, rotulos):
+        return tuple(sorted(rotulos.items()))
+
+    def linhas(self):
+        yield f"# HELP {self.nome} {self.ajuda}"
+        yield f"# TYPE {self.nome} {self.tipo}"
+        for chave, valor in sorted(self._series.items()):
+            yield from self._amostras(chave, valor)
+
+    def _amostras(self, chave, valor):
+        yield f"{self.nome}{_rotulos(chave)} {_numero(valor)}"
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def somar(self, valor=1, **rotulos):
+        chave = self._chave(rotulos)
+        with _trava:
+            self._series[chave] = self._series.get(chave, 0) + valor
+
+
+class Medidor(_Metrica):
+    tipo = "gauge"
+
+    def definir(self, valor, **rotulos):
+        with _trava:
+            self._series[self._chave(rotulos)] = valor
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, buckets=BUCKETS_S):
+        super().__init__(nome, ajuda)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor, **rotulos):
+        chave = self._chave(rotulos)
+        with _trava:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * len(self.buckets), 0, 0.0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += 1
+            serie[2] += valor
+
+    def _amostras(self, chave, serie):
+        acumulado = 0
+        for limite, n in zip(self.buckets, serie[0]):
+            acumulado += n
+            rotulos = chave + (("le", _numero(float(limite))),)
+            yield f"{self.nome}_bucket{_rotulos(rotulos)} {acumulado}"
+        yield f"{self.nome}_bucket{_rotulos(chave + (('le', '+Inf'),))} {serie[1]}"
+        yield f"{self.nome}_count{_rotulos(chave)} {serie[1]}"
+        yield f"{self.nome}_sum{_rotulos(chave)} {_numero(serie[2])}"
+
+
+# -------------------------------------------------
+# BioCurate metrics
+# -------------------------------------------------
+LOOKUP = Histograma(
+    "biocurate_lookup_seconds",
+    "Accession, block and taxon lookups (origem=app: page search, servico: lookup service)."
+)
+PLANILHA = Histograma("biocurate_sheet_load_seconds", "Google Sheets worksheet reads.")
+ETAPA = Histograma("biocurate_stage_seconds", "Other traced stages (dataset preparation, reports, QR decode).")
+
+DRIVE = Histograma("biocurate_drive_download_seconds", "Google Drive image downloads.")
+DRIVE_BYTES = Histograma("biocurate_drive_download_bytes", "Size of downloaded Drive images.", BUCKETS_BYTES)
+DRIVE_ERROS = Contador("biocurate_drive_errors_total", "Failed Drive downloads by error type.")
+
+PREPARO_CPU = Contador("biocurate_image_prep_cpu_seconds_total", "CPU time spent preparing and cropping JPEGs for Pl@ntNet.")
+PREPARO = Histograma("biocurate_image_prep_seconds", "Wall time of each JPEG preparation.")
+
+PLANTNET = Histograma("biocurate_plantnet_seconds", "Pl@ntNet identification requests, including retries.")
+PLANTNET_BYTES = Histograma(
+    "biocurate_plantnet_upload_bytes", "Size of the images sent in each Pl@ntNet request.", BUCKETS_BYTES
+)
+PLANTNET_RETENTATIVAS = Contador("biocurate_plantnet_retries_total", "Pl@ntNet connection attempts that were retried.")
+PLANTNET_ERROS = Contador("biocurate_plantnet_errors_total", "Failed Pl@ntNet requests by error type or HTTP status.")
+PLANTNET_COTA = Medidor(
+    "biocurate_plantnet_remaining_requests",
+    "Last remainingIdentificationRequests reported by Pl@ntNet."
+)
+
+CACHE = Contador("biocurate_cache_requests_total", "Cache lookups by cache and result.")
+MEMORIA = Medidor("biocurate_process_resident_bytes", "Resident memory of the process.")
+
+
+_LOOKUPS = {
+    "busca.tombo": ("tombo", "app"),
+    "busca.bloco": ("bloco", "app"),
+    "busca.taxon": ("taxon", "app"),
+    "busca.coletor": ("coletor", "app"),
+    "busca.periodo": ("periodo", "app"),
+    "busca.local": ("local", "app"),
+    "busca.texto": ("texto", "app"),
+    "servico.tombo": ("tombo", "servico"),
+    "servico.bloco": ("bloco", "servico"),
+    "servico.lote": ("lote", "servico"),
+}
+
+_PLANILHAS = {
+    "base.planilha": "Metadata",
+    "imagem.planilha": "Image",
+}
+
+
+def registrar_span(registro):
+    """Updates the metrics for one finished span (tracing observer)."""
+    etapa = registro["etapa"]
+    segundos = registro["duracao_ms"] / 1000
+    erro = registro["erro"]
+
+    if etapa in _LOOKUPS:
+        tipo, origem = _LOOKUPS[etapa]
+        LOOKUP.observar(segundos, tipo=tipo, origem=origem)
+
+    elif etapa in _PLANILHAS:
+        PLANILHA.observar(segundos, planilha=_PLANILHAS[etapa])
+
+    elif etapa == "imagem.download":
+        if erro:
+            DRIVE_ERROS.somar(tipo=erro)
+        else:
+            DRIVE.observar(segundos)
+            DRIVE_BYTES.observar(registro.get("bytes", 0))
+
+    elif etapa == "imagem.preparo":
+        PREPARO.observar(segundos)
+        PREPARO_CPU.somar(registro.get("cpu_s", 0.0))
+
+    elif etapa == "imagem.recorte":
+        ETAPA.observar(segundos, etapa=etapa)
+        PREPARO_CPU.somar(registro.get("cpu_s", 0.0))
+
+    elif etapa == "imagem.plantnet":
+        PLANTNET.observar(segundos)
+        PLANTNET_BYTES.observar(registro.get("bytes", 0))
+        PLANTNET_RETENTATIVAS.somar(max(registro.get("tentativas", 1) - 1, 0))
+
+        status = registro.get("status")
+        if erro:
+            PLANTNET_ERROS.somar(tipo=erro)
+        elif status is not None and status != 200:
+            PLANTNET_ERROS.somar(tipo=f"http_{status}")
+
+        if registro.get("restantes") is not None:
+            PLANTNET_COTA.definir(registro["restantes"])
+
+    elif etapa != "rerun":
+        ETAPA.observar(segundos, etapa=etapa)
+
+
+tracing.observar(registrar_span)
+
+
+def texto_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    caches = tracing.taxas_cache()
+    MEMORIA.definir(memoria.rss_bytes())
+
+    with _trava:
+        # Cache counters live in tracing; copy them in at export time
+        for c in caches:
+            CACHE._series[(("cache", c["cache"]), ("resultado", "acerto"))] = c["acertos"]
+            CACHE._series[(("cache", c["cache"]), ("resultado", "falha"))] = c["falhas"]
+
+        linhas = [linha for m in _metricas for linha in m.linhas()]
+
+    return "\n".join(linhas) + "\n"
+
+
+# -------------------------------------------------
+# Exporters
+# -------------------------------------------------
+class _HandlerMetricas(BaseHTTPRequestHandler):
+    def log_message(self, formato, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0].rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+
+        dados = texto_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+
+def servir_metricas(host="0.0.0.0", porta=9464):
+    """Serves GET /metrics from a background thread. Returns the server."""
+    servidor = ThreadingHTTPServer((host, porta), _HandlerMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="biocurate-metrics", daemon=True).start()
+    return servidor
+
+
+def gravar_metricas(caminho):
+    """Writes the metrics file atomically (temporary file + rename)."""
+    temporario = f"{caminho}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(texto_prometheus())
+    os.replace(temporario, caminho)
+
+
+def gravar_periodicamente(caminho, intervalo=15):
+    """Rewrites the metrics file every `intervalo` seconds in a daemon thread."""
+    def laco():
+        while True:
+            try:
+                gravar_metricas(caminho)
+            except OSError:
+                pass
+            time.sleep(intervalo)
+
+    threading.Thread(target=laco, name="biocurate-metrics-file", daemon=True).start()
+
+
+_exportador_iniciado = False
+
+
+def iniciar_exportador():
+    """
+    Starts the exporters configured by environment variables, once per
+    process (Streamlit reruns the app script but keeps imported modules).
+    """
+    global _exportador_iniciado
+
+    with _trava:
+        if _exportador_iniciado:
+            return
+        _exportador_iniciado = True
+
+    porta = os.environ.get("BIOCURATE_METRICS_PORT")
+    if porta:
+        servir_metricas(porta=int(porta))
+
+    arquivo = os.environ.get("BIOCURATE_METRICS_FILE")
+    if arquivo:
+        gravar_periodicamente(arquivo, float(os.environ.get("BIOCURATE_METRICS_INTERVAL", "15")))
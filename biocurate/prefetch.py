@@ -0,0 +1,117 @@
+# -----------------------------------------------
+# Speculative prefetch for the Image page
+#
+# Once a code is resolved on the Search page (typed or read from a QR
+# code), the next step is almost always the Image page for the same
+# specimen. antecipar downloads its scans in a small thread pool into
+# the Drive cache of biocurate.images; with
+# BIOCURATE_PREFETCH_IDENTIFICACAO=1 it also prepares and crops them and
+# asks Pl@ntNet, filling the identification cache under the key the
+# Image page uses for its default options (organ "auto", plant crops).
+# Identification is off by default because every call spends Pl@ntNet
+# quota, and the prefetched specimen is not always opened.
+#
+# The Image page calls aguardar before downloading a scan, so a prefetch
+# still in flight is joined instead of fetching the same file twice.
+# -----------------------------------------------
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from biocurate.hash_imagem import indice_hashes
+from biocurate.images import (
+    download_drive_image,
+    identificacao_em_cache,
+    identificar_com_plantnet,
+    imagem_em_cache,
+    preparar_imagem_para_plantnet,
+)
+from biocurate.recorte import recortar_exsicata
+from biocurate.tracing import span
+
+
+PREFETCH_IDENTIFICACAO = os.environ.get("BIOCURATE_PREFETCH_IDENTIFICACAO", "0") == "1"
+
+TRABALHADORES = 2
+
+# Scans queued or in flight at once; further requests are dropped, as a
+# burst of scans means the curator is not opening each specimen
+MAX_PENDENTES = 8
+
+# Longest the Image page waits for a prefetch in flight (seconds)
+ESPERA_MAXIMA = 30
+
+_executor = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix="biocurate-prefetch")
+_trava = threading.RLock()
+_futuros = {}
+
+
+def chave_identificacao(file_id, organ="auto", recortar=True):
+    """
+    Key of the Pl@ntNet cache for a scan and the Image page options:
+    visually identical scans (biocurate.hash_imagem) share it.
+    """
+    return indice_hashes().representante(file_id), organ, recortar
+
+
+def _aquecer(file_id, api_key):
+    with span("imagem.prefetch", file_id=file_id, identificacao=api_key is not None):
+        dados = download_drive_image(file_id)
+        if api_key is None:
+            return
+
+        img, preparada = preparar_imagem_para_plantnet(dados)
+        indice_hashes().registrar(file_id, img)
+
+        chave = chave_identificacao(file_id)
+        if not identificacao_em_cache(chave):
+            recortes = recortar_exsicata(img)
+            identificar_com_plantnet([d for _, d in recortes] or preparada, api_key, chave_cache=chave)
+
+
+def _concluir(file_id):
+    with _trava:
+        _futuros.pop(file_id, None)
+
+
+def antecipar(file_ids, api_key=None):
+    """
+    Queues the Drive download of each scan of file_ids, and its
+    identification when api_key is given, unless it is already cached or
+    in flight. Returns the number of scans queued.
+    """
+    enfileirados = 0
+
+    with _trava:
+        for file_id in dict.fromkeys(file_ids):
+            if not file_id or file_id in _futuros or len(_futuros) >= MAX_PENDENTES:
+                continue
+            if imagem_em_cache(file_id) and (api_key is None or identificacao_em_cache(chave_identificacao(file_id))):
+                continue
+
+            futuro = _executor.submit(_aquecer, file_id, api_key)
+            _futuros[file_id] = futuro
+            futuro.add_done_callback(lambda _, file_id=file_id: _concluir(file_id))
+            enfileirados += 1
+
+    return enfileirados
+
+
+def aguardar(file_id, timeout=ESPERA_MAXIMA):
+    """
+    Waits for the prefetch of file_id, if one is in flight. Its errors
+    are left to the caller's own download, which reports them.
+    """
+    with _trava:
+        futuro = _futuros.get(file_id)
+
+    if futuro is not None:
+        with span("imagem.prefetch_espera", file_id=file_id):
+            wait([futuro], timeout=timeout)
+
+
+def pendentes():
+    """Number of scans queued or in flight."""
+    with _trava:
+        return len(_futuros)
@@ -0,0 +1,159 @@
+# -----------------------------------------------
+# Opt-in sampling profiler for Streamlit runs
+#
+# An admin arms the profiler for the next N runs of a session. While a
+# run is profiled, a background thread samples the stack of the script
+# thread every INTERVALO_S seconds; the result is offered as a
+# speedscope file (https://www.speedscope.app). When nothing is armed,
+# iniciar() is a single dict lookup.
+# -----------------------------------------------
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+
+
+INTERVALO_S = 0.005
+MAX_PERFIS = 20
+
+_trava = threading.Lock()
+_local = threading.local()
+
+_armados = {}                      # session -> runs left to profile
+_perfis = deque(maxlen=MAX_PERFIS)
+
+
+class _Amostrador(threading.Thread):
+    """Samples the stack of one thread until parar() is called."""
+
+    def __init__(self, alvo, intervalo):
+        super().__init__(name="biocurate-profiler", daemon=True)
+        self.alvo = alvo
+        self.intervalo = intervalo
+        self.amostras = []          # (stack of (name, file, line) root -> leaf, weight s)
+        self._fim = threading.Event()
+
+    def run(self):
+        anterior = time.perf_counter()
+
+        while not self._fim.wait(self.intervalo):
+            frame = sys._current_frames().get(self.alvo)
+            agora = time.perf_counter()
+
+            if frame is not None:
+                pilha = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pilha.append((codigo.co_name, codigo.co_filename, codigo.co_firstlineno))
+                    frame = frame.f_back
+                self.amostras.append((pilha[::-1], agora - anterior))
+
+            anterior = agora
+
+    def parar(self):
+        self._fim.set()
+        self.join()
+
+
+def armar(sessao, execucoes=1):
+    """Profiles the next `execucoes` runs of session `sessao`."""
+    with _trava:
+        if execucoes > 0:
+            _armados[sessao] = execucoes
+        else:
+            _armados.pop(sessao, None)
+
+
+def armados(sessao):
+    return _armados.get(sessao, 0)
+
+
+def iniciar(sessao):
+    """
+    Starts sampling the current thread if the session is armed.
+    Call finalizar() at the end of the run.
+    """
+    if sessao not in _armados:
+        return
+
+    with _trava:
+        restantes = _armados.pop(sessao, 0)
+        if restantes <= 0:
+            return
+        if restantes > 1:
+            _armados[sessao] = restantes - 1
+
+    amostrador = _Amostrador(threading.get_ident(), INTERVALO_S)
+    _local.perfil = (amostrador, sessao, time.time(), time.perf_counter())
+    amostrador.start()
+
+
+def finalizar(nome=None):
+    """Stops the sampling started by iniciar() and keeps the profile."""
+    atual = getattr(_local, "perfil", None)
+    if atual is None:
+        return
+
+    _local.perfil = None
+    amostrador, sessao, inicio, t0 = atual
+    amostrador.parar()
+
+    with _trava:
+        _perfis.append({
+            "sessao": sessao,
+            "nome": nome or "run",
+            "inicio": inicio,
+            "duracao_ms": (time.perf_counter() - t0) * 1000,
+            "amostras": amostrador.amostras,
+        })
+
+
+def perfis(sessao=None):
+    """Captured profiles, most recent first."""
+    with _trava:
+        lista = list(_perfis)
+
+    if sessao is not None:
+        lista = [p for p in lista if p["sessao"] == sessao]
+
+    return lista[::-1]
+
+
+def speedscope(perfil):
+    """Profile as a speedscope JSON document (bytes)."""
+    quadros = []
+    indices = {}
+    amostras = []
+    pesos = []
+
+    for pilha, peso in perfil["amostras"]:
+        linha = []
+        for quadro in pilha:
+            indice = indices.get(quadro)
+            if indice is None:
+                indice = indices[quadro] = len(quadros)
+                nome, arquivo, numero = quadro
+                quadros.append({"name": nome, "file": arquivo, "line": numero})
+            linha.append(indice)
+        amostras.append(linha)
+        pesos.append(peso)
+
+    documento = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": quadros},
+        "profiles": [{
+            "type": "sampled",
+            "name": perfil["nome"],
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(pesos),
+            "samples": amostras,
+            "weights": pesos,
+        }],
+        "name": perfil["nome"],
+        "exporter": "biocurate",
+    }
+
+    return json.dumps(documento).encode("utf-8")
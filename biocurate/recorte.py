@@ -0,0 +1,260 @@
+# -----------------------------------------------
+# Plant-material crops of herbarium sheets
+#
+# Before a scan goes to Pl@ntNet, the plant is separated from the
+# mounting paper and cut into a few tight crops, so the label, colour
+# chart and scale bar are not sent. The segmentation (OpenCV) runs on a
+# reduced copy of the sheet:
+#
+#   1. plant pixels: saturated and not too dark (paper, label text and
+#      the black-and-white ruler have little saturation);
+#   2. morphological opening and closing, then connected components;
+#   3. components too small, or almost perfectly rectangular (colour
+#      chart patches), are dropped;
+#   4. dark unsaturated pixels are split the same way: components that
+#      touch the plant (dried leaves) join it, and compact blocks away
+#      from it (label text, scale bars) are painted over with the paper
+#      colour.
+#
+# The crops are the box around all the plant material, its largest
+# separate pieces and the two halves of the plant along its long side;
+# each is cut from the full-resolution sheet.
+# -----------------------------------------------
+
+import time
+
+import cv2
+import numpy as np
+
+from biocurate.tracing import span
+
+
+# Crops sent in one identification (Pl@ntNet accepts up to 5 images)
+MAX_RECORTES = 3
+
+LADO_ANALISE = 800
+LADO_RECORTE = 1280
+QUALIDADE_JPEG = 88
+
+SATURACAO_MINIMA = 45
+VALOR_MINIMO = 25
+
+# Components smaller than this fraction of the sheet are noise
+AREA_MINIMA = 0.001
+
+# Fraction of its bounding box filled by a component above which it is
+# taken for a rectangle (colour chart, label) and not a plant
+RETANGULO = 0.9
+
+# Label text and scale bars: dark, unsaturated, in compact blocks
+VALOR_ESCURO = 110
+BLOCO_ESCURO = 0.6
+
+# Pieces of at least this fraction of the plant get a crop of their own
+PEDACO_MINIMO = 0.15
+
+# Margin added around each crop, as a fraction of its size
+MARGEM = 0.04
+
+
+def _limpar(mascara, lado):
+    """
+    Opening removes isolated specks (dust, stamps); closing joins nearby
+    pixels (the leaves and thin stems of a branch, the letters of a label)
+    into one component.
+    """
+    mascara = cv2.morphologyEx(mascara.astype(np.uint8), cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    nucleo = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (lado, lado))
+    return cv2.morphologyEx(mascara, cv2.MORPH_CLOSE, nucleo, iterations=2)
+
+
+def mascaras(rgb):
+    """
+    (plant material, dark unsaturated material) masks of a reduced sheet,
+    both cleaned with _limpar.
+    """
+    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    saturacao, valor = hsv[..., 1], hsv[..., 2]
+    lado = max(3, int(max(rgb.shape[:2]) * 0.01) | 1)
+
+    planta = (saturacao >= SATURACAO_MINIMA) & (valor >= VALOR_MINIMO)
+    escuro = (saturacao < SATURACAO_MINIMA) & (valor < VALOR_ESCURO)
+    return _limpar(planta, lado).astype(bool), _limpar(escuro, 2 * lado + 1).astype(bool)
+
+
+def _componentes(mascara):
+    """
+    Label, bounding box (x0, y0, x1, y1), area and fill ratio of each
+    component, and the label image.
+    """
+    n, rotulos, estatisticas, _ = cv2.connectedComponentsWithStats(mascara.astype(np.uint8), connectivity=8)
+    minimo = AREA_MINIMA * mascara.size
+
+    componentes = [
+        (rotulo, (x, y, x + largura, y + altura), int(area), area / (largura * altura))
+        for rotulo, (x, y, largura, altura, area) in enumerate(estatisticas[1:n], 1)
+        if area >= minimo
+    ]
+    return componentes, rotulos
+
+
+def componentes_planta(mascara):
+    """
+    Plant components of a mask as (box, area), largest first, and the
+    boxes of the rectangles left out (colour chart patches).
+    """
+    componentes, retangulos = [], []
+    for _, caixa, area, preenchimento in _componentes(mascara)[0]:
+        if preenchimento >= RETANGULO:
+            retangulos.append(caixa)
+        else:
+            componentes.append((caixa, area))
+
+    componentes.sort(key=lambda c: -c[1])
+    return componentes, retangulos
+
+
+def separar_escuros(mascara, planta):
+    """
+    Splits the dark unsaturated components of a mask. Those touching the
+    plant mask are plant material (dried leaves are often dark grey or
+    brown-black, and an elliptic leaf is as compact as a label) and are
+    returned as a mask; of the others, the boxes of the compact blocks
+    (label text, scale bars).
+    """
+    componentes, rotulos = _componentes(mascara)
+    vizinhanca = cv2.dilate(planta.astype(np.uint8), np.ones((3, 3), np.uint8)).astype(bool)
+    encostados = np.unique(rotulos[vizinhanca & mascara])
+
+    folhas = np.isin(rotulos, encostados[encostados > 0])
+    blocos = [
+        caixa for rotulo, caixa, _, preenchimento in componentes
+        if preenchimento >= BLOCO_ESCURO and rotulo not in encostados
+    ]
+    return folhas, blocos
+
+
+def _unir(caixas):
+    x0, y0, x1, y1 = zip(*caixas)
+    return min(x0), min(y0), max(x1), max(y1)
+
+
+def _area(caixa):
+    return (caixa[2] - caixa[0]) * (caixa[3] - caixa[1])
+
+
+def _ajustar(mascara, caixa):
+    """The part of caixa actually covered by the mask, or None when empty."""
+    x0, y0, x1, y1 = caixa
+    ys, xs = np.nonzero(mascara[y0:y1, x0:x1])
+    if not len(xs):
+        return None
+    return x0 + xs.min(), y0 + ys.min(), x0 + xs.max() + 1, y0 + ys.max() + 1
+
+
+def caixas_recorte(mascara, componentes, max_recortes=MAX_RECORTES):
+    """
+    Crop boxes (in mask coordinates): all the plant material, then its
+    large separate pieces, then the halves of the plant along its long
+    side, up to max_recortes.
+    """
+    if not componentes:
+        return []
+
+    planta = np.zeros_like(mascara)
+    for (x0, y0, x1, y1), _ in componentes:
+        planta[y0:y1, x0:x1] |= mascara[y0:y1, x0:x1]
+
+    todas = _unir([caixa for caixa, _ in componentes])
+    total = sum(area for _, area in componentes)
+    caixas = [todas]
+
+    for caixa, area in componentes:
+        if area >= PEDACO_MINIMO * total and _area(caixa) < 0.6 * _area(todas):
+            caixas.append(caixa)
+
+    x0, y0, x1, y1 = todas
+    if y1 - y0 >= x1 - x0:
+        meio = (y0 + y1) // 2
+        metades = [(x0, y0, x1, meio), (x0, meio, x1, y1)]
+    else:
+        meio = (x0 + x1) // 2
+        metades = [(x0, y0, meio, y1), (meio, y0, x1, y1)]
+    for metade in metades:
+        ajustada = _ajustar(planta, metade)
+        if ajustada is not None:
+            caixas.append(ajustada)
+
+    return caixas[:max_recortes]
+
+
+def _escalar(caixa, fator, largura, altura):
+    """Box of the reduced sheet in full-resolution pixels, inside the image."""
+    x0, y0, x1, y1 = caixa
+    return (
+        max(0, int(x0 * fator)), max(0, int(y0 * fator)),
+        min(largura, int(np.ceil(x1 * fator))), min(altura, int(np.ceil(y1 * fator))),
+    )
+
+
+def _jpeg(rgb):
+    altura, largura = rgb.shape[:2]
+    escala = LADO_RECORTE / max(altura, largura)
+    if escala < 1:
+        rgb = cv2.resize(rgb, (round(largura * escala), round(altura * escala)), interpolation=cv2.INTER_AREA)
+
+    ok, dados = cv2.imencode(".jpg", cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, QUALIDADE_JPEG])
+    return dados.tobytes() if ok else None
+
+
+def recortar_exsicata(img, max_recortes=MAX_RECORTES):
+    """
+    Tight JPEG crops of the plant material of a sheet (a PIL image, as
+    returned by images.preparar_imagem_para_plantnet), as a list of
+    ((x0, y0, x1, y1) in image pixels, JPEG bytes). Empty when no plant
+    material is found; the caller then sends the whole sheet.
+    """
+    rgb = np.asarray(img.convert("RGB"))
+
+    with span("imagem.recorte", bytes=rgb.nbytes) as atributos:
+        cpu_inicio = time.thread_time()
+
+        altura, largura = rgb.shape[:2]
+        escala = min(1.0, LADO_ANALISE / max(altura, largura))
+        reduzida = rgb if escala == 1 else cv2.resize(
+            rgb, (round(largura * escala), round(altura * escala)), interpolation=cv2.INTER_AREA
+        )
+
+        planta, escuro = mascaras(reduzida)
+        folhas, blocos = separar_escuros(escuro, planta)
+        planta |= folhas
+        componentes, retangulos = componentes_planta(planta)
+        caixas = caixas_recorte(planta, componentes, max_recortes)
+
+        # Labels, scale bars and colour charts inside a crop are painted
+        # with the paper colour (median of the pixels that are neither)
+        excluidas = [_escalar(c, 1 / escala, largura, altura) for c in retangulos + blocos]
+        fundo = ~(planta | escuro)
+        papel = np.median(reduzida[fundo], axis=0) if fundo.any() else np.array([255, 255, 255])
+
+        recortes = []
+        for x0, y0, x1, y1 in caixas:
+            mx, my = round((x1 - x0) * MARGEM), round((y1 - y0) * MARGEM)
+            caixa = _escalar((x0 - mx, y0 - my, x1 + mx, y1 + my), 1 / escala, largura, altura)
+
+            recorte = rgb[caixa[1]:caixa[3], caixa[0]:caixa[2]].copy()
+            for ex0, ey0, ex1, ey1 in excluidas:
+                recorte[
+                    max(ey0 - caixa[1], 0):max(ey1 - caixa[1], 0),
+                    max(ex0 - caixa[0], 0):max(ex1 - caixa[0], 0),
+                ] = papel
+
+            dados = _jpeg(recorte)
+            if dados:
+                recortes.append((caixa, dados))
+
+        atributos["recortes"] = len(recortes)
+        atributos["bytes_recortes"] = sum(len(d) for _, d in recortes)
+        atributos["cpu_s"] = time.thread_time() - cpu_inicio
+
+    return recortes
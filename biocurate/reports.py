@@ -0,0 +1,201 @@
+# -----------------------------------------------
+# Report page queries
+#
+# Family / genus / species reports over the loaded dataset. Each function
+# returns the matching records and the summaries shown on the page.
+# -----------------------------------------------
+
+import pandas as pd
+
+from biocurate.tracing import span
+
+
+def _unicos(serie):
+    """Sorted distinct non-empty values of a column, as text."""
+    return sorted(map(str, serie.dropna().unique()))
+
+
+@span("relatorio.familias")
+def contar_familias(df):
+    """
+    Number of specimens per family, in ascending order.
+    """
+    return df["family"].value_counts().sort_values(ascending=True)
+
+
+@span("relatorio.familias_generos")
+def contar_familias_generos(df):
+    """
+    Number of specimens per (family, genus), specimens without a genus
+    included under NaN. Family totals are the sums over each family.
+    Datasets without a genus column count every specimen under NaN.
+    """
+    if "genus" not in df.columns:
+        df = df[["family"]].assign(genus=pd.Series(pd.NA, index=df.index, dtype="string"))
+    return df.groupby(["family", "genus"], dropna=False).size()
+
+
+@span("relatorio.familia")
+def relatorio_familia(df, familia):
+    """
+    Specimens of a family (case-insensitive), with its genera, species and
+    storage locations.
+    """
+    df_fam = df[df["family"].str.upper() == familia.upper()]
+
+    return {
+        "amostras": df_fam,
+        "generos": _unicos(df_fam["genus"]),
+        "especies": _unicos(df_fam["scientificName"]),
+        "locais": _unicos(df_fam["dynamicProperties"]),
+    }
+
+
+@span("relatorio.genero")
+def relatorio_genero(df, genero):
+    """
+    Specimens of a genus (case-insensitive), with its species, families and
+    storage locations.
+    """
+    df_gen = df[df["genus"].str.upper() == genero.upper()]
+
+    return {
+        "amostras": df_gen,
+        "especies": _unicos(df_gen["scientificName"]),
+        "familias": _unicos(df_gen["family"]),
+        "locais": _unicos(df_gen["dynamicProperties"]),
+    }
+
+
+@span("relatorio.especie")
+def relatorio_especie(df, especie):
+    """
+    Specimens of a species by scientific name (case-insensitive), with its
+    families and storage locations.
+    """
+    df_esp = df[df["scientificName"].str.upper() == especie.upper()]
+
+    return {
+        "amostras": df_esp,
+        "familias": _unicos(df_esp["family"]),
+        "locais": _unicos(df_esp["dynamicProperties"]),
+    }
+
+
+@span("relatorio.temporal")
+def contar_por_periodo(df, familia=None):
+    """
+    Specimens per collection year and per decade (ascending), optionally
+    for one family, and the number of records without a year.
+    """
+    if familia:
+        df = df[df["family"].str.upper() == familia.upper()]
+
+    anos = df["yearCollected"].dropna().astype(int)
+
+    return {
+        "anos": anos.value_counts().sort_index(),
+        "decadas": (anos // 10 * 10).value_counts().sort_index(),
+        "sem_data": int(df["yearCollected"].isna().sum()),
+    }
+
+
+def _nomes_coletores(serie):
+    """One row per collector name, splitting lists such as "A; B & C"."""
+    nomes = serie.dropna().astype(str).str.split(r"\s*[;&|]\s*|\s+et al\.?", regex=True).explode()
+    nomes = nomes.str.replace(r"\s+", " ", regex=True).str.strip()
+    return nomes[nomes != ""]
+
+
+@span("relatorio.coletores")
+def contar_coletores(df):
+    """
+    Specimens per collector, as main collector (recordedBy) and as
+    additional collector (addCollector), largest total first.
+    """
+    vazio = pd.Series(dtype=str)
+    principal = _nomes_coletores(df.get("recordedBy", vazio)).value_counts()
+    adicional = _nomes_coletores(df.get("addCollector", vazio)).value_counts()
+
+    contagem = pd.DataFrame({"principal": principal, "adicional": adicional}).fillna(0).astype(int)
+    contagem["total"] = contagem["principal"] + contagem["adicional"]
+    contagem = contagem.rename_axis("coletor").reset_index()
+    return contagem.sort_values(["total", "coletor"], ascending=[False, True], ignore_index=True)
+
+
+def partes_local(locais):
+    """
+    Cabinet and shelf of storage locations written as "Armário 12 -
+    Prateleira 3" (also "Arm. 12, Prat. 3"). Locations in another format
+    keep the whole text as the cabinet and no shelf.
+    """
+    texto = locais.astype("string").str.replace(r"\s+", " ", regex=True).str.strip()
+    armario = texto.str.extract(r"(?i)\barm(?:[aá]rio|\.)?\s*[:nº°.]*\s*([\w-]+)", expand=False)
+    prateleira = texto.str.extract(r"(?i)\bprat(?:eleira|\.)?\s*[:nº°.]*\s*([\w-]+)", expand=False)
+
+    return pd.DataFrame({
+        "local": texto,
+        "armario": armario.fillna(texto),
+        "prateleira": prateleira,
+    })
+
+
+@span("relatorio.inventario")
+def inventario_locais(df):
+    """
+    One row per storage location (dynamicProperties): cabinet, shelf,
+    number of specimens, families and species, and the sorted lists of
+    families and species stored there. Ordered by cabinet and shelf.
+    Missing taxon columns count as empty.
+    """
+    vazio = pd.Series(pd.NA, index=df.index, dtype="string")
+    partes = partes_local(df["dynamicProperties"])
+    dados = partes.assign(
+        family=df.get("family", vazio),
+        scientificName=df.get("scientificName", vazio),
+    )
+    dados = dados[dados["local"].notna()]
+
+    grupos = dados.groupby("local", sort=False)
+    inventario = pd.DataFrame({
+        "armario": grupos["armario"].first(),
+        "prateleira": grupos["prateleira"].first(),
+        "amostras": grupos.size(),
+        "n_familias": grupos["family"].nunique(),
+        "n_especies": grupos["scientificName"].nunique(),
+        "familias": grupos["family"].agg(_unicos),
+        "especies": grupos["scientificName"].agg(_unicos),
+    }).rename_axis("local").reset_index()
+
+    # Natural order: "Armário 2" before "Armário 10"
+    return inventario.sort_values(
+        ["armario", "prateleira", "local"],
+        key=lambda col: col.astype("string").str.zfill(8),
+        ignore_index=True
+    )
+
+
+@span("relatorio.locais_taxon")
+def locais_por_taxon(df):
+    """
+    Number of specimens of each family, genus and species per storage
+    location, as a Series indexed by (TAXON IN UPPER CASE, location) for
+    the reverse "where is this taxon stored" lookup. None when the
+    dataset has no taxon column.
+    """
+    local = df["dynamicProperties"].astype("string").str.replace(r"\s+", " ", regex=True).str.strip()
+    partes = []
+
+    for coluna in ("family", "genus", "scientificName"):
+        if coluna not in df.columns:
+            continue
+        taxon = df[coluna].astype("string").str.strip().str.upper()
+        partes.append(pd.DataFrame({"taxon": taxon, "local": local}).dropna())
+
+    if not partes:
+        return None
+
+    # A record is counted once per taxon: a genus-level determination
+    # (scientificName equal to the genus) appears under both columns
+    dados = pd.concat(partes).rename_axis("linha").reset_index().drop_duplicates()
+    return dados.groupby(["taxon", "local"]).size().rename("amostras")
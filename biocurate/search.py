@@ -0,0 +1,367 @@
+# -----------------------------------------------
+# Accession-number (tombo) search engine
+#
+# Shared by the Search and Image pages and the command line. Functions here never
+# touch the interface: missing columns are reported through the return
+# value and each caller decides how to show it.
+# -----------------------------------------------
+
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+from biocurate.tracing import span
+
+
+# Columns that may hold the accession number, in order of preference.
+COLUNAS_TOMBO = ["collectionCode", "barcode", "catalogNumber"]
+
+# Collection prefix of a code: HUAM anywhere (URLs), else the letters the
+# code starts with
+_PADRAO_HUAM = re.compile(r"HUAM\s*\d")
+_PADRAO_PREFIXO = re.compile(r"^([A-Z]+)[\s-]*\d")
+
+# Prefix and number of a code in one pass (see _partes_tombo)
+_PADRAO_HUAM_NUMERO = re.compile(r"HUAM\s*0*(\d+)")
+_PADRAO_CODIGO = re.compile(r"(?:([A-Z]+)[\s-]*(?=\d))?\D*?(\d+)")
+
+
+def normalizar_codigo(valor):
+    """
+    Normalizes the code entered manually or read from a QR Code.
+    Accepts codes such as HUAM001245, 1245, or URLs containing the code.
+    """
+    if valor is None:
+        return ""
+
+    texto = str(valor).strip().upper()
+
+    # If the QR Code contains a URL, tries to extract HUAM + numbers
+    match_huam = re.search(r"HUAM\s*0*\d+", texto)
+    if match_huam:
+        return match_huam.group(0).replace(" ", "")
+
+    # If it contains only numbers
+    match_num = re.search(r"\d+", texto)
+    if match_num:
+        return match_num.group(0)
+
+    return texto
+
+
+def coluna_tombo(df, coluna=None):
+    """
+    Returns the accession-number column of the dataset, or None when the
+    dataset has none of the recognized columns.
+    """
+    if coluna:
+        return coluna if coluna in df.columns else None
+
+    for c in COLUNAS_TOMBO:
+        if c in df.columns:
+            return c
+
+    return None
+
+
+@span("busca.tombo")
+def buscar_por_tombo(df, codigo_busca):
+    """
+    Searches the accession number in the database.
+    Prioritizes collectionCode, but also accepts barcode if available.
+    Returns (result, column used); column is None when the dataset has no
+    accession-number column.
+    """
+    codigo_busca = normalizar_codigo(codigo_busca)
+
+    col = coluna_tombo(df)
+    if col is None:
+        return pd.DataFrame(), None
+
+    df = df.copy()
+    df[col] = df[col].fillna("").astype(str).str.upper().str.strip()
+
+    result = df[
+        df[col].eq(codigo_busca) |
+        df[col].str.endswith(codigo_busca) |
+        df[col].str.endswith(codigo_busca.zfill(6))
+    ]
+
+    return result, col
+
+
+def chave_tombo(valor):
+    """
+    Numeric part of an accession number, used as the index key
+    (HUAM001245, 1245 and URLs containing HUAM001245 all give 1245;
+    lookups then check the collection prefix, see prefixo_tombo).
+    Returns None when the code has no digits.
+    """
+    numero = re.search(r"\d+", normalizar_codigo(valor))
+    if not numero or len(numero.group(0)) > 18:
+        return None
+    return int(numero.group(0))
+
+
+def prefixo_tombo(valor):
+    """
+    Collection prefix of an accession number ("HUAM" in HUAM001245,
+    "INPA" in "INPA 12345"), or "" for bare numbers. Codes are keyed by
+    their number (chave_tombo); the prefix keeps one collection's code
+    from matching another's.
+    """
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return ""
+
+    # Same precedence as prefixos_tombo
+    texto = str(valor).strip().upper()
+    if _PADRAO_HUAM.search(texto):
+        return "HUAM"
+    prefixo = _PADRAO_PREFIXO.match(texto)
+    return prefixo.group(1) if prefixo else ""
+
+
+def _partes_tombo(texto):
+    """
+    (prefix, key) of an upper-case code: HUAM and its number when HUAM
+    appears anywhere (URLs), else the letters the code starts with and
+    its first run of digits. The key is None without digits or beyond 18
+    of them.
+    """
+    huam = _PADRAO_HUAM_NUMERO.search(texto) if "HUAM" in texto else None
+    if huam:
+        prefixo, numero = "HUAM", huam.group(1)
+    else:
+        codigo = _PADRAO_CODIGO.match(texto)
+        if codigo is None:
+            return "", None
+        prefixo, numero = codigo.group(1) or "", codigo.group(2)
+
+    return prefixo, int(numero) if len(numero) <= 18 else None
+
+
+def partes_tombos(valores):
+    """
+    Prefixes (object array, "" when none) and keys (Int64 Series, <NA>
+    without digits) of a whole Series, as _partes_tombo gives them.
+    """
+    texto = pd.Series(valores).astype("string").str.strip().str.upper()
+    prefixos = np.full(len(texto), "", dtype=object)
+    chaves = pd.Series(pd.NA, index=texto.index, dtype="Int64")
+
+    # Fast path, with vectorized string kernels: letters followed by
+    # digits (HUAM001245, 1245), the usual content of the base and of
+    # imaging logs
+    presentes = texto.notna().to_numpy(dtype=bool)
+    texto = texto.fillna("")
+    letras = texto.str.rstrip(string.digits)
+    numero = texto.str.lstrip(string.ascii_uppercase)
+    rapido = (
+        (letras.str.len() + numero.str.len()).eq(texto.str.len())
+        & numero.str.len().between(1, 18)
+        & numero.str.isdigit()
+        # HUAM after other letters still takes precedence (_partes_tombo)
+        & (letras.eq("HUAM") | ~letras.str.contains("HUAM", regex=False))
+    ).to_numpy(dtype=bool)
+
+    if rapido.any():
+        prefixos[rapido] = letras[rapido].to_numpy(dtype=object)
+        chaves[rapido] = numero[rapido].astype("int64")
+
+    # Everything else (URLs, "INPA 12345", "MG-12"): one regex pass per
+    # distinct value
+    resto = ~rapido & presentes
+    if resto.any():
+        codigos, unicos = pd.factorize(texto[resto])
+        partes = [_partes_tombo(v) for v in unicos.tolist()]
+        prefixos[resto] = np.array([p for p, _ in partes], dtype=object)[codigos]
+        chaves[resto] = pd.array([c for _, c in partes], dtype="Int64")[codigos]
+
+    return prefixos, chaves
+
+
+def prefixos_tombo(valores):
+    """Vectorized version of prefixo_tombo for a whole Series."""
+    return pd.Series(partes_tombos(valores)[0], index=pd.Series(valores).index)
+
+
+def prefixos_compativeis(consulta, registro):
+    """
+    Whether a stored code may answer a query with the same number: the
+    prefixes are equal or one of them is missing (a bare number in the
+    query or in the imaging log).
+    """
+    consulta = np.asarray(consulta, dtype=object)
+    registro = np.asarray(registro, dtype=object)
+    return (consulta == "") | (registro == "") | (consulta == registro)
+
+
+def chaves_tombo(valores):
+    """
+    Vectorized version of chave_tombo for a whole Series.
+    Values without digits give <NA>.
+    """
+    return partes_tombos(valores)[1]
+
+
+def tabela_chaves(df, coluna=None):
+    """
+    Builds the join table for bulk lookups: the dataset with an extra
+    "_chave" column, keeping only rows that have an accession key.
+    """
+    col = coluna_tombo(df, coluna)
+    if col is None:
+        raise KeyError(
+            "The dataset has no recognized accession-number column. "
+            "Expected: " + ", ".join(COLUNAS_TOMBO) + "."
+        )
+
+    base = df.assign(_chave=chaves_tombo(df[col]))
+    base = base[base["_chave"].notna()]
+    # The prefixes are only read for the rows a query matches (juntar_tombos)
+    base.attrs["coluna_tombo"] = col
+    return base
+
+
+def juntar_tombos(codigos, base_chaves, colunas=None):
+    """
+    Resolves many codes at once with a hash join against the table built by
+    tabela_chaves. Returns one row per match (codes that match several
+    specimens repeat) and one empty row for each code not found, keeping
+    the input order.
+    """
+    codigos = pd.Series(codigos, dtype="string").reset_index(drop=True)
+    prefixos, chaves = partes_tombos(codigos)
+
+    consulta = pd.DataFrame({
+        "codigo": codigos,
+        "_chave": chaves,
+        "_ordem": range(len(codigos)),
+        "_prefixo_consulta": prefixos,
+    })
+
+    col = base_chaves.attrs.get("coluna_tombo") or coluna_tombo(base_chaves)
+    direita = base_chaves
+    if colunas:
+        direita = direita[list(dict.fromkeys(["_chave", col] + [c for c in colunas if c != "_chave"]))]
+
+    # A left merge keeps the order of the codes
+    resultado = consulta.merge(direita, on="_chave", how="left", indicator=True, sort=False)
+
+    # Same number in another collection (INPA12345 for HUAM12345): the
+    # match is dropped, and a code left without any gets its empty row back.
+    # Only matches of prefixed codes need the stored code's prefix
+    verificar = (resultado["_merge"].eq("both") & resultado["_prefixo_consulta"].ne("")).to_numpy()
+    if verificar.any():
+        conflito = np.zeros(len(resultado), dtype=bool)
+        conflito[verificar] = ~prefixos_compativeis(
+            resultado["_prefixo_consulta"].to_numpy()[verificar],
+            partes_tombos(resultado[col].to_numpy()[verificar])[0],
+        )
+        if conflito.any():
+            resultado = resultado[~conflito]
+            perdidos = consulta[~consulta["_ordem"].isin(resultado["_ordem"])]
+            resultado = pd.concat([resultado, perdidos.assign(_merge="left_only")], ignore_index=True)
+            resultado = resultado.sort_values("_ordem", kind="stable", ignore_index=True)
+
+    resultado.insert(1, "encontrado", resultado["_merge"].eq("both").to_numpy())
+    auxiliares = ["_merge", "_ordem", "_prefixo_consulta"]
+    if colunas and col not in colunas:
+        auxiliares.append(col)
+    return resultado.drop(columns=auxiliares).rename(columns={"_chave": "chave_tombo"})
+
+
+def normalizar_bloco(valores):
+    """
+    Normalizes block numbers (fieldNumber) to a text key: removes spaces,
+    converts to upper case and drops the ".0" of values parsed as floats,
+    so "321", " 321 " and 321.0 all give "321".
+    """
+    texto = pd.Series(valores).astype("string").str.strip().str.upper()
+    texto = texto.str.replace(r"^(\d+)\.0+$", r"\1", regex=True)
+    return texto.mask(texto == "")
+
+
+def chave_bloco(valor):
+    """
+    Scalar version of normalizar_bloco, for single lookups.
+    """
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+
+    texto = str(valor).strip().upper()
+    if re.fullmatch(r"\d+\.0+", texto):
+        texto = texto.split(".")[0]
+
+    return texto or None
+
+
+def separar_blocos(texto, max_intervalo=1000):
+    """
+    Block numbers typed as a list: "321", "321, 322; 400" or ranges such
+    as "400-405" (numeric ranges of up to max_intervalo blocks; other
+    hyphenated IDs such as "A-12" are kept as they are). Keeps the typed
+    order and drops repeats.
+    """
+    blocos = []
+
+    for parte in re.split(r"[,;\s]+", str(texto or "")):
+        intervalo = re.fullmatch(r"(\d+)-(\d+)", parte)
+        if intervalo and 0 <= int(intervalo.group(2)) - int(intervalo.group(1)) < max_intervalo:
+            blocos.extend(str(n) for n in range(int(intervalo.group(1)), int(intervalo.group(2)) + 1))
+        elif parte:
+            blocos.append(parte)
+
+    return list(dict.fromkeys(chave_bloco(b) for b in blocos if chave_bloco(b)))
+
+
+@span("busca.bloco")
+def buscar_por_bloco(df, numero):
+    """
+    Searches the specimens of an internal number (block, fieldNumber) with
+    a scan of the column; IndiceBase.buscar_bloco answers the same query
+    from the index. Returns an empty DataFrame when the dataset has no
+    fieldNumber column.
+    """
+    if "fieldNumber" not in df.columns:
+        return df.iloc[0:0]
+
+    return df[normalizar_bloco(df["fieldNumber"]).eq(chave_bloco(numero)).fillna(False).to_numpy()]
+
+
+@span("busca.taxon")
+def buscar_por_taxon(df, taxon):
+    """
+    Searches images by family or scientific name: exact match or partial
+    match, case-insensitive.
+    """
+    taxon_busca = taxon.strip().upper()
+
+    familia = df["family"].astype(str).str.upper()
+    nome = df["scientificName"].astype(str).str.upper()
+
+    return df[
+        (familia == taxon_busca) |
+        (nome == taxon_busca) |
+        (familia.str.contains(taxon_busca, na=False, regex=False)) |
+        (nome.str.contains(taxon_busca, na=False, regex=False))
+    ]
+
+
+@span("imagem.filtro_tombo")
+def buscar_imagens_por_tombo(planilha, codigo):
+    """
+    Rows of the Image worksheet for an accession number: barcode equal to
+    the code or ending with it (also zero-padded to six digits, so "1245"
+    finds "HUAM001245"), case-insensitive.
+    """
+    codigo_busca = str(codigo).strip().upper()
+    barcode = planilha["barcode"].astype(str).str.upper()
+
+    return planilha[
+        barcode.eq(codigo_busca) |
+        barcode.str.endswith(codigo_busca) |
+        barcode.str.endswith(codigo_busca.zfill(6))
+    ]
@@ -0,0 +1,234 @@
+# -----------------------------------------------
+# Local lookup service for barcode scanners
+#
+# Small HTTP/JSON server that keeps the accession and block indexes in
+# memory and answers one lookup per request, without Streamlit reruns.
+#
+#   GET  /tombo/HUAM001245      specimen(s) for an accession number
+#   GET  /bloco/321             specimens stored under a block number
+#   POST /lote                  {"tombos": [...], "blocos": [...]}
+#   GET  /saude                 service status
+#   GET  /metrics               Prometheus metrics (see biocurate.metrics)
+#
+# Connections are HTTP/1.1 keep-alive, so scanners may pipeline several
+# requests on the same socket. Each response carries the server-side time
+# in the Server-Timing header.
+# -----------------------------------------------
+
+import json
+import socket
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+from biocurate import metrics
+from biocurate.index import IndiceBase
+from biocurate.tracing import span
+
+
+# Fields returned for each specimen (only those present in the dataset).
+CAMPOS_REGISTRO = [
+    "collectionCode",
+    "catalogNumber",
+    "barcode",
+    "family",
+    "genus",
+    "specificEpithet",
+    "scientificName",
+    "scientificNameAuthorship",
+    "recordedBy",
+    "addCollector",
+    "recordNumber",
+    "dayCollected",
+    "monthCollected",
+    "yearCollected",
+    "eventDate",
+    "dataColeta",
+    "fieldNumber",
+    "dynamicProperties",
+]
+
+# Largest batch accepted by POST /lote.
+MAX_LOTE = 10_000
+
+
+def _valor_json(valor):
+    if valor is None or valor is pd.NA:
+        return None
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and np.isnan(valor):
+        return None
+    return valor
+
+
+def _lista_codigos(pedido, campo):
+    """
+    Codes of one field of a POST /lote body, as text. The field may be
+    missing; otherwise it must be a list of strings or numbers.
+    """
+    valores = pedido.get(campo)
+    if valores is None:
+        return []
+
+    if not isinstance(valores, list) or not all(
+        isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in valores
+    ):
+        raise ValueError(f'"{campo}" must be a list of strings or numbers.')
+
+    return [str(v) for v in valores]
+
+
+class ServicoLookup:
+    """
+    Lookup logic of the service, independent of HTTP. Indexes and column
+    arrays are prepared in the constructor so requests only do dict
+    lookups.
+    """
+
+    def __init__(self, df, campos=None):
+        self.indice = IndiceBase(df)
+        self.total = len(df)
+
+        # Build both indexes up front instead of on the first scan
+        self.indice.tombo
+        self.indice.bloco
+
+        campos = campos or CAMPOS_REGISTRO
+        self.campos = [c for c in campos if c in df.columns]
+        self._colunas = [df[c].to_numpy(dtype=object) for c in self.campos]
+
+    def registro(self, posicao):
+        return {
+            campo: _valor_json(coluna[posicao])
+            for campo, coluna in zip(self.campos, self._colunas)
+        }
+
+    def _resposta(self, consulta, posicoes):
+        return {
+            "consulta": consulta,
+            "encontrados": len(posicoes),
+            "registros": [self.registro(p) for p in posicoes],
+        }
+
+    @span("servico.tombo")
+    def tombo(self, codigo):
+        return self._resposta(codigo, self.indice.posicoes_tombo(codigo))
+
+    @span("servico.bloco")
+    def bloco(self, numero):
+        return self._resposta(numero, self.indice.posicoes_bloco(numero))
+
+    @span("servico.lote")
+    def lote(self, pedido):
+        if not isinstance(pedido, dict):
+            raise ValueError("The batch must be a JSON object.")
+
+        tombos = _lista_codigos(pedido, "tombos")
+        blocos = _lista_codigos(pedido, "blocos")
+
+        if len(tombos) + len(blocos) > MAX_LOTE:
+            raise ValueError(f"Batch too large (maximum {MAX_LOTE} codes).")
+
+        # All accession numbers in one pass (IndiceBase.posicoes_tombos)
+        posicoes = self.indice.posicoes_tombos(tombos)
+
+        return {
+            "tombos": [self._resposta(c, p) for c, p in zip(tombos, posicoes)],
+            "blocos": [self.bloco(b) for b in blocos],
+        }
+
+    def saude(self):
+        return {
+            "status": "ok",
+            "registros": self.total,
+            "tombos_indexados": len(self.indice.tombo),
+            "blocos_indexados": len(self.indice.bloco),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    servico = None
+
+    def setup(self):
+        super().setup()
+        # Small responses: send them immediately instead of waiting for ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, formato, *args):
+        pass
+
+    def _enviar(self, status, corpo, inicio):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.send_header("Server-Timing", f"lookup;dur={duracao_ms:.3f}")
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _enviar_texto(self, texto):
+        dados = texto.encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        partes = self.path.split("?", 1)[0].strip("/").split("/", 1)
+        rota = partes[0]
+        argumento = unquote(partes[1]) if len(partes) > 1 else ""
+
+        if rota == "tombo" and argumento:
+            resposta = self.servico.tombo(argumento)
+        elif rota == "bloco" and argumento:
+            resposta = self.servico.bloco(argumento)
+        elif rota == "saude":
+            self._enviar(200, self.servico.saude(), inicio)
+            return
+        elif rota == "metrics":
+            self._enviar_texto(metrics.texto_prometheus())
+            return
+        else:
+            self._enviar(404, {"erro": "Unknown route."}, inicio)
+            return
+
+        self._enviar(200 if resposta["encontrados"] else 404, resposta, inicio)
+
+    def do_POST(self):
+        inicio = time.perf_counter()
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b""
+
+        if self.path.split("?", 1)[0].strip("/") != "lote":
+            self._enviar(404, {"erro": "Unknown route."}, inicio)
+            return
+
+        try:
+            pedido = json.loads(corpo or b"{}")
+            resposta = self.servico.lote(pedido)
+        except (ValueError, AttributeError, TypeError) as e:
+            self._enviar(400, {"erro": str(e)}, inicio)
+            return
+
+        self._enviar(200, resposta, inicio)
+
+
+def criar_servidor(servico, host="127.0.0.1", porta=8502):
+    """
+    Creates the HTTP server for a ServicoLookup. Call serve_forever() on the
+    result to start answering requests.
+    """
+    handler = type("Handler", (_Handler,), {"servico": servico})
+    servidor = ThreadingHTTPServer((host, porta), handler)
+    servidor.daemon_threads = True
+    return servidor
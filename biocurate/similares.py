@@ -0,0 +1,336 @@
+# -----------------------------------------------
+# Visual similarity search over the image collection
+#
+# Each scan of the Image worksheet is described by a small vector of
+# CPU-cheap features of its plant material (the mask of biocurate.recorte,
+# so the paper, label and colour chart do not count):
+#
+#   cor     - HSV colour histogram (12 hues x 4 saturations x 3 values)
+#   bordas  - histogram of gradient orientations, weighted by magnitude
+#   textura - uniform local binary patterns (58 patterns + the rest)
+#
+# Each histogram is normalized and square-rooted (Hellinger), weighted and
+# the whole vector scaled to unit length, so the dot product of two
+# vectors is their cosine similarity.
+#
+# The vectors go into an inverted-file index (IndiceVetorial): k-means
+# centroids split the collection into lists and a search scores only the
+# lists of the closest centroids. The descriptors are computed by the same
+# background job that hashes the collection (biocurate.hash_imagem); with
+# BIOCURATE_DESCRITORES set, they are kept in that .npz file across
+# restarts.
+# -----------------------------------------------
+
+import os
+import threading
+from io import BytesIO
+
+import cv2
+import numpy as np
+import pandas as pd
+from PIL import Image, ImageOps
+
+from biocurate.images import ErroImagem, file_ids
+from biocurate.recorte import mascaras
+from biocurate.tracing import span
+
+
+LADO_DESCRITOR = 384
+
+BINS_COR = (12, 4, 3)
+BINS_BORDAS = 12
+
+# Weight of each block of the descriptor
+PESOS = {"cor": 1.0, "bordas": 0.6, "textura": 0.8}
+
+# Plant pixels below this fraction of the sheet: the whole sheet is described
+PLANTA_MINIMA = 0.01
+
+# Specimens returned by a search
+K_PARECIDAS = 8
+
+# Below this size the search is exact; above it, the inverted file is used
+MIN_LISTAS = 5000
+# Closest lists scored by a search
+SONDAS = 8
+ITERACOES_KMEANS = 8
+
+ARQUIVO_DESCRITORES = os.environ.get("BIOCURATE_DESCRITORES")
+
+_trava = threading.Lock()
+_indice = None
+
+
+def _lbp_uniforme():
+    """Bin of each 8-bit LBP code: one per uniform pattern (<= 2 transitions), one for the rest."""
+    tabela = np.full(256, 58, dtype=np.uint8)
+    proximo = 0
+    for codigo in range(256):
+        rotacionado = ((codigo << 1) | (codigo >> 7)) & 0xFF
+        if bin(codigo ^ rotacionado).count("1") <= 2:
+            tabela[codigo] = proximo
+            proximo += 1
+    return tabela
+
+
+_BINS_LBP = _lbp_uniforme()
+
+DIMENSAO = int(np.prod(BINS_COR)) + BINS_BORDAS + 59
+
+
+def _reduzir(imagem):
+    """RGB array of a PIL image or encoded image, at most LADO_DESCRITOR on a side."""
+    if isinstance(imagem, Image.Image):
+        img = imagem.convert("RGB")
+    else:
+        try:
+            img = Image.open(BytesIO(imagem))
+            img.draft("RGB", (LADO_DESCRITOR, LADO_DESCRITOR))
+            img = ImageOps.exif_transpose(img).convert("RGB")
+        except Exception:
+            raise ErroImagem("imagem_invalida")
+
+    img = img.copy()
+    img.thumbnail((LADO_DESCRITOR, LADO_DESCRITOR))
+    return np.asarray(img)
+
+
+def _bloco(histograma, peso):
+    histograma = histograma.astype(np.float32).ravel()
+    total = histograma.sum()
+    return peso * np.sqrt(histograma / total) if total > 0 else histograma
+
+
+def _lbp(cinza):
+    """8-neighbour local binary pattern code of each inner pixel."""
+    centro = cinza[1:-1, 1:-1]
+    altura, largura = centro.shape
+    codigos = np.zeros(centro.shape, dtype=np.uint8)
+    vizinhos = [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0), (1, 0)]
+    for bit, (dy, dx) in enumerate(vizinhos):
+        codigos |= (cinza[dy:dy + altura, dx:dx + largura] >= centro).astype(np.uint8) << bit
+    return codigos
+
+
+def descritor(imagem):
+    """
+    Unit-length float32 descriptor of a sheet (PIL image or encoded
+    image bytes); the dot product of two descriptors is their similarity.
+    """
+    rgb = _reduzir(imagem)
+    planta, _ = mascaras(rgb)
+    if planta.mean() < PLANTA_MINIMA:
+        planta = np.ones(planta.shape, dtype=bool)
+    mascara = planta.astype(np.uint8)
+
+    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
+    cor = cv2.calcHist([hsv], [0, 1, 2], mascara, list(BINS_COR), [0, 180, 0, 256, 0, 256])
+
+    cinza = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+    gx = cv2.Sobel(cinza, cv2.CV_32F, 1, 0)
+    gy = cv2.Sobel(cinza, cv2.CV_32F, 0, 1)
+    magnitude, angulo = cv2.cartToPolar(gx, gy, angleInDegrees=True)
+    bordas, _ = np.histogram(
+        angulo[planta] % 180, bins=BINS_BORDAS, range=(0, 180), weights=magnitude[planta]
+    )
+
+    textura = np.bincount(_BINS_LBP[_lbp(cinza)[planta[1:-1, 1:-1]]], minlength=59)
+
+    vetor = np.concatenate([
+        _bloco(cor, PESOS["cor"]),
+        _bloco(bordas, PESOS["bordas"]),
+        _bloco(textura, PESOS["textura"]),
+    ])
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma > 0 else vetor
+
+
+def _kmeans(vetores, k, iteracoes=ITERACOES_KMEANS, semente=0):
+    """Spherical k-means: unit-length centroids, assignment by largest dot product."""
+    rng = np.random.default_rng(semente)
+    centroides = vetores[rng.choice(len(vetores), k, replace=False)]
+
+    for _ in range(iteracoes):
+        listas = np.argmax(vetores @ centroides.T, axis=1)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, listas, vetores)
+        normas = np.linalg.norm(somas, axis=1, keepdims=True)
+        # Empty lists keep their previous centroid
+        centroides = np.where(normas > 0, somas / np.maximum(normas, 1e-12), centroides)
+
+    return centroides
+
+
+class IndiceVetorial:
+    """
+    Approximate nearest neighbours of unit vectors by dot product, with
+    an inverted file: the vectors are split among about sqrt(n) k-means
+    centroids (new vectors go to the list of their closest centroid) and
+    a search scores only the lists of the SONDAS centroids closest to the
+    query. The centroids are retrained when the collection has doubled.
+    Searches are exact below MIN_LISTAS vectors.
+    """
+
+    def __init__(self, dimensao=DIMENSAO):
+        self._vetores = np.empty((1024, dimensao), dtype=np.float32)
+        self.n = 0
+        self._centroides = None
+        self._listas = None
+        self._treinados = 0
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return self.n
+
+    def adicionar(self, vetor):
+        """Adds a vector; returns its position."""
+        with self._trava:
+            if self.n == len(self._vetores):
+                self._vetores = np.concatenate([self._vetores, np.empty_like(self._vetores)])
+            posicao = self.n
+            self._vetores[posicao] = vetor
+            self.n += 1
+            if self._centroides is not None:
+                self._listas[int(np.argmax(self._centroides @ vetor))].append(posicao)
+
+        if self.n >= MIN_LISTAS and self.n >= 2 * self._treinados:
+            self.treinar()
+        return posicao
+
+    @span("imagem.similares_treinar")
+    def treinar(self):
+        """Rebuilds the centroids and lists from the vectors added so far."""
+        with self._trava:
+            n = self.n
+            vetores = self._vetores[:n].copy()
+
+        k = max(1, int(np.sqrt(n)))
+        centroides = _kmeans(vetores, k)
+        listas = [[] for _ in range(k)]
+        for posicao, lista in enumerate(np.argmax(vetores @ centroides.T, axis=1)):
+            listas[lista].append(posicao)
+
+        with self._trava:
+            # Vectors added while training go to their closest new centroid
+            for posicao in range(n, self.n):
+                listas[int(np.argmax(centroides @ self._vetores[posicao]))].append(posicao)
+            self._centroides, self._listas, self._treinados = centroides, listas, n
+
+    def vetor(self, posicao):
+        return self._vetores[posicao]
+
+    def buscar(self, vetor, k=K_PARECIDAS, excluir=()):
+        """(similarity, position) of the k most similar vectors, most similar first."""
+        with self._trava:
+            vetores = self._vetores
+            if self._centroides is None:
+                candidatos = np.arange(self.n)
+            else:
+                proximas = np.argsort(-(self._centroides @ vetor))[:SONDAS]
+                candidatos = np.fromiter(
+                    (p for lista in proximas for p in self._listas[lista]), dtype=np.intp
+                )
+
+        if len(excluir):
+            candidatos = candidatos[~np.isin(candidatos, list(excluir))]
+        if not len(candidatos):
+            return []
+
+        similaridades = vetores[candidatos] @ vetor
+        melhores = np.argsort(-similaridades)[:k]
+        return [(float(similaridades[i]), int(candidatos[i])) for i in melhores]
+
+
+class IndiceVisual:
+    """
+    Visual descriptors of the collection by Drive file id, searchable by
+    similarity through an IndiceVetorial.
+    """
+
+    def __init__(self, arquivo=None):
+        self.arquivo = arquivo
+        self.file_ids = []
+        self._posicoes = {}
+        self._vetorial = IndiceVetorial()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self.file_ids)
+
+    def __contains__(self, file_id):
+        return file_id in self._posicoes
+
+    def adicionar(self, file_id, vetor):
+        with self._trava:
+            if file_id in self._posicoes:
+                return
+            self._posicoes[file_id] = len(self.file_ids)
+            self.file_ids.append(file_id)
+            self._vetorial.adicionar(vetor)
+
+    def registrar(self, file_id, imagem):
+        """Describes an image already at hand (PIL image or encoded bytes) if file_id is new."""
+        if file_id and file_id not in self._posicoes:
+            self.adicionar(file_id, descritor(imagem))
+
+    def vetor(self, file_id):
+        posicao = self._posicoes.get(file_id)
+        return None if posicao is None else self._vetorial.vetor(posicao)
+
+    @span("imagem.parecidas")
+    def parecidas(self, planilha, file_id, k=K_PARECIDAS, excluir=()):
+        """
+        The k indexed scans most similar to file_id (which must be indexed),
+        leaving out file_id itself and the file ids in `excluir` (e.g. its
+        repeated scans), joined with their worksheet rows: similarity,
+        file_id, barcode, family, scientificName and UrlExsicata.
+        """
+        colunas = [c for c in ("barcode", "family", "scientificName", "ArchiveName", "UrlExsicata")
+                   if c in planilha.columns]
+        vazio = pd.DataFrame(columns=["similaridade", "file_id"] + colunas)
+
+        vetor = self.vetor(file_id)
+        if vetor is None:
+            return vazio
+
+        fora = [self._posicoes[f] for f in (file_id, *excluir) if f in self._posicoes]
+        encontrados = self._vetorial.buscar(vetor, k, fora)
+        if not encontrados:
+            return vazio
+
+        resultado = pd.DataFrame({
+            "similaridade": [round(s, 3) for s, _ in encontrados],
+            "file_id": [self.file_ids[p] for _, p in encontrados],
+        })
+        if "UrlExsicata" not in planilha.columns:
+            return resultado
+
+        dados = planilha[colunas].assign(file_id=file_ids(planilha))
+        dados = dados.dropna(subset=["file_id"]).drop_duplicates("file_id")
+        return resultado.merge(dados, on="file_id", how="left")
+
+    def salvar(self, caminho=None):
+        caminho = caminho or self.arquivo
+        with self._trava:
+            ids = np.array(self.file_ids, dtype=str)
+            vetores = np.array([self._vetorial.vetor(p) for p in range(len(self.file_ids))], dtype=np.float16)
+        temporario = f"{caminho}.tmp.npz"
+        np.savez_compressed(temporario, file_ids=ids, vetores=vetores)
+        os.replace(temporario, caminho)
+
+    def carregar(self, caminho):
+        with np.load(caminho) as dados:
+            for file_id, vetor in zip(dados["file_ids"], dados["vetores"].astype(np.float32)):
+                self.adicionar(str(file_id), vetor)
+
+
+def indice_visual():
+    """The process-wide IndiceVisual, loaded from ARQUIVO_DESCRITORES when present."""
+    global _indice
+    with _trava:
+        if _indice is None:
+            _indice = IndiceVisual(ARQUIVO_DESCRITORES)
+            if ARQUIVO_DESCRITORES and os.path.exists(ARQUIVO_DESCRITORES):
+                with span("imagem.descritores_carregar"):
+                    _indice.carregar(ARQUIVO_DESCRITORES)
+        return _indice
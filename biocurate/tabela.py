@@ -0,0 +1,70 @@
+# -----------------------------------------------
+# Server-side result tables
+#
+# Result sets are kept as row positions into the loaded dataset; the
+# page on screen is cut from the dataset only when it is drawn, with the
+# chosen columns only. Filtering uses the full-text index and sorting the
+# per-column ranks of IndiceBase, so neither compares strings on a rerun.
+# The Streamlit widgets live in biocurate.ui (tabela_paginada).
+# -----------------------------------------------
+
+import numpy as np
+
+from biocurate.tracing import span
+
+
+TAMANHO_PAGINA = 50
+TAMANHOS_PAGINA = [25, 50, 100, 200]
+
+# Columns shown by default, when present; the others can be added
+COLUNAS_PADRAO = [
+    "collectionCode", "barcode", "catalogNumber",
+    "family", "scientificName", "scientificNameAuthorship",
+    "recordedBy", "recordNumber", "dataColeta",
+    "fieldNumber", "dynamicProperties",
+]
+
+
+def colunas_padrao(resultado):
+    """Default projection of a result set (every column when none is known)."""
+    colunas = [c for c in COLUNAS_PADRAO if c in resultado.columns]
+    return colunas or list(resultado.columns)
+
+
+def posicoes_de(df, resultado):
+    """
+    Row positions in df of the records of a result set taken from it
+    (matched by index label). Rows not found are left out.
+    """
+    posicoes = df.index.get_indexer_for(resultado.index)
+    return posicoes[posicoes >= 0]
+
+
+@span("busca.tabela")
+def consultar(indice, posicoes, filtro=None, ordenar_por=None, crescente=True):
+    """
+    The positions of a result set matching `filtro` (free-text query, see
+    biocurate.fulltext), sorted by a column of the dataset. The original
+    order is kept without ordenar_por and among equal values. Raises
+    ValueError for unknown fields in the filter.
+    """
+    posicoes = np.asarray(posicoes, dtype=np.intp)
+
+    if filtro and filtro.strip():
+        _, todos = indice.texto.pontuacoes(filtro)
+        posicoes = posicoes[todos[posicoes]]
+
+    if ordenar_por:
+        # Missing values (rank -1) go last in both directions
+        posto = indice.posto(ordenar_por)[posicoes]
+        maior = posto.max(initial=0) + 1
+        chave = np.where(posto < 0, maior, posto if crescente else maior - 1 - posto)
+        posicoes = posicoes[np.argsort(chave, kind="stable")]
+
+    return posicoes
+
+
+def pagina(df, posicoes, colunas, numero, tamanho=TAMANHO_PAGINA):
+    """Page `numero` (from 1) of the rows `posicoes` of df, with the given columns only."""
+    inicio = (numero - 1) * tamanho
+    return df.iloc[posicoes[inicio:inicio + tamanho]][colunas]
@@ -0,0 +1,86 @@
+# -----------------------------------------------
+# Text normalization for the inverted indexes
+#
+# Accent folding and tokenization shared by the collector index and the
+# full-text search (biocurate.fulltext), so that "Cabral, M.", "CABRAL" and "cabrál" all give
+# the token "cabral".
+# -----------------------------------------------
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+
+# Tokens are runs of letters and digits; single characters (initials)
+# are dropped.
+PADRAO_TOKEN = r"[a-z0-9]{2,}"
+
+
+def dobrar(texto):
+    """Lower case without accents, for a single string."""
+    if not isinstance(texto, str):
+        return ""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def dobrar_serie(serie):
+    """Vectorized dobrar; missing values become ""."""
+    return (
+        pd.Series(serie)
+        .astype("string")
+        .fillna("")
+        .str.normalize("NFKD")
+        .str.encode("ascii", errors="ignore")
+        .str.decode("ascii")
+        .str.lower()
+    )
+
+
+def tokens(texto):
+    """Tokens of a single string (query side)."""
+    return re.findall(PADRAO_TOKEN, dobrar(texto))
+
+
+def tokens_serie(serie):
+    """
+    Tokens of every row as a Series indexed by row position (0..n-1), one
+    token per entry, duplicates within a row removed (index side).
+    """
+    lista = dobrar_serie(serie).reset_index(drop=True).str.findall(PADRAO_TOKEN)
+    explodido = lista.explode().dropna()
+    pares = pd.DataFrame({"posicao": explodido.index, "token": explodido.to_numpy()})
+    pares = pares.drop_duplicates()
+    return pd.Series(pares["token"].to_numpy(), index=pares["posicao"].to_numpy())
+
+
+def contagem_tokens(serie):
+    """
+    Term frequencies for the full-text index: DataFrame with token,
+    posicao (row position) and tf, sorted by token and position, plus the
+    number of tokens of each row. Distinct values are tokenized once, so
+    repetitive columns (family, collector, location) are cheap.
+    """
+    codigos, valores = pd.factorize(pd.Series(serie).reset_index(drop=True))
+
+    lista = dobrar_serie(valores).str.findall(PADRAO_TOKEN)
+    comprimentos_valores = lista.str.len().fillna(0).to_numpy(dtype=np.int32)
+    # Missing values (code -1) have no tokens; indexed apart, as a column
+    # with no values at all has no lengths to index
+    comprimentos = np.zeros(len(codigos), dtype=np.int32)
+    presentes = codigos >= 0
+    comprimentos[presentes] = comprimentos_valores[codigos[presentes]]
+
+    explodido = lista.explode().dropna()
+    por_valor = (
+        pd.DataFrame({"codigo": explodido.index.to_numpy(), "token": explodido.to_numpy()})
+        .groupby(["codigo", "token"], sort=False).size().rename("tf").reset_index()
+    )
+
+    # Rows of each distinct value, in position order
+    linhas = pd.DataFrame({"codigo": codigos, "posicao": np.arange(len(codigos))})
+    contagem = por_valor.merge(linhas[linhas["codigo"] >= 0], on="codigo")
+    contagem = contagem.sort_values(["token", "posicao"], ignore_index=True)
+    return contagem[["token", "posicao", "tf"]], comprimentos
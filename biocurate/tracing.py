@@ -0,0 +1,219 @@
+# -----------------------------------------------
+# Lightweight timing spans
+#
+# span("imagem.download") measures one stage; spans are kept in a small
+# ring buffer and aggregated per stage, per session and per process.
+# A "rerun" groups the spans of one Streamlit run, so the slowest reruns
+# can be listed with their stages. Overhead is two perf_counter calls and
+# one lock per span.
+# -----------------------------------------------
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+
+MAX_SPANS = 1000
+MAX_RERUNS = 200
+MAX_SESSOES = 200
+
+_trava = threading.Lock()
+_local = threading.local()
+
+_spans = deque(maxlen=MAX_SPANS)
+_reruns = deque(maxlen=MAX_RERUNS)
+_processo = {}               # stage -> [count, total s, max s]
+_sessoes = OrderedDict()     # session -> {stage -> [count, total s, max s]}
+_caches = {}                 # cache name -> [hits, misses]
+_observadores = []           # functions called with each finished span
+
+
+def _acumular(sessao, etapa, duracao):
+    destinos = [_processo]
+
+    if sessao is not None:
+        if sessao not in _sessoes:
+            _sessoes[sessao] = {}
+            # Keep only the most recently active sessions
+            while len(_sessoes) > MAX_SESSOES:
+                _sessoes.popitem(last=False)
+        _sessoes.move_to_end(sessao)
+        destinos.append(_sessoes[sessao])
+
+    for agregado in destinos:
+        atual = agregado.get(etapa)
+        if atual is None:
+            agregado[etapa] = [1, duracao, duracao]
+        else:
+            atual[0] += 1
+            atual[1] += duracao
+            atual[2] = max(atual[2], duracao)
+
+
+def sessao_atual():
+    return getattr(_local, "sessao", None)
+
+
+def iniciar_rerun(sessao, pagina=None):
+    """
+    Marks the start of a Streamlit run in the current thread. Spans
+    recorded until finalizar_rerun() are attributed to this session and
+    grouped under this run.
+    """
+    _local.sessao = sessao
+    _local.rerun = {
+        "sessao": sessao,
+        "pagina": pagina,
+        "inicio": time.time(),
+        "_t0": time.perf_counter(),
+        "etapas": [],
+    }
+
+
+def definir_pagina(pagina):
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["pagina"] = pagina
+
+
+def pagina_atual():
+    rerun = getattr(_local, "rerun", None)
+    return rerun["pagina"] if rerun is not None else None
+
+
+def finalizar_rerun():
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+
+    _local.rerun = None
+    rerun["duracao_ms"] = (time.perf_counter() - rerun.pop("_t0")) * 1000
+
+    with _trava:
+        _reruns.append(rerun)
+        _acumular(rerun["sessao"], "rerun", rerun["duracao_ms"] / 1000)
+
+
+@contextmanager
+def span(nome, **atributos):
+    """
+    Measures the block as stage `nome`. Extra keyword arguments are kept
+    with the span (e.g. file_id, bytes); the yielded dict accepts more
+    while the block runs. Failures are recorded by their `tipo` (ErroImagem)
+    or exception name. Also usable as a function decorator.
+    """
+    inicio = time.perf_counter()
+    erro = None
+
+    try:
+        yield atributos
+    except BaseException as e:
+        erro = getattr(e, "tipo", None) or type(e).__name__
+        raise
+    finally:
+        duracao = time.perf_counter() - inicio
+        sessao = sessao_atual()
+        registro = {
+            "etapa": nome,
+            "inicio": time.time() - duracao,
+            "duracao_ms": duracao * 1000,
+            "sessao": sessao,
+            "erro": erro,
+            **atributos,
+        }
+
+        rerun = getattr(_local, "rerun", None)
+        if rerun is not None:
+            rerun["etapas"].append((nome, duracao * 1000))
+
+        with _trava:
+            _spans.append(registro)
+            _acumular(sessao, nome, duracao)
+
+        for observador in _observadores:
+            observador(registro)
+
+
+def observar(funcao):
+    """
+    Calls funcao(registro) for every finished span, with the same dict
+    kept in the recent spans (used by biocurate.metrics).
+    """
+    if funcao not in _observadores:
+        _observadores.append(funcao)
+
+
+def registrar_cache(nome, acerto):
+    """Counts a hit (acerto=True) or a miss of cache `nome`."""
+    with _trava:
+        contagem = _caches.setdefault(nome, [0, 0])
+        contagem[0 if acerto else 1] += 1
+
+
+# -------------------------------------------------
+# Queries used by the diagnostics panel
+# -------------------------------------------------
+def spans_recentes(limite=100, sessao=None):
+    with _trava:
+        spans = list(_spans)
+
+    if sessao is not None:
+        spans = [s for s in spans if s["sessao"] == sessao]
+
+    return spans[-limite:][::-1]
+
+
+def reruns_mais_lentos(limite=10, sessao=None):
+    with _trava:
+        reruns = list(_reruns)
+
+    if sessao is not None:
+        reruns = [r for r in reruns if r["sessao"] == sessao]
+
+    return sorted(reruns, key=lambda r: r["duracao_ms"], reverse=True)[:limite]
+
+
+def resumo_etapas(sessao=None):
+    """
+    Count, total, mean and max time per stage, for one session or for the
+    whole process (sessao=None).
+    """
+    with _trava:
+        agregado = _processo if sessao is None else _sessoes.get(sessao, {})
+        itens = [(etapa, v[:]) for etapa, v in agregado.items()]
+
+    return [
+        {
+            "etapa": etapa,
+            "chamadas": n,
+            "total_ms": total * 1000,
+            "media_ms": total / n * 1000,
+            "max_ms": maximo * 1000,
+        }
+        for etapa, (n, total, maximo) in sorted(itens, key=lambda i: -i[1][1])
+    ]
+
+
+def taxas_cache():
+    with _trava:
+        itens = {nome: v[:] for nome, v in _caches.items()}
+
+    return [
+        {
+            "cache": nome,
+            "acertos": acertos,
+            "falhas": falhas,
+            "taxa_acerto": acertos / (acertos + falhas) if acertos + falhas else 0.0,
+        }
+        for nome, (acertos, falhas) in sorted(itens.items())
+    ]
+
+
+def limpar():
+    with _trava:
+        _spans.clear()
+        _reruns.clear()
+        _processo.clear()
+        _sessoes.clear()
+        _caches.clear()
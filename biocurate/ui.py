@@ -0,0 +1,565 @@
+# -----------------------------------------------
+# Streamlit helpers shared by app.py and en_app.py
+#
+# The only module of the package that imports Streamlit. Functions take
+# the interface language (idioma="pt" / "en") instead of being duplicated
+# in each app module.
+# -----------------------------------------------
+
+import hmac
+import math
+import time
+
+import pandas as pd
+import streamlit as st
+
+from biocurate import memoria, profiler, tracing
+from biocurate.exportacao import FORMATOS, exportar_cacheado, formatos_disponiveis
+from biocurate.hash_imagem import indexar_em_segundo_plano, indice_hashes, tarefa_atual
+from biocurate.images import file_ids, links_quebrados, resolver_links
+from biocurate.index import IndiceBase, indice_base, indices_ativos, versao_base
+from biocurate.prefetch import PREFETCH_IDENTIFICACAO, antecipar
+from biocurate.search import buscar_imagens_por_tombo
+from biocurate.similares import indice_visual
+from biocurate.tabela import TAMANHO_PAGINA, TAMANHOS_PAGINA, colunas_padrao, consultar, pagina, posicoes_de
+
+
+TEXTOS = {
+    "pt": {
+        "titulo": "🛠️ Diagnóstico de desempenho",
+        "escopo": "Escopo",
+        "sessao": "Esta sessão",
+        "processo": "Todo o processo",
+        "etapas": "Tempo por etapa",
+        "reruns": "Execuções mais lentas",
+        "spans": "Etapas recentes",
+        "caches": "Caches",
+        "vazio": "Nada registrado ainda.",
+        "limpar": "Limpar medições",
+        "perfil": "Perfil de execução (amostragem)",
+        "perfil_ajuda": "Perfila as próximas execuções desta sessão; abra o arquivo em speedscope.app.",
+        "perfil_n": "Execuções a perfilar",
+        "perfil_armar": "Perfilar próximas execuções",
+        "perfil_armado": "Próximas {n} execução(ões) serão perfiladas.",
+        "perfil_baixar": "Baixar {nome} ({ms:.0f} ms, {amostras} amostras)",
+        "memoria": "Memória",
+        "rss": "Memória residente",
+        "pico": "Pico",
+        "limite": "Alerta acima de (MB, 0 desativa)",
+        "alerta": "⚠️ Memória residente ({rss:.0f} MB) acima do limite de {limite:.0f} MB.",
+        "colunas": "Colunas da base desta sessão",
+        "esvaziar": "Esvaziar caches",
+        "esvaziado": "{mb:.1f} MB liberados dos caches.",
+        "exportar": "⬇️ Baixar {formato}",
+        "exportar_formato": "Formato",
+        "exportar_preparar": "Preparar arquivo",
+        "exportar_gerando": "Gerando arquivo...",
+        "exportar_xlsx": "XLSX disponível para até {n} registros; use CSV ou Parquet para este resultado.",
+        "tabela_filtro": "Filtrar",
+        "tabela_filtro_ajuda": "Mesma sintaxe da busca livre, ex.: Lauraceae ou locality:Ducke",
+        "tabela_filtro_invalido": "Filtro inválido: {erro}",
+        "tabela_ordenar": "Ordenar por",
+        "tabela_sem_ordem": "(ordem original)",
+        "tabela_decrescente": "Decrescente",
+        "tabela_colunas": "Colunas",
+        "tabela_linhas": "Linhas por página",
+        "tabela_pagina": "Página",
+        "tabela_info": "Linhas {inicio}–{fim} de {total}",
+        "tabela_vazia": "Nenhuma linha corresponde ao filtro.",
+        "repetidas_progresso": "{n} de {total} imagens da planilha já indexadas ({descritas} com descritores visuais).",
+        "repetidas_tarefa": "Indexando imagens: {feitos} de {total} ({erros} com erro)",
+        "repetidas_atualizar": "🔄 Atualizar progresso",
+        "repetidas_parar": "⏹️ Parar indexação",
+        "repetidas_indexar": "🧬 Indexar imagens da planilha",
+        "repetidas_ajuda": (
+            "Baixa cada imagem em segundo plano e calcula seu hash perceptual e seus descritores visuais; "
+            "a página continua utilizável."
+        ),
+        "repetidas_erros": "{erros} imagem(ns) não puderam ser baixadas ou abertas na última indexação.",
+        "repetidas_nenhuma": "Nenhuma possível digitalização repetida entre as imagens indexadas.",
+        "repetidas_resumo": "{exsicatas} imagens em {grupos} grupo(s) de possíveis digitalizações repetidas:",
+        "links_quebrados": "{n} de {total} imagens da planilha têm UrlExsicata vazio ou sem ID do Drive e não serão exibidas.",
+        "links_detalhes": "Ver links com problema",
+        "antecipando": "📷 Preparando {n} imagem(ns) desta amostra para a aba Imagem.",
+        "parecidas_titulo": "🔎 Exsicatas parecidas no HUAM",
+        "parecidas_info": "Mais parecidas entre {n} imagens indexadas (cor, contorno e textura da planta).",
+        "parecidas_vazio": "Nenhuma outra imagem indexada ainda; use 🧬 Indexar imagens da planilha no fim da página.",
+    },
+    "en": {
+        "titulo": "🛠️ Performance diagnostics",
+        "escopo": "Scope",
+        "sessao": "This session",
+        "processo": "Whole process",
+        "etapas": "Time per stage",
+        "reruns": "Slowest runs",
+        "spans": "Recent stages",
+        "caches": "Caches",
+        "vazio": "Nothing recorded yet.",
+        "limpar": "Clear measurements",
+        "perfil": "Run profile (sampling)",
+        "perfil_ajuda": "Profiles the next runs of this session; open the file at speedscope.app.",
+        "perfil_n": "Runs to profile",
+        "perfil_armar": "Profile next runs",
+        "perfil_armado": "The next {n} run(s) will be profiled.",
+        "perfil_baixar": "Download {nome} ({ms:.0f} ms, {amostras} samples)",
+        "memoria": "Memory",
+        "rss": "Resident memory",
+        "pico": "Peak",
+        "limite": "Alert above (MB, 0 disables)",
+        "alerta": "⚠️ Resident memory ({rss:.0f} MB) above the {limite:.0f} MB limit.",
+        "colunas": "Columns of this session's dataset",
+        "esvaziar": "Empty caches",
+        "esvaziado": "{mb:.1f} MB released from the caches.",
+        "exportar": "⬇️ Download {formato}",
+        "exportar_formato": "Format",
+        "exportar_preparar": "Prepare file",
+        "exportar_gerando": "Generating file...",
+        "exportar_xlsx": "XLSX is available for up to {n} records; use CSV or Parquet for this result.",
+        "tabela_filtro": "Filter",
+        "tabela_filtro_ajuda": "Same syntax as the free-text search, e.g. Lauraceae or locality:Ducke",
+        "tabela_filtro_invalido": "Invalid filter: {erro}",
+        "tabela_ordenar": "Sort by",
+        "tabela_sem_ordem": "(original order)",
+        "tabela_decrescente": "Descending",
+        "tabela_colunas": "Columns",
+        "tabela_linhas": "Rows per page",
+        "tabela_pagina": "Page",
+        "tabela_info": "Rows {inicio}–{fim} of {total}",
+        "tabela_vazia": "No row matches the filter.",
+        "repetidas_progresso": "{n} of {total} worksheet images indexed so far ({descritas} with visual descriptors).",
+        "repetidas_tarefa": "Indexing images: {feitos} of {total} ({erros} failed)",
+        "repetidas_atualizar": "🔄 Refresh progress",
+        "repetidas_parar": "⏹️ Stop indexing",
+        "repetidas_indexar": "🧬 Index worksheet images",
+        "repetidas_ajuda": (
+            "Downloads every image in the background and computes its perceptual hash and visual descriptors; "
+            "the page stays usable."
+        ),
+        "repetidas_erros": "{erros} image(s) could not be downloaded or opened in the last indexing run.",
+        "repetidas_nenhuma": "No possible repeated scans among the indexed images.",
+        "repetidas_resumo": "{exsicatas} images in {grupos} group(s) of possible repeated scans:",
+        "links_quebrados": "{n} of {total} worksheet images have an empty UrlExsicata or no Drive ID and will not be shown.",
+        "links_detalhes": "Show broken links",
+        "antecipando": "📷 Preparing {n} image(s) of this specimen for the Image page.",
+        "parecidas_titulo": "🔎 Similar HUAM specimens",
+        "parecidas_info": "Most similar among {n} indexed images (plant colour, outline and texture).",
+        "parecidas_vazio": "No other image indexed yet; use 🧬 Index worksheet images at the end of the page.",
+    },
+}
+
+
+# XLSX is written cell by cell (about 5k rows/s), so result sets only get
+# an XLSX button below this size; CSV and Parquet are written for any size.
+MAX_LINHAS_XLSX_BOTAO = 20_000
+
+
+def id_sessao():
+    """
+    Id of the current Streamlit session (None outside a Streamlit run).
+    """
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+def _estados_sessoes():
+    """
+    {session id: session state} of every active session. Relies on the
+    Streamlit runtime internals; falls back to the current session only.
+    """
+    try:
+        from streamlit.runtime import get_instance
+
+        gerenciador = get_instance()._session_mgr
+        return {
+            info.session.id: info.session.session_state.filtered_state
+            for info in gerenciador.list_active_sessions()
+        }
+    except Exception:
+        return {id_sessao(): {k: st.session_state[k] for k in st.session_state}}
+
+
+def eh_admin():
+    """
+    True when the URL carries ?admin=<token> matching st.secrets["admin"]["token"].
+    Without that secret the diagnostics stay hidden for everyone.
+    """
+    try:
+        esperado = st.secrets["admin"]["token"]
+    except Exception:
+        return False
+
+    informado = st.query_params.get("admin", "")
+    return bool(esperado) and hmac.compare_digest(str(informado), str(esperado))
+
+
+def _tabela(linhas, vazio):
+    if not linhas:
+        st.caption(vazio)
+        return
+    st.dataframe(pd.DataFrame(linhas), use_container_width=True, hide_index=True)
+
+
+def painel_diagnostico(idioma="pt"):
+    """
+    Admin-only panel with the per-stage summary, the slowest runs with
+    their stages, the most recent spans and the cache hit ratios.
+    """
+    textos = TEXTOS[idioma]
+    sessao = id_sessao()
+
+    with st.expander(textos["titulo"]):
+        escopo = st.radio(
+            textos["escopo"],
+            [textos["sessao"], textos["processo"]],
+            horizontal=True,
+            key="diagnostico_escopo"
+        )
+        filtro = sessao if escopo == textos["sessao"] else None
+
+        st.markdown(f"**{textos['etapas']}**")
+        _tabela(tracing.resumo_etapas(filtro), textos["vazio"])
+
+        st.markdown(f"**{textos['reruns']}**")
+        reruns = [
+            {
+                "pagina": r["pagina"],
+                "duracao_ms": r["duracao_ms"],
+                "etapas": ", ".join(f"{nome} {ms:.0f}ms" for nome, ms in r["etapas"]),
+            }
+            for r in tracing.reruns_mais_lentos(10, filtro)
+        ]
+        _tabela(reruns, textos["vazio"])
+
+        st.markdown(f"**{textos['spans']}**")
+        spans = [
+            {k: v for k, v in s.items() if k != "sessao"}
+            for s in tracing.spans_recentes(50, filtro)
+        ]
+        _tabela(spans, textos["vazio"])
+
+        st.markdown(f"**{textos['caches']}**")
+        _tabela(tracing.taxas_cache(), textos["vazio"])
+
+        if st.button(textos["limpar"], key="diagnostico_limpar"):
+            tracing.limpar()
+
+        _secao_perfil(textos, sessao)
+        _secao_memoria(textos, sessao)
+
+
+def _secao_perfil(textos, sessao):
+    st.markdown(f"**{textos['perfil']}**")
+    st.caption(textos["perfil_ajuda"])
+
+    col_n, col_botao = st.columns([1, 2])
+    with col_n:
+        n = st.number_input(textos["perfil_n"], min_value=1, max_value=20, value=1, key="perfil_n")
+    with col_botao:
+        if st.button(textos["perfil_armar"], key="perfil_armar"):
+            profiler.armar(sessao, int(n))
+
+    if profiler.armados(sessao):
+        st.info(textos["perfil_armado"].format(n=profiler.armados(sessao)))
+
+    for i, perfil in enumerate(profiler.perfis(sessao)):
+        momento = time.strftime("%H%M%S", time.localtime(perfil["inicio"]))
+        st.download_button(
+            textos["perfil_baixar"].format(
+                nome=perfil["nome"], ms=perfil["duracao_ms"], amostras=len(perfil["amostras"])
+            ),
+            data=profiler.speedscope(perfil),
+            file_name=f"biocurate-{perfil['nome']}-{momento}.speedscope.json",
+            mime="application/json",
+            key=f"perfil_baixar_{i}"
+        )
+
+
+def _secao_memoria(textos, sessao):
+    st.markdown(f"**{textos['memoria']}**")
+
+    rss = memoria.rss_bytes()
+    col_rss, col_pico, col_limite = st.columns(3)
+    col_rss.metric(textos["rss"], f"{rss / 1024 / 1024:.0f} MB")
+    col_pico.metric(textos["pico"], f"{memoria.pico_rss_bytes() / 1024 / 1024:.0f} MB")
+    with col_limite:
+        limite = st.number_input(
+            textos["limite"], min_value=0, step=128,
+            value=int(memoria.LIMITE_ALERTA_MB), key="memoria_limite"
+        )
+    memoria.definir_limite_mb(limite)
+
+    if memoria.alerta(rss):
+        st.warning(textos["alerta"].format(rss=rss / 1024 / 1024, limite=limite))
+
+    # DataFrames and indexes kept in session state are reported on their
+    # own lines; the rest of each session's state is summed per session
+    estados = _estados_sessoes()
+    datasets = {}
+    indices = {f"indice:{versao}": indice for versao, indice in indices_ativos().items()}
+    for id_, estado in estados.items():
+        for chave, valor in estado.items():
+            nome = f"{str(id_)[:8]}:{chave}"
+            if isinstance(valor, pd.DataFrame):
+                datasets[nome] = valor
+            elif isinstance(valor, IndiceBase):
+                indices[nome] = valor
+
+    linhas = memoria.relatorio(datasets, indices, estados)
+    for linha in linhas:
+        linha["mb"] = round(linha.pop("bytes") / 1024 / 1024, 2)
+    _tabela(sorted(linhas, key=lambda l: -l["mb"]), textos["vazio"])
+
+    df = st.session_state.get("df")
+    if isinstance(df, pd.DataFrame):
+        st.caption(textos["colunas"])
+        st.dataframe(memoria.colunas_dataframe(df), use_container_width=True, hide_index=True)
+
+    if st.button(textos["esvaziar"], key="memoria_esvaziar"):
+        liberado = memoria.esvaziar_caches()
+        st.cache_data.clear()
+        st.success(textos["esvaziado"].format(mb=liberado / 1024 / 1024))
+
+
+def botoes_exportacao(resultado, consulta, nome, idioma="pt"):
+    """
+    Export of a result set: a format picker (CSV, Parquet, XLSX) and a
+    button that writes the file on demand, then offers it for download
+    while the result and format stay the same. `consulta` identifies the
+    query that produced it (e.g. ("familia", "Fabaceae")); with the
+    dataset version it keys the export cache, so repeated downloads of
+    the same result are not written again. Results that do not come from
+    the dataset alone (consulta=None) are keyed by a hash of their
+    content.
+    """
+    textos = TEXTOS[idioma]
+    if consulta is None:
+        consulta = ("conteudo", int(pd.util.hash_pandas_object(resultado, index=False).sum()))
+    chave = (versao_base(st.session_state.df), consulta)
+
+    formatos = formatos_disponiveis()
+    if "xlsx" in formatos and len(resultado) > MAX_LINHAS_XLSX_BOTAO:
+        formatos.remove("xlsx")
+        st.caption(textos["exportar_xlsx"].format(n=f"{MAX_LINHAS_XLSX_BOTAO:,}"))
+
+    col_formato, col_preparar = st.columns([1, 2])
+    with col_formato:
+        formato = st.selectbox(textos["exportar_formato"], formatos, key=f"exportar_{nome}_formato")
+    with col_preparar:
+        if st.button(textos["exportar_preparar"], key=f"exportar_{nome}_preparar"):
+            st.session_state[f"exportar_{nome}_pronto"] = (chave, formato)
+
+    if st.session_state.get(f"exportar_{nome}_pronto") != (chave, formato):
+        return
+
+    with st.spinner(textos["exportar_gerando"]):
+        dados = exportar_cacheado(resultado, chave, formato)
+
+    mime, extensao = FORMATOS[formato]
+    st.download_button(
+        textos["exportar"].format(formato=formato.upper()),
+        data=dados,
+        file_name=f"{nome}{extensao}",
+        mime=mime,
+        key=f"exportar_{nome}_baixar",
+        use_container_width=True
+    )
+
+
+def guardar_resultado(nome, valor):
+    """
+    Keeps a search result in the session, tied to the current dataset
+    version, so it is still shown when the table widgets rerun the page.
+    """
+    st.session_state[f"resultado_{nome}"] = (versao_base(st.session_state.df), valor)
+
+
+def resultado_guardado(nome):
+    """The result kept by guardar_resultado, or None (none yet, or another dataset)."""
+    guardado = st.session_state.get(f"resultado_{nome}")
+    if guardado is None or guardado[0] != versao_base(st.session_state.df):
+        return None
+    return guardado[1]
+
+
+def tabela_paginada(resultado, chave, idioma="pt"):
+    """
+    Paginated table of a result set taken from the loaded dataset. Only
+    the chosen columns of the current page are sent to the browser;
+    filtering (free-text syntax) and sorting run on the dataset indexes
+    (see biocurate.tabela). `chave` prefixes the widget keys.
+    """
+    textos = TEXTOS[idioma]
+    base = st.session_state.df
+    indice = indice_base(base)
+    posicoes = posicoes_de(base, resultado)
+
+    col_filtro, col_ordem, col_sentido = st.columns([3, 2, 1])
+    with col_filtro:
+        filtro = st.text_input(textos["tabela_filtro"], help=textos["tabela_filtro_ajuda"], key=f"{chave}_filtro")
+    with col_ordem:
+        ordenar_por = st.selectbox(
+            textos["tabela_ordenar"], [textos["tabela_sem_ordem"]] + list(base.columns), key=f"{chave}_ordem"
+        )
+    with col_sentido:
+        decrescente = st.checkbox(textos["tabela_decrescente"], key=f"{chave}_decrescente")
+
+    colunas = st.multiselect(
+        textos["tabela_colunas"], list(base.columns), default=colunas_padrao(base), key=f"{chave}_colunas"
+    ) or colunas_padrao(base)
+
+    try:
+        posicoes = consultar(
+            indice, posicoes, filtro,
+            None if ordenar_por == textos["tabela_sem_ordem"] else ordenar_por,
+            not decrescente
+        )
+    except ValueError as e:
+        st.warning(textos["tabela_filtro_invalido"].format(erro=e))
+        return
+
+    if not len(posicoes):
+        st.info(textos["tabela_vazia"])
+        return
+
+    col_tamanho, col_pagina, col_info = st.columns(3)
+    with col_tamanho:
+        tamanho = st.selectbox(
+            textos["tabela_linhas"], TAMANHOS_PAGINA, index=TAMANHOS_PAGINA.index(TAMANHO_PAGINA),
+            key=f"{chave}_tamanho"
+        )
+    paginas = math.ceil(len(posicoes) / tamanho)
+    # A narrower filter may leave the kept page number out of range
+    if st.session_state.get(f"{chave}_pagina", 1) > paginas:
+        st.session_state[f"{chave}_pagina"] = paginas
+    with col_pagina:
+        numero = st.number_input(
+            textos["tabela_pagina"], min_value=1, max_value=paginas, step=1, key=f"{chave}_pagina"
+        )
+    inicio = (numero - 1) * tamanho
+    col_info.caption(textos["tabela_info"].format(
+        inicio=inicio + 1, fim=min(inicio + tamanho, len(posicoes)), total=len(posicoes)
+    ))
+
+    st.dataframe(pagina(base, posicoes, colunas, numero, tamanho), use_container_width=True, hide_index=True)
+
+
+def painel_repetidas(planilha, idioma="pt"):
+    """
+    Possible repeated scans among the images of the Image worksheet: how
+    many are indexed, a button that starts (or stops) the background
+    indexing job (perceptual hashes and visual descriptors) and the
+    groups of near-duplicate scans found so far.
+    """
+    textos = TEXTOS[idioma]
+    indice = indice_hashes()
+    visual = indice_visual()
+    tarefa = tarefa_atual()
+    ids = file_ids(planilha).dropna()
+
+    st.caption(textos["repetidas_progresso"].format(n=len(indice), total=ids.nunique(), descritas=len(visual)))
+
+    if tarefa is not None and tarefa.is_alive():
+        st.progress(
+            tarefa.feitos / max(tarefa.total, 1),
+            text=textos["repetidas_tarefa"].format(feitos=tarefa.feitos, total=tarefa.total, erros=tarefa.erros)
+        )
+        col_atualizar, col_parar = st.columns(2)
+        # Any button press reruns the page, which redraws the progress
+        col_atualizar.button(textos["repetidas_atualizar"], key="repetidas_atualizar", use_container_width=True)
+        if col_parar.button(textos["repetidas_parar"], key="repetidas_parar", use_container_width=True):
+            tarefa.parar()
+
+    else:
+        if tarefa is not None and tarefa.erros:
+            st.caption(textos["repetidas_erros"].format(erros=tarefa.erros))
+        if st.button(textos["repetidas_indexar"], key="repetidas_indexar", help=textos["repetidas_ajuda"],
+                     use_container_width=True):
+            indexar_em_segundo_plano(ids, [indice, visual])
+            st.rerun()
+
+    repetidas = indice.duplicatas(planilha)
+    if repetidas.empty:
+        st.info(textos["repetidas_nenhuma"])
+        return
+
+    st.write(textos["repetidas_resumo"].format(exsicatas=len(repetidas), grupos=repetidas["grupo"].nunique()))
+    st.dataframe(repetidas, use_container_width=True, hide_index=True)
+
+
+def exsicatas_parecidas(planilha, file_id, img, idioma="pt"):
+    """
+    The indexed HUAM scans that look most like the one shown (see
+    biocurate.similares), with their determinations. The scan is
+    described on the spot if the background job has not reached it, and
+    its repeated scans are left out.
+    """
+    textos = TEXTOS[idioma]
+    indice = indice_visual()
+    indice.registrar(file_id, img)
+
+    st.subheader(textos["parecidas_titulo"])
+    repetidas = [outro for outro, _ in indice_hashes().semelhantes(file_id)]
+    parecidas = indice.parecidas(planilha, file_id, excluir=repetidas)
+    if parecidas.empty:
+        st.info(textos["parecidas_vazio"])
+        return
+
+    st.caption(textos["parecidas_info"].format(n=len(indice)))
+    st.dataframe(parecidas.drop(columns="file_id"), use_container_width=True, hide_index=True)
+
+
+def resumo_links(planilha, idioma="pt"):
+    """
+    Load-time summary of the Image worksheet links (resolved by
+    images.resolver_links): how many UrlExsicata entries are broken, and
+    which, in an expander.
+    """
+    textos = TEXTOS[idioma]
+    quebrados = links_quebrados(planilha)
+    if quebrados.empty:
+        return
+
+    st.warning(textos["links_quebrados"].format(n=len(quebrados), total=len(planilha)))
+    with st.expander(textos["links_detalhes"]):
+        st.dataframe(quebrados, use_container_width=True, hide_index=True)
+
+
+def planilha_imagens(conn):
+    """
+    The Image worksheet (cached by conn.read for 10 minutes) without the
+    "Fotos exsicatas Mike" folder, with its links resolved.
+    """
+    with tracing.span("imagem.planilha"):
+        planilha = conn.read(worksheet="Image", ttl="10m")
+
+    planilha = planilha[~planilha["Subpasta"].astype(str).str.contains("Fotos exsicatas Mike", na=False)]
+    return resolver_links(planilha)
+
+
+def antecipar_imagens(conn, codigo, idioma="pt"):
+    """
+    Called by the Search page once a code is resolved: queues the scans
+    of that code in biocurate.prefetch, so the Image page finds them
+    cached (and identified, with PREFETCH_IDENTIFICACAO). Speculative
+    work: a failure here never reaches the page.
+    """
+    try:
+        resultado = buscar_imagens_por_tombo(planilha_imagens(conn), codigo)
+    except Exception:
+        return
+
+    api_key = None
+    if PREFETCH_IDENTIFICACAO:
+        try:
+            api_key = st.secrets["plantnet"]["api_key"]
+        except Exception:
+            pass
+
+    enfileirados = antecipar(resultado.loc[resultado["link_valido"], "file_id"], api_key)
+    if enfileirados:
+        st.caption(TEXTOS[idioma]["antecipando"].format(n=enfileirados))
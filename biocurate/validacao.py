@@ -0,0 +1,295 @@
+# -----------------------------------------------
+# Darwin Core data-quality validation
+#
+# Vectorized rules over whole columns, so the complete dataset is checked
+# at load in about a second. Each rule yields the row positions that
+# break it; the result is one issue table with the rule, the record and
+# the offending value.
+#
+# Row rules only look at the row itself, so when the dataset changes,
+# Validacao.atualizado(df) re-checks only the rows whose values changed.
+# Cross-record rules (repeated accession numbers, a genus filed under
+# several families) are cheap group-bys and are always re-run in full.
+# -----------------------------------------------
+
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from biocurate.search import coluna_tombo
+from biocurate.tracing import span
+
+
+# Above this fraction of changed rows the dataset is simply re-validated.
+MAX_FRACAO_INCREMENTAL = 0.5
+
+ANO_MINIMO = 1700
+
+# Accession numbers are a collection acronym followed by digits (HUAM001245)
+PADRAO_TOMBO = r"^[A-Za-z]{2,}\d+$"
+
+# Family names conserved without the -aceae ending (ICN Art. 18.5)
+FAMILIAS_CONSERVADAS = {
+    "Compositae", "Cruciferae", "Gramineae", "Guttiferae", "Labiatae",
+    "Leguminosae", "Palmae", "Papilionaceae", "Umbelliferae",
+}
+
+DESCRICOES = {
+    "pt": {
+        "data_invalida": "Dia ou mês impossível (ex.: 31/2, mês 13)",
+        "ano_implausivel": f"Ano de coleta antes de {ANO_MINIMO} ou no futuro",
+        "nome_vazio": "scientificName vazio com genus preenchido",
+        "nome_genero": "scientificName não começa pelo genus",
+        "familia_malformada": "Família sem a terminação -aceae",
+        "tombo_malformado": "Tombo fora do padrão SIGLA + números",
+        "tombo_repetido": "Tombo repetido em mais de um registro",
+        "genero_familia": "Gênero registrado em outra família na maioria das amostras",
+    },
+    "en": {
+        "data_invalida": "Impossible day or month (e.g. 31/2, month 13)",
+        "ano_implausivel": f"Collection year before {ANO_MINIMO} or in the future",
+        "nome_vazio": "Empty scientificName with a filled genus",
+        "nome_genero": "scientificName does not start with the genus",
+        "familia_malformada": "Family without the -aceae ending",
+        "tombo_malformado": "Accession number not in the ACRONYM + digits format",
+        "tombo_repetido": "Accession number repeated in more than one record",
+        "genero_familia": "Genus filed under another family in most specimens",
+    },
+}
+
+
+def _texto(df, coluna):
+    """Stripped text of a column, <NA> when empty or missing."""
+    if coluna not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    texto = df[coluna].astype("string").str.strip()
+    return texto.mask(texto == "")
+
+
+def _numero(df, coluna):
+    if coluna not in df.columns:
+        return pd.Series(np.nan, index=df.index)
+    return pd.to_numeric(df[coluna], errors="coerce").astype(float)
+
+
+# Row rules: df -> (boolean mask, column or tuple of columns checked)
+
+def _data_invalida(df):
+    dia = _numero(df, "dayCollected")
+    mes = _numero(df, "monthCollected")
+    ano = _numero(df, "yearCollected")
+
+    mes_ruim = mes.notna() & ((mes < 1) | (mes > 12))
+    # Days in the month (February 29 only in leap years; 31 when unknown)
+    dias = pd.Series(31, index=df.index)
+    dias[mes.isin([4, 6, 9, 11])] = 30
+    bissexto = (ano % 4 == 0) & ((ano % 100 != 0) | (ano % 400 == 0))
+    dias[mes == 2] = np.where(bissexto[mes == 2] | ano[mes == 2].isna(), 29, 28)
+    dia_ruim = dia.notna() & ((dia < 1) | (dia > dias))
+
+    return (mes_ruim | dia_ruim).to_numpy(), ("dayCollected", "monthCollected", "yearCollected")
+
+
+def _ano_implausivel(df):
+    ano = _numero(df, "yearCollected")
+    ruim = ano.notna() & ((ano < ANO_MINIMO) | (ano > datetime.date.today().year))
+    return ruim.to_numpy(), "yearCollected"
+
+
+def _nome_vazio(df):
+    return (_texto(df, "scientificName").isna() & _texto(df, "genus").notna()).to_numpy(), "scientificName"
+
+
+def _nome_genero(df):
+    nome = _texto(df, "scientificName").str.upper()
+    genero = _texto(df, "genus").str.upper()
+    primeiro = nome.str.extract(r"^(\S+)", expand=False)
+    ruim = nome.notna() & genero.notna() & (primeiro != genero)
+    return ruim.fillna(False).to_numpy(dtype=bool), "scientificName"
+
+
+def _familia_malformada(df):
+    familia = _texto(df, "family")
+    ruim = familia.notna() & ~familia.str.lower().str.endswith("aceae") & ~familia.isin(FAMILIAS_CONSERVADAS)
+    return ruim.fillna(False).to_numpy(dtype=bool), "family"
+
+
+def _tombo_malformado(df):
+    coluna = coluna_tombo(df)
+    if coluna is None or coluna == "catalogNumber":
+        return np.zeros(len(df), dtype=bool), coluna
+    tombo = _texto(df, coluna)
+    ruim = tombo.notna() & ~tombo.str.fullmatch(PADRAO_TOMBO)
+    return ruim.fillna(False).to_numpy(dtype=bool), coluna
+
+
+REGRAS_LINHA = {
+    "data_invalida": _data_invalida,
+    "ano_implausivel": _ano_implausivel,
+    "nome_vazio": _nome_vazio,
+    "nome_genero": _nome_genero,
+    "familia_malformada": _familia_malformada,
+    "tombo_malformado": _tombo_malformado,
+}
+
+
+# Cross-record rules: df -> (boolean mask, column checked)
+
+def _tombo_repetido(df):
+    coluna = coluna_tombo(df)
+    if coluna is None:
+        return np.zeros(len(df), dtype=bool), coluna
+    tombo = _texto(df, coluna).str.upper()
+    return (tombo.notna() & tombo.duplicated(keep=False)).to_numpy(), coluna
+
+
+def _genero_familia(df):
+    genero = _texto(df, "genus").str.upper()
+    familia = _texto(df, "family").str.upper()
+    validos = genero.notna() & familia.notna()
+
+    # Family of more than half of the specimens of each genus; genera
+    # split without a strict majority (e.g. evenly between two families)
+    # are not flagged
+    contagem = pd.DataFrame({"genero": genero[validos], "familia": familia[validos]}).value_counts()
+    total = contagem.groupby(level="genero").transform("sum")
+    maioria = contagem[contagem * 2 > total].reset_index().set_index("genero")["familia"]
+
+    esperada = genero.map(maioria)
+    ruim = validos & esperada.notna() & (familia != esperada)
+    return ruim.fillna(False).to_numpy(dtype=bool), "family"
+
+
+REGRAS_CONJUNTO = {
+    "tombo_repetido": _tombo_repetido,
+    "genero_familia": _genero_familia,
+}
+
+REGRAS = list(REGRAS_LINHA) + list(REGRAS_CONJUNTO)
+
+
+def _aplicar(df, regras, posicoes=None):
+    """
+    {rule: (row positions, column)} of the rules over df. `posicoes` maps
+    the rows of df to positions in the full dataset (df itself by default).
+    """
+    resultado = {}
+    for nome, regra in regras.items():
+        mascara, coluna = regra(df)
+        encontrados = np.flatnonzero(mascara)
+        resultado[nome] = (encontrados if posicoes is None else posicoes[encontrados], coluna)
+    return resultado
+
+
+# Columns read by the row rules; other columns do not affect validation
+COLUNAS_VALIDADAS = [
+    "dayCollected", "monthCollected", "yearCollected",
+    "scientificName", "genus", "family",
+    "collectionCode", "barcode", "catalogNumber",
+]
+
+
+def _colunas(df):
+    return [c for c in COLUNAS_VALIDADAS if c in df.columns]
+
+
+def _hashes(df):
+    colunas = _colunas(df)
+    if not colunas:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[colunas], index=False).to_numpy()
+
+
+class Validacao:
+    """
+    Issues of one dataset version. Build it once per version; use
+    atualizado(df) for the next version.
+    """
+
+    def __init__(self, df, _linha=None, _hashes_linhas=None):
+        self.df = df
+        self.hashes = _hashes_linhas if _hashes_linhas is not None else _hashes(df)
+        self._linha = _linha if _linha is not None else _aplicar(df, REGRAS_LINHA)
+        self._conjunto = _aplicar(df, REGRAS_CONJUNTO)
+
+    @span("base.validar")
+    def atualizado(self, df):
+        """
+        Validation of a new version of the dataset. Rows are matched by
+        position; row rules are re-run only on rows that changed or were
+        added.
+        """
+        hashes = _hashes(df)
+        if _colunas(df) != _colunas(self.df):
+            return Validacao(df, _hashes_linhas=hashes)
+
+        comum = min(len(hashes), len(self.hashes))
+        refazer = np.concatenate([
+            np.flatnonzero(hashes[:comum] != self.hashes[:comum]),
+            np.arange(comum, len(hashes)),
+        ])
+        if len(refazer) > MAX_FRACAO_INCREMENTAL * max(len(hashes), 1):
+            return Validacao(df, _hashes_linhas=hashes)
+
+        novos = _aplicar(df.iloc[refazer], REGRAS_LINHA, refazer)
+        linha = {}
+        for nome, (posicoes, coluna) in self._linha.items():
+            manter = posicoes[(posicoes < len(hashes)) & ~np.isin(posicoes, refazer)]
+            linha[nome] = (np.sort(np.concatenate([manter, novos[nome][0]])), novos[nome][1] or coluna)
+
+        return Validacao(df, linha, hashes)
+
+    def _todas(self):
+        return {**self._linha, **self._conjunto}
+
+    def resumo(self, idioma="pt"):
+        """Number of records breaking each rule, as a DataFrame."""
+        return pd.DataFrame([
+            {"regra": nome, "descricao": DESCRICOES[idioma][nome], "registros": len(posicoes)}
+            for nome, (posicoes, _) in self._todas().items()
+        ])
+
+    def total(self):
+        """Number of records with at least one issue."""
+        posicoes = [p for p, _ in self._todas().values() if len(p)]
+        return len(np.unique(np.concatenate(posicoes))) if posicoes else 0
+
+    def problemas(self, regra=None, idioma="pt"):
+        """
+        Issue table: one row per (rule, record) with the rule, its
+        description, the accession number, the column and its value.
+        """
+        tombo = coluna_tombo(self.df)
+        partes = []
+
+        for nome, (posicoes, coluna) in self._todas().items():
+            if (regra and nome != regra) or not len(posicoes):
+                continue
+
+            registros = self.df.iloc[posicoes]
+            colunas = [c for c in (coluna if isinstance(coluna, tuple) else (coluna,)) if c in registros]
+            valor = None
+            if colunas:
+                valor = registros[colunas[0]].astype("string").fillna("")
+                for c in colunas[1:]:
+                    valor = valor + "/" + registros[c].astype("string").fillna("")
+
+            partes.append(pd.DataFrame({
+                "regra": nome,
+                "descricao": DESCRICOES[idioma][nome],
+                "posicao": posicoes,
+                "tombo": registros[tombo].to_numpy() if tombo else None,
+                "coluna": ", ".join(colunas),
+                "valor": valor.to_numpy() if valor is not None else None,
+            }))
+
+        if not partes:
+            return pd.DataFrame(columns=["regra", "descricao", "posicao", "tombo", "coluna", "valor"])
+        return pd.concat(partes, ignore_index=True)
+
+
+@span("base.validar")
+def validar_base(df):
+    """Validates the whole dataset (see Validacao)."""
+    return Validacao(df)
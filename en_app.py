@@ -12,21 +12,51 @@
 # -----------------------------------------------
 
 import os
-import re
 import io
-import time
+import json
 import streamlit as st
 import pandas as pd
 import numpy as np
 import cv2
-import requests
 import plotly.express as px
 
-from io import BytesIO
-from PIL import Image, ImageOps
 from streamlit_gsheets import GSheetsConnection
 from streamlit_option_menu import option_menu
 
+from biocurate.dataset import preparar_base, ler_base, formatar_data
+from biocurate.search import normalizar_codigo, buscar_por_tombo, buscar_imagens_por_tombo, buscar_por_taxon, separar_blocos
+from biocurate.images import (
+    MENSAGENS,
+    download_drive_image,
+    miniatura_drive,
+    preparar_imagem_para_plantnet,
+    identificar_com_plantnet,
+    mensagem_erro,
+    redigir_api_key,
+)
+from biocurate.checklist import checklist_de_arquivo, checklist_local, revisar
+from biocurate.exportacao import FORMATOS, MAX_LINHAS_XLSX, exportar_cacheado, formatos_disponiveis
+from biocurate.graficos import MAX_BARRAS, grafico_contagem
+from biocurate.hash_imagem import indice_hashes
+from biocurate.index import indice_base
+from biocurate.prefetch import aguardar, chave_identificacao
+from biocurate.recorte import recortar_exsicata
+from biocurate.reports import contar_familias, relatorio_familia, relatorio_genero, relatorio_especie
+from biocurate import tracing
+from biocurate.ui import (
+    eh_admin,
+    painel_diagnostico,
+    botoes_exportacao,
+    guardar_resultado,
+    resultado_guardado,
+    tabela_paginada,
+    painel_repetidas,
+    exsicatas_parecidas,
+    resumo_links,
+    planilha_imagens,
+    antecipar_imagens,
+)
+
 
 # -----------------------------------------------
 # General Configuration
@@ -77,6 +107,7 @@ def run():
         },
     },
     )
+    tracing.definir_pagina(selected)
 
     # -----------------------------------------------
     # Home Page
@@ -171,20 +202,96 @@ def run():
 
         # Automatic connection to the HUAM huam
         conn = st.connection("gsheets", type=GSheetsConnection)
-        df_base = conn.read(worksheet="Metadata", ttl="10m")
+        with tracing.span("base.planilha"):
+            df_bruto = conn.read(worksheet="Metadata", ttl="10m")
+        df_base = preparar_base(df_bruto)
         
         st.session_state.df = df_base
+        # Full-text index built once per version of the database
+        with st.spinner("Indexing the database for free-text search..."):
+            indice_base(df_base).texto
         st.success("✔️ HUAM Herbarium database loaded!")
         st.write(df_base.head())
 
-        # Upload CSV to overwrite existing data
+        # Upload CSV or DwC-A to overwrite existing data
         st.subheader("Or upload your own database in Darwin Core format")
-        file = st.file_uploader("Select the CSV file", type=["csv"])
+        file = st.file_uploader(
+            "Select the CSV file or Darwin Core Archive (.zip)",
+            type=["csv", "zip"],
+            help=".zip files exported from IPT/GBIF are read directly, without unpacking."
+        )
         if file:
-            df_base = pd.read_csv(file)
-            st.session_state.df = df_base
-            st.success("CSV file uploaded. Database updated.")
-            st.write(df_base.head())
+            try:
+                df_base = ler_base(file)
+            except Exception as e:
+                st.error(f"Could not read the uploaded file: {e}")
+            else:
+                st.session_state.df = df_base
+                with st.spinner("Indexing the database for free-text search..."):
+                    indice_base(df_base).texto
+                if file.name.lower().endswith(".zip"):
+                    st.success(f"Darwin Core Archive uploaded. Database updated ({len(df_base)} records).")
+                else:
+                    st.success("CSV file uploaded. Database updated.")
+                st.write(df_base.head())
+
+        # Data quality of the loaded database (re-checked only on changed
+        # rows when the spreadsheet is updated)
+        st.subheader("🩺 Data quality")
+        with st.spinner("Validating the database..."):
+            validacao = indice_base(st.session_state.df).validacao
+
+        resumo_validacao = validacao.resumo("en")
+        total_problemas = validacao.total()
+        if total_problemas:
+            st.warning(f"{total_problemas} record(s) with at least one issue.")
+        else:
+            st.success("No issues found by the validation rules.")
+
+        st.dataframe(
+            resumo_validacao.rename(columns={
+                "regra": "Rule",
+                "descricao": "Description",
+                "registros": "Records",
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        regras_com_problemas = resumo_validacao.loc[resumo_validacao["registros"] > 0, "regra"].tolist()
+        if regras_com_problemas:
+            regra = st.selectbox("Show records of rule", regras_com_problemas, key="validacao_regra")
+            problemas = validacao.problemas(regra, "en").drop(columns=["regra", "descricao", "posicao"]).rename(columns={
+                "tombo": "Accession number",
+                "coluna": "Column",
+                "valor": "Value",
+            })
+            st.dataframe(problemas, use_container_width=True, hide_index=True)
+            botoes_exportacao(problemas, ("validacao", regra), f"issues_{regra}", "en")
+
+        # Full collection export, written in blocks and cached per version
+        st.subheader("⬇️ Export database")
+        col_formato, col_preparar = st.columns([1, 2])
+        with col_formato:
+            formato_base = st.selectbox("Format", formatos_disponiveis(), key="exportar_base_formato")
+        with col_preparar:
+            preparar_base_arquivo = st.button("Prepare file", key="exportar_base")
+
+        if preparar_base_arquivo:
+            df_exportar = st.session_state.df
+            if formato_base == "xlsx" and len(df_exportar) > MAX_LINHAS_XLSX:
+                st.error(f"The database has {len(df_exportar)} records, above the Excel limit; use CSV or Parquet.")
+            else:
+                with st.spinner("Writing file..."):
+                    arquivo_base = exportar_cacheado(df_exportar, (indice_base(df_exportar).versao, "base"), formato_base)
+                mime, extensao = FORMATOS[formato_base]
+                st.download_button(
+                    f"⬇️ Download database ({len(df_exportar)} records, {len(arquivo_base) / 1024 / 1024:.1f} MB)",
+                    data=arquivo_base,
+                    file_name=f"biocurate_database{extensao}",
+                    mime=mime,
+                    key="exportar_base_baixar"
+                )
 
     # -----------------------------------------------
     # Report Page
@@ -205,55 +312,78 @@ def run():
 
             # Show all botanical families in the dataset
             if st.button("List All Botanical Families"):
-                contagem_familias = df["family"].value_counts().sort_values(ascending=True)
+                contagem_familias = contar_familias(df)
                 st.session_state["contagem_familias"] = contagem_familias  # saves to session
 
                 st.success(f"**Total families found:** {len(contagem_familias)}")
                 st.write(", ".join(contagem_familias.index.tolist()))
 
-            # Show chart button (only if data is available)
+            # Family chart: counts aggregated once per dataset version and
+            # the figure cached; only the top families are drawn
             if "contagem_familias" in st.session_state:
-                if st.button("📊 Display Interactive Chart by Family"):
-                    contagem_familias = st.session_state["contagem_familias"]
-                    df_plot = contagem_familias.reset_index()
-                    df_plot.columns = ["Family", "Specimens"]
+                if st.checkbox("📊 Display Interactive Chart by Family", key="grafico_familias"):
+                    indice_grafico = indice_base(st.session_state.df)
+                    contagem_familias = indice_grafico.contagem_familias()
+
+                    col_top, col_modo = st.columns(2)
+                    with col_top:
+                        top_n = st.slider(
+                            "Families shown", min_value=5, max_value=min(100, max(5, len(contagem_familias))),
+                            value=min(MAX_BARRAS, max(5, len(contagem_familias))), key="grafico_top"
+                        )
+                    with col_modo:
+                        modo = st.radio(
+                            "Mode", ["Bars", "Dots (WebGL)"], horizontal=True, key="grafico_modo"
+                        )
+                    modo = "webgl" if modo.startswith("Dots") else "barras"
 
-                    fig = px.bar(
-                        df_plot,
-                        x="Specimens",
-                        y="Family",
-                        orientation="h",
-                        title="Specimens by Family",
-                        labels={"Specimens": "Number of Specimens", "Family": "Family"},
-                        color_discrete_sequence=["#388E3C"],
-                        height=max(400, len(df_plot) * 20)  # ajusta altura
+                    familia_grafico = st.selectbox(
+                        "Drill down into the genera of a family",
+                        ["All families"] + contagem_familias.sort_values(ascending=False).index.tolist(),
+                        key="grafico_familia"
                     )
 
-                    st.plotly_chart(fig, use_container_width=True)        
+                    if familia_grafico == "All families":
+                        spec = grafico_contagem(
+                            (indice_grafico.versao, None), contagem_familias, top_n, "Other ({n} families)",
+                            "Specimens by Family", "Number of Specimens", "Family", modo
+                        )
+                    else:
+                        spec = grafico_contagem(
+                            (indice_grafico.versao, familia_grafico), indice_grafico.contagem_generos(familia_grafico),
+                            top_n, "Other ({n} genera)",
+                            f"Specimens by Genus: {familia_grafico}", "Number of Specimens", "Genus", modo
+                        )
+
+                    st.plotly_chart(json.loads(spec), use_container_width=True)
 
             # Family Report
             st.subheader("Search by Family")
             familia = st.text_input("Enter the family name:")
             if st.button("🔍 Search Family"):
                 if familia:
-                    df_fam = df[df["family"].str.upper() == familia.upper()]
-                    num_material = len(df_fam)
-                    generos = df_fam["genus"].dropna().unique()
-                    especies = df_fam["scientificName"].dropna().unique()
-                    locs = df_fam["dynamicProperties"].dropna().unique()
+                    rel = relatorio_familia(df, familia)
+                    num_material = len(rel["amostras"])
+                    generos = rel["generos"]
+                    especies = rel["especies"]
+                    locs = rel["locais"]
 
                     if len(locs) > 0:
-                        locs_str = ", ".join(sorted(map(str, locs)))
+                        locs_str = ", ".join(locs)
                         st.info(f"**Location in the collection:** {locs_str}")
 
                     st.info(f"**Total specimens:** {num_material}")
                     st.info(f"**Total genera:** {len(generos)}")
                     st.write("**Genera found:**")
-                    st.write(", ".join(sorted(map(str, generos))))
+                    st.write(", ".join(generos))
 
                     st.info(f"**Total species:** {len(especies)}")
                     st.write("**Species found:**")
-                    st.write(", ".join(sorted(map(str, especies))))
+                    st.write(", ".join(especies))
+
+                    if num_material:
+                        st.write("**Export family specimens:**")
+                        botoes_exportacao(rel["amostras"], ("familia", familia.strip()), f"family_{familia.strip()}", "en")
                 else:
                     st.warning("Enter the family name before searching.")
 
@@ -263,22 +393,25 @@ def run():
         
             if st.button("🔍 Search Genus"):
                 if genero:
-                    df_gen = df[df["genus"].str.upper() == genero.upper()]
-                    total_amostras = len(df_gen)
-                    so_genero = df_gen[df_gen["scientificName"].isna() | (df_gen["scientificName"].str.strip() == "")]
-                    especies_por_genero = df_gen["scientificName"].dropna().unique()
-                    locs = df_gen["scientificName"].dropna().unique()
-                    familias = df_gen["family"].dropna().unique()
+                    rel = relatorio_genero(df, genero)
+                    total_amostras = len(rel["amostras"])
+                    especies_por_genero = rel["especies"]
+                    locs = rel["locais"]
+                    familias = rel["familias"]
 
                     if len(locs) > 0:
-                        locs_str = ", ".join(sorted(map(str, locs)))
+                        locs_str = ", ".join(locs)
                         st.info(f"**Location in the collection:** {locs_str}")
 
-                    st.info(f"**Family:** {', '.join(sorted(map(str, familias)))}")
+                    st.info(f"**Family:** {', '.join(familias)}")
                     st.info(f"**Genus specimens:** {total_amostras}")
                     st.info(f"**Species within the genus:** {len(especies_por_genero)}")
                     st.write("**Species found:**")
-                    st.write(", ".join(sorted(map(str, especies_por_genero))))
+                    st.write(", ".join(especies_por_genero))
+
+                    if total_amostras:
+                        st.write("**Export genus specimens:**")
+                        botoes_exportacao(rel["amostras"], ("genero", genero.strip()), f"genus_{genero.strip()}", "en")
                 else:
                     st.warning("Enter the genus name before searching.")
 
@@ -288,25 +421,238 @@ def run():
        
             if st.button("🔍 Search Species"):
                 if especie:
-                    df_esp = df[df["scientificName"].str.upper() == especie.upper()]
-                    total_especie = len(df_esp)
-                    locs = df_esp["dynamicProperties"].dropna().unique()
-                    familias = df_esp["family"].dropna().unique()
+                    guardar_resultado("especie", (especie.strip(), relatorio_especie(df, especie)))
+                else:
+                    st.warning("Enter the species name before searching.")
 
-                    if len(locs) > 0:
-                        locs_str = ", ".join(sorted(map(str, locs)))
-                        st.info(f"**Location in the collection:** {locs_str}")
+            # Kept in the session, so the table can be paged and sorted
+            especie_guardada = resultado_guardado("especie")
+            if especie_guardada is not None:
+                nome_especie, rel = especie_guardada
+                df_esp = rel["amostras"]
+                total_especie = len(df_esp)
+                locs = rel["locais"]
+                familias = rel["familias"]
+
+                if len(locs) > 0:
+                    locs_str = ", ".join(locs)
+                    st.info(f"**Location in the collection:** {locs_str}")
+
+                st.info(f"**Family:** {', '.join(familias)}")
+                st.info(f"**Total specimens of the species:** {total_especie}")
+
+                if total_especie > 0:
+                    st.write("**Details of the specimens found:**")
+                    tabela_paginada(df_esp, "tabela_especie", "en")
+                    botoes_exportacao(df_esp, ("especie", nome_especie), f"species_{nome_especie}", "en")
+                else:
+                    st.warning("No specimen found for this species.")
 
-                    st.info(f"**Family:** {', '.join(sorted(map(str, familias)))}")
-                    st.info(f"**Total specimens of the species:** {total_especie}")
+            # Period Report
+            st.subheader("Search by Collection Period")
+            indice = indice_base(st.session_state.df)
 
-                    if total_especie > 0:
-                        st.write("**Details of the specimens found:**")
-                        st.dataframe(df_esp, use_container_width=True)
+            if indice.temporal is None:
+                st.warning("⚠️ Your database does not have the 'yearCollected' column.")
+            else:
+                col_ini, col_fim, col_fam = st.columns(3)
+                with col_ini:
+                    data_ini = st.text_input("From", placeholder="E.g.: 1980 or 1980-05")
+                with col_fim:
+                    data_fim = st.text_input("To", placeholder="E.g.: 1990")
+                with col_fam:
+                    familia_periodo = st.text_input("Family (optional)")
+
+                if st.button("🔍 Search Period"):
+                    consulta_periodo = (data_ini.strip(), data_fim.strip(), familia_periodo.strip())
+                    try:
+                        guardar_resultado("periodo", (consulta_periodo, indice.buscar_periodo(
+                            *(parte or None for parte in consulta_periodo)
+                        )))
+                    except ValueError:
+                        st.warning("⚠️ Invalid date: use 1980, 1980-05 or 1980-05-12.")
+
+                periodo_guardado = resultado_guardado("periodo")
+                if periodo_guardado is not None:
+                    consulta_periodo, df_periodo = periodo_guardado
+
+                    if df_periodo.empty:
+                        st.warning("No specimen collected in this period.")
+                    else:
+                        st.info(f"**Specimens collected in the period:** {len(df_periodo)}")
+                        tabela_paginada(df_periodo, "tabela_periodo", "en")
+                        botoes_exportacao(df_periodo, ("periodo",) + consulta_periodo, "period", "en")
+
+                if st.button("📅 Specimens per Year and Decade"):
+                    temporal = indice.temporal
+                    st.info(f"**Specimens without collection year:** {temporal['sem_data']}")
+
+                    df_decadas = temporal["decadas"].rename_axis("Decade").reset_index(name="Specimens")
+                    fig = px.bar(
+                        df_decadas,
+                        x="Decade",
+                        y="Specimens",
+                        title="Specimens per Collection Decade",
+                        color_discrete_sequence=["#388E3C"]
+                    )
+                    st.plotly_chart(fig, use_container_width=True)
+
+                    st.write("**Specimens per year:**")
+                    st.dataframe(
+                        temporal["anos"].rename_axis("Year").reset_index(name="Specimens"),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
+            # Collector Report
+            st.subheader("Specimens per Collector")
+            if "recordedBy" not in df.columns:
+                st.warning("⚠️ Your database does not contain the column 'recordedBy'.")
+            elif st.button("🧑‍🔬 List Collectors"):
+                contagem_coletores = indice.contagem_coletores.rename(columns={
+                    "coletor": "Collector",
+                    "principal": "Main collector",
+                    "adicional": "Additional collector",
+                    "total": "Total",
+                })
+                st.info(f"**Total collectors:** {len(contagem_coletores)}")
+                st.dataframe(contagem_coletores, use_container_width=True, hide_index=True)
+                botoes_exportacao(contagem_coletores, ("coletores",), "collectors", "en")
+
+            # Storage Location Inventory
+            st.subheader("Collection Inventory")
+            if indice.inventario is None:
+                st.warning("⚠️ Your database does not contain the column 'dynamicProperties'.")
+            else:
+                inventario = indice.inventario
+                armarios = list(dict.fromkeys(inventario["armario"].dropna()))
+                armario = st.selectbox("Cabinet", ["All"] + armarios)
+
+                if armario != "All":
+                    inventario = inventario[inventario["armario"] == armario]
+
+                st.info(
+                    f"**Locations:** {len(inventario)} | "
+                    f"**Specimens:** {int(inventario['amostras'].sum())}"
+                )
+                st.dataframe(
+                    inventario.drop(columns=["armario"]).rename(columns={
+                        "local": "Location",
+                        "prateleira": "Shelf",
+                        "amostras": "Specimens",
+                        "n_familias": "Families",
+                        "n_especies": "Species",
+                        "familias": "Family list",
+                        "especies": "Species list",
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+                if armario != "All" and st.button("📦 List Cabinet Specimens"):
+                    amostras_armario = indice.buscar_local(armario=armario)
+                    st.dataframe(amostras_armario, use_container_width=True)
+                    botoes_exportacao(amostras_armario, ("armario", armario), f"cabinet_{armario}", "en")
+
+                taxon_local = st.text_input("Where is it stored? Enter a family, genus or species:")
+                if st.button("🔍 Search Location"):
+                    if taxon_local:
+                        locais_taxon = indice.onde_esta(taxon_local)
+
+                        if locais_taxon.empty:
+                            st.warning("No location found for this taxon.")
+                        else:
+                            st.info(f"**{taxon_local.strip()}** is stored in {len(locais_taxon)} location(s).")
+                            st.dataframe(
+                                locais_taxon.rename(columns={"local": "Location", "amostras": "Specimens"}),
+                                use_container_width=True,
+                                hide_index=True
+                            )
                     else:
-                        st.warning("No specimen found for this species.")
+                        st.warning("Enter the taxon name before searching.")
+
+            # Duplicate Specimens
+            st.subheader("Possible Duplicates")
+            st.caption(
+                "Records with the same collector, number and collection date (or the same gathering under "
+                "another accession number). Groups scoring close to 1 are almost certain; review the others "
+                "before correcting the database."
+            )
+            limiar_duplicatas = st.slider(
+                "Minimum score", min_value=0.6, max_value=1.0, value=0.85, step=0.05,
+                key="duplicatas_limiar"
+            )
+            if st.button("🧬 Find Duplicates"):
+                with st.spinner("Comparing records..."):
+                    duplicatas = indice.duplicatas(limiar_duplicatas)
+
+                if duplicatas.empty:
+                    st.success("No probable duplicates found.")
                 else:
-                    st.warning("Enter the species name before searching.")
+                    st.info(
+                        f"**Groups:** {duplicatas['grupo'].nunique()} | "
+                        f"**Records involved:** {len(duplicatas)}"
+                    )
+                    duplicatas = duplicatas.rename(columns={
+                        "grupo": "Group",
+                        "tamanho": "Records in group",
+                        "pontuacao": "Score",
+                    })
+                    st.dataframe(duplicatas, use_container_width=True, hide_index=True)
+                    botoes_exportacao(duplicatas, ("duplicatas", limiar_duplicatas), "duplicates", "en")
+
+            # Name Checking against a local checklist
+            st.subheader("Name Checking")
+            st.caption(
+                "Checks every scientific name, genus and family of the database against a local checklist "
+                "(e.g. a WFO or Flora e Funga do Brasil export), without internet access."
+            )
+            checklist = checklist_local()
+            if checklist is None:
+                arquivo_checklist = st.file_uploader(
+                    "Checklist file (CSV, TXT or Darwin Core Archive .zip)",
+                    type=["csv", "txt", "tsv", "zip"],
+                    key="checklist_arquivo"
+                )
+                if arquivo_checklist:
+                    try:
+                        with st.spinner("Loading the checklist..."):
+                            checklist = checklist_de_arquivo(arquivo_checklist)
+                    except Exception as e:
+                        st.error(f"Could not read the checklist: {e}")
+
+            if checklist is not None:
+                st.caption(f"Checklist with {len(checklist)} names.")
+
+                if st.button("🔤 Check Names"):
+                    with st.spinner("Checking names..."):
+                        conferencia = checklist.conferir_base(df)
+                    revisao = revisar(conferencia)
+
+                    st.dataframe(
+                        pd.crosstab(conferencia["campo"], conferencia["nivel"]),
+                        use_container_width=True
+                    )
+                    if revisao.empty:
+                        st.success("Every name matches the checklist.")
+                    else:
+                        st.info(f"**Names to review:** {len(revisao)} of {len(conferencia)}")
+                        revisao = revisao.rename(columns={
+                            "campo": "Field",
+                            "nome": "Name in database",
+                            "autoria_base": "Authorship in database",
+                            "registros": "Records",
+                            "familia_base": "Family in database",
+                            "nivel": "Match",
+                            "correspondencia": "Checklist name",
+                            "autoria": "Authorship",
+                            "status": "Status",
+                            "aceito": "Accepted name",
+                            "familia": "Checklist family",
+                            "motivo": "Reason",
+                        })
+                        st.dataframe(revisao, use_container_width=True, hide_index=True)
+                        botoes_exportacao(revisao, None, "names_to_review", "en")
 
     # -----------------------------------------------
     # Data Search Page
@@ -322,63 +668,6 @@ def run():
         # -------------------------------------------------
         # Helper functions
         # -------------------------------------------------
-        def normalizar_codigo(valor):
-            """
-            Normalizes the code entered manually or read from a QR Code.
-            Accepts codes such as HUAM001245, 1245, or URLs containing the code.
-            """
-            if valor is None:
-                return ""
-
-            texto = str(valor).strip().upper()
-
-            # If the QR Code contains a URL, tries to extract HUAM + numbers
-            match_huam = re.search(r"HUAM\s*0*\d+", texto)
-            if match_huam:
-                return match_huam.group(0).replace(" ", "")
-
-            # If it contains only numbers
-            match_num = re.search(r"\d+", texto)
-            if match_num:
-                return match_num.group(0)
-
-            return texto
-
-
-        def buscar_por_tombo(df, codigo_busca):
-            """
-            Searches the accession number in the database.
-            Prioritizes collectionCode, but also accepts barcode if available.
-            """
-            codigo_busca = normalizar_codigo(codigo_busca)
-
-            colunas_possiveis = ["collectionCode", "barcode", "catalogNumber"]
-
-            col = None
-            for c in colunas_possiveis:
-                if c in df.columns:
-                    col = c
-                    break
-
-            if col is None:
-                st.error(
-                    "The database does not contain a recognized accession-number column. "
-                    "Expected: collectionCode, barcode, or catalogNumber."
-                )
-                return pd.DataFrame(), None
-
-            df = df.copy()
-            df[col] = df[col].fillna("").astype(str).str.upper().str.strip()
-
-            result = df[
-                df[col].eq(codigo_busca) |
-                df[col].str.endswith(codigo_busca) |
-                df[col].str.endswith(codigo_busca.zfill(6))
-            ]
-
-            return result, col
-
-
         def ler_qrcode(uploaded_image):
             """
             Decodes the QR Code from the image captured by st.camera_input.
@@ -398,7 +687,7 @@ def run():
             return None
 
 
-        def mostrar_dados_amostra(result):
+        def mostrar_dados_amostra(result, chave_tabela):
             """
             Displays the main data of the specimen found.
             """
@@ -451,18 +740,10 @@ def run():
                     unsafe_allow_html=True
                 )
 
-            date_parts = []
-            for f in ["dayCollected", "monthCollected", "yearCollected"]:
-                val = first.get(f)
-                if pd.notna(val):
-                    try:
-                        date_parts.append(str(int(float(val))))
-                    except Exception:
-                        date_parts.append(str(val))
-
-            if date_parts:
+            data_coleta = formatar_data(first.get("dataColeta"))
+            if data_coleta:
                 st.markdown(
-                    f"<b>Collection date:</b> {'/'.join(date_parts)}",
+                    f"<b>Collection date:</b> {data_coleta}",
                     unsafe_allow_html=True
                 )
 
@@ -473,7 +754,7 @@ def run():
                     unsafe_allow_html=True
                 )
 
-            st.dataframe(result, use_container_width=True)
+            tabela_paginada(result, chave_tabela, "en")
 
             nome_busca = ""
             if isinstance(sci, str) and sci.strip() and sci != "Undetermined":
@@ -520,7 +801,8 @@ def run():
             qr_image = st.camera_input("Capture QR Code")
 
             if qr_image is not None:
-                qr_text = ler_qrcode(qr_image)
+                with tracing.span("busca.qrcode"):
+                    qr_text = ler_qrcode(qr_image)
 
                 if qr_text:
                     codigo_lido = normalizar_codigo(qr_text)
@@ -532,9 +814,15 @@ def run():
 
                     if col_usada:
                         st.caption(f"Search performed in column: {col_usada}")
+                    else:
+                        st.error(
+                            "The database does not contain a recognized accession-number column. "
+                            "Expected: collectionCode, barcode, or catalogNumber."
+                        )
 
                     st.session_state["last_codigo"] = codigo_lido
-                    mostrar_dados_amostra(result)
+                    mostrar_dados_amostra(result, "tabela_qr")
+                    antecipar_imagens(st.connection("gsheets", type=GSheetsConnection), codigo_lido, "en")
 
                 else:
                     st.warning(
@@ -562,12 +850,23 @@ def run():
                 else:
                     code = normalizar_codigo(codigo)
                     result, col_usada = buscar_por_tombo(df, code)
+                    st.session_state["last_codigo"] = code
+                    guardar_resultado("tombo", (result, col_usada))
+                    antecipar_imagens(st.connection("gsheets", type=GSheetsConnection), code, "en")
 
-                    if col_usada:
-                        st.caption(f"Search performed in column: {col_usada}")
+            tombo_guardado = resultado_guardado("tombo")
+            if tombo_guardado is not None:
+                result, col_usada = tombo_guardado
 
-                    st.session_state["last_codigo"] = code
-                    mostrar_dados_amostra(result)
+                if col_usada:
+                    st.caption(f"Search performed in column: {col_usada}")
+                else:
+                    st.error(
+                        "The database does not contain a recognized accession-number column. "
+                        "Expected: collectionCode, barcode, or catalogNumber."
+                    )
+
+                mostrar_dados_amostra(result, "tabela_tombo")
 
             st.markdown("---")
 
@@ -579,7 +878,7 @@ def run():
             num_interno = st.text_input(
                 "Enter the internal number (block number)",
                 value="",
-                placeholder="Ex.: 321"
+                placeholder="Ex.: 321 or several: 321, 322, 400-405"
             )
 
             if st.button("🔍 Search by block"):
@@ -587,17 +886,105 @@ def run():
                     st.warning("⚠️ Your database does not contain the column 'fieldNumber'.")
 
                 else:
-                    df["fieldNumber"] = df["fieldNumber"].astype(str).str.strip()
-                    num_interno = num_interno.strip()
-                    resultado_bloco = df[df["fieldNumber"] == num_interno]
+                    blocos = separar_blocos(num_interno)
+                    guardar_resultado("bloco", (blocos,) + indice_base(st.session_state.df).buscar_blocos(blocos))
 
-                    if not resultado_bloco.empty:
-                        st.success(
-                            f"{len(resultado_bloco)} specimen(s) found with internal number '{num_interno}'."
-                        )
-                        st.dataframe(resultado_bloco, use_container_width=True)
+            bloco_guardado = resultado_guardado("bloco")
+            if bloco_guardado is not None:
+                blocos, resultado_bloco, faltando = bloco_guardado
+
+                if not resultado_bloco.empty:
+                    st.success(
+                        f"{len(resultado_bloco)} specimen(s) found with internal number '{', '.join(blocos)}'."
+                    )
+                    if faltando and len(blocos) > 1:
+                        st.warning(f"Internal numbers without specimens: {', '.join(faltando)}")
+                    tabela_paginada(resultado_bloco, "tabela_bloco", "en")
+                    botoes_exportacao(resultado_bloco, ("blocos", tuple(blocos)), "blocks", "en")
+                else:
+                    st.warning("No specimen found with this internal number.")
+
+            # -------------------------------------------------
+            # Search by collector and collection number
+            # -------------------------------------------------
+            st.subheader("🧑‍🔬 Search by collector")
+
+            col_coletor, col_ano = st.columns([3, 1])
+            with col_coletor:
+                consulta_coletor = st.text_input(
+                    "Collector and collection number",
+                    value="",
+                    placeholder="E.g.: Ducke 1234 or just Ducke"
+                )
+            with col_ano:
+                ano_coletor = st.text_input("Year (optional)", value="", placeholder="E.g.: 1985")
+
+            if st.button("🔍 Search by collector"):
+                if not consulta_coletor.strip():
+                    st.warning("Enter the collector name before searching.")
+
+                elif "recordedBy" not in df.columns:
+                    st.warning("⚠️ Your database does not contain the column 'recordedBy'.")
+
+                else:
+                    indice = indice_base(st.session_state.df)
+                    try:
+                        guardar_resultado("coletor", (
+                            (consulta_coletor.strip(), ano_coletor.strip()),
+                            indice.buscar_coletor(consulta_coletor, ano_coletor.strip() or None)
+                        ))
+                    except ValueError:
+                        st.warning("⚠️ Invalid year: use, for example, 1985.")
+
+            coletor_guardado = resultado_guardado("coletor")
+            if coletor_guardado is not None:
+                (nome_coletor, ano_busca), resultado_coletor = coletor_guardado
+
+                if not resultado_coletor.empty:
+                    st.success(f"{len(resultado_coletor)} specimen(s) found for '{nome_coletor}'.")
+                    tabela_paginada(resultado_coletor, "tabela_coletor", "en")
+                    botoes_exportacao(resultado_coletor, ("coletor", nome_coletor, ano_busca), "collector", "en")
+                else:
+                    st.warning("No specimen found for this collector.")
+
+            # -------------------------------------------------
+            # Free-text search across all fields
+            # -------------------------------------------------
+            st.subheader("🔤 Free-text search")
+
+            consulta_livre = st.text_input(
+                "Search terms (all fields)",
+                value="",
+                placeholder="E.g.: Ducke Lauraceae or locality:Ducke family:Lauraceae",
+                help="Accents and case are ignored. Use field:value to restrict a term to one column "
+                     "and quotes for values with spaces, such as locality:\"Reserva Ducke\"."
+            )
+
+            if st.button("🔍 Free-text search"):
+                if not consulta_livre.strip():
+                    st.warning("Enter at least one term before searching.")
+
+                else:
+                    try:
+                        indice_texto = indice_base(st.session_state.df).texto
+                        total_livre = indice_texto.contar(consulta_livre)
+                        resultado_livre = indice_texto.buscar(consulta_livre)
+                    except ValueError as e:
+                        st.warning(f"Invalid query: {e}")
                     else:
-                        st.warning("No specimen found with this internal number.")              
+                        if total_livre:
+                            st.success(
+                                f"{total_livre} specimen(s) found; "
+                                f"showing the {len(resultado_livre)} most relevant."
+                            )
+                            st.dataframe(resultado_livre, use_container_width=True)
+                            # The export holds every match, not only the displayed ones
+                            botoes_exportacao(
+                                indice_texto.buscar(consulta_livre, limite=None),
+                                ("livre", consulta_livre.strip()), "free_text_search", "en"
+                            )
+                        else:
+                            st.warning("No specimen found for this search.")
 
     # -----------------------------------------------
     # Image Lookup + Pl@ntNet
@@ -610,181 +997,37 @@ def run():
             "Enter the accession number to view the specimen image and receive the list of probable species."
         )
 
-        # -------------------------------------------------
-        # General settings
-        # -------------------------------------------------
-        DRIVE_TIMEOUT = (10, 30)
-        PLANTNET_TIMEOUT = (10, 60)
-        MAX_TENTATIVAS = 3
-        PLANTNET_PROJECT = "all"
-        PLANTNET_URL = f"https://my-api.plantnet.org/v2/identify/{PLANTNET_PROJECT}"
-
         # -------------------------------------------------
         # Load database
         # -------------------------------------------------
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        df = conn.read(worksheet="Image", ttl="10m")
+        # Drive ids parsed once per worksheet; the loops below only see valid links
+        df = planilha_imagens(st.connection("gsheets", type=GSheetsConnection))
+        resumo_links(df, "en")
 
-        df = df[~df["Subpasta"].astype(str).str.contains("Fotos exsicatas Mike", na=False)]
+        # The English page keeps its own, shorter timeouts
+        # ((connect, read) seconds; biocurate.images defaults to (15, 60) / (30, 120))
+        DRIVE_TIMEOUT = (10, 30)
+        PLANTNET_TIMEOUT = (10, 60)
 
         # -------------------------------------------------
         # Helper functions
         # -------------------------------------------------
-        def redigir_api_key(texto):
-            """
-            Removes the API key from any error message before displaying it in the interface.
-            """
-            if texto is None:
-                return ""
-
-            texto = str(texto)
-            texto = re.sub(r"(api-key=)[^&\s]+", r"\1[REDACTED]", texto)
-            texto = re.sub(r'("api-key"\s*:\s*")[^"]+(")', r'\1[REDACTED]\2', texto)
-            return texto
-
-
-        def drive_link_to_file_id(link):
-            """
-            Extracts the file_id from a Google Drive link.
-            Accepts links in the format /file/d/ID/view, /d/ID, or URLs with ?id=.
-            """
-            if not isinstance(link, str):
-                return None
-
-            try:
-                if "/d/" in link:
-                    return link.split("/d/")[1].split("/")[0]
-
-                if "id=" in link:
-                    return link.split("id=")[1].split("&")[0]
-
-            except Exception:
-                return None
-
-            return None
-
-
-        def download_drive_image(file_id):
-            """
-            Downloads the image from Google Drive with an explicit timeout.
-            """
-            url = f"https://drive.google.com/uc?export=view&id={file_id}"
-
-            try:
-                response = requests.get(url, timeout=DRIVE_TIMEOUT)
-
-            except requests.exceptions.Timeout:
-                raise RuntimeError("Timeout while downloading the image from Google Drive.")
-
-            except requests.exceptions.RequestException:
-                raise RuntimeError("Network error while accessing Google Drive.")
-
-            if response.status_code != 200:
-                raise RuntimeError(
-                    f"Could not load the image from Drive. HTTP status: {response.status_code}"
-                )
-
-            content_type = response.headers.get("Content-Type", "")
-
-            if "image" not in content_type.lower():
-                raise RuntimeError(
-                    "The Google Drive link did not return a valid image. "
-                    "Check whether the file is publicly shared or accessible by the app."
-                )
-
-            return response.content
-
-
-        def preparar_imagem_para_plantnet(image_bytes, max_size_mb=45):
+        def identificar_amostra(image_bytes, organ="auto", chave_cache=None):
             """
-            Opens the image, fixes EXIF orientation, converts it to RGB, and generates a JPEG.
-            Keeps a safety margin below the 50 MB limit accepted by Pl@ntNet.
+            Sends the image to Pl@ntNet with the API key from st.secrets,
+            warning on the page after each failed attempt.
             """
             try:
-                img = Image.open(BytesIO(image_bytes))
-                img = ImageOps.exif_transpose(img)
-                img = img.convert("RGB")
-
-            except Exception:
-                raise RuntimeError("Error opening or converting the image.")
-
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=90, optimize=True)
-            prepared_bytes = buffer.getvalue()
-
-            max_size_bytes = max_size_mb * 1024 * 1024
-
-            if len(prepared_bytes) > max_size_bytes:
-                img.thumbnail((2500, 2500))
-                buffer = BytesIO()
-                img.save(buffer, format="JPEG", quality=85, optimize=True)
-                prepared_bytes = buffer.getvalue()
-
-            if len(prepared_bytes) > 50 * 1024 * 1024:
-                raise RuntimeError("The image exceeds 50 MB, the maximum limit accepted by Pl@ntNet.")
-
-            return img, prepared_bytes
-
-
-        def identificar_com_plantnet(image_bytes, organ="auto"):       
-            try:
-                API_KEY = st.secrets["plantnet"]["api_key"]
+                api_key = st.secrets["plantnet"]["api_key"]
             except KeyError:
                 raise RuntimeError("Pl@ntNet API key not found in st.secrets.")
 
-            params = {
-                "api-key": API_KEY,
-                "nb-results": 5,
-                "lang": "en"
-            }
-
-            data = None
-            if organ and organ != "auto":
-                data = {
-                    "organs": [organ]
-                }
-
-            ultimo_erro_tipo = None
-
-            for tentativa in range(1, MAX_TENTATIVAS + 1):
-                try:
-                    # Recriar BytesIO e files a cada tentativa.
-                    # This prevents the file from being resent empty after a failure.
-                    files = [
-                        ("images", ("image.jpg", BytesIO(image_bytes), "image/jpeg"))
-                    ]
-
-                    response = requests.post(
-                        PLANTNET_URL,
-                        params=params,
-                        files=files,
-                        data=data,
-                        timeout=PLANTNET_TIMEOUT
-                    )
-
-                    return response
-
-                except requests.exceptions.ConnectTimeout:
-                    ultimo_erro_tipo = "ConnectTimeout"
-                    st.warning(f"Attempt {tentativa}: connection timeout with Pl@ntNet.")
-
-                except requests.exceptions.ReadTimeout:
-                    ultimo_erro_tipo = "ReadTimeout"
-                    st.warning(f"Attempt {tentativa}: Pl@ntNet connected but took too long to respond.")
+            def avisar_falha(tentativa, tipo_erro):
+                st.warning(MENSAGENS["en"][f"tentativa_{tipo_erro}"].format(tentativa=tentativa))
 
-                except requests.exceptions.ConnectionError:
-                    ultimo_erro_tipo = "ConnectionError"
-                    st.warning(f"Attempt {tentativa}: connection error with Pl@ntNet.")
-
-                except requests.exceptions.RequestException:
-                    ultimo_erro_tipo = "RequestException"
-                    st.warning(f"Attempt {tentativa}: request failure to Pl@ntNet.")
-
-                time.sleep(3 * tentativa)
-
-            raise RuntimeError(
-                f"Could not connect to Pl@ntNet after {MAX_TENTATIVAS} attempts. "
-                f"Last error type: {ultimo_erro_tipo}."
+            return identificar_com_plantnet(
+                image_bytes, api_key, organ=organ, ao_falhar=avisar_falha, chave_cache=chave_cache,
+                timeout=PLANTNET_TIMEOUT
             )
 
 
@@ -798,7 +1041,7 @@ def run():
                 except Exception:
                     error_detail = response.text
 
-                error_detail = redigir_api_key(error_detail)
+                error_detail = redigir_api_key(error_detail, "en")
 
                 st.error(f"Pl@ntNet API error: {response.status_code}")
                 with st.expander("Technical details"):
@@ -894,7 +1137,8 @@ def run():
 
         codigo = st.text_input(
             "Enter the accession number",
-            value="",
+            # The code last looked up on the Search page, whose images are prefetched
+            value=st.session_state.get("last_codigo", ""),
             placeholder="e.g., HUAM001245 or only 1245",
             key="tombo_input"
         )
@@ -909,20 +1153,22 @@ def run():
             )
         )
 
+        recortar_planta = st.checkbox(
+            "✂️ Crop the plant automatically",
+            value=True,
+            help=(
+                "Separates the plant from the paper, covers the label, scale bar and colour chart and sends "
+                "a few crops of the plant in a single identification, instead of the whole sheet."
+            )
+        )
+
         if st.button("🔍 Search by Accession Number", key="buscar_tombo", use_container_width=True):
             if not codigo:
                 st.warning("Enter an accession number to search.")
 
             else:
-                col_codigo = "barcode"
-                df[col_codigo] = df[col_codigo].astype(str).str.upper()
                 codigo_busca = codigo.strip().upper()
-
-                resultado = df[
-                    df[col_codigo].eq(codigo_busca) |
-                    df[col_codigo].str.endswith(codigo_busca) |
-                    df[col_codigo].str.endswith(codigo_busca.zfill(6))
-                ]
+                resultado = buscar_imagens_por_tombo(df, codigo_busca)
 
                 if resultado.empty:
                     st.session_state.result_image = None
@@ -932,19 +1178,25 @@ def run():
                     st.session_state.result_image = resultado
                     st.success(f"{len(resultado)} result(s) found:")
 
-                    for _, row in st.session_state.result_image.iterrows():
-                        file_id = drive_link_to_file_id(row.get("UrlExsicata"))
+                    invalidos = resultado[~resultado["link_valido"]]
+                    if not invalidos.empty:
+                        st.warning(
+                            "Invalid Drive link for accession number(s): "
+                            + ", ".join(invalidos["barcode"].astype(str))
+                        )
 
-                        if not file_id:
-                            st.warning("Invalid Drive link.")
-                            continue
+                    for _, row in resultado[resultado["link_valido"]].iterrows():
+                        file_id = row["file_id"]
 
                         try:
-                            image_raw_bytes = download_drive_image(file_id)
+                            aguardar(file_id)
+                            image_raw_bytes = download_drive_image(file_id, timeout=DRIVE_TIMEOUT)
                             img, image_prepared_bytes = preparar_imagem_para_plantnet(image_raw_bytes)
+                            recortes = recortar_exsicata(img) if recortar_planta else []
+                            indice_hashes().registrar(file_id, img)
 
                         except Exception as e:
-                            st.error(f"Error loading/preparing the image: {redigir_api_key(e)}")
+                            st.error(f"Error loading/preparing the image: {mensagem_erro(e, 'en')}")
                             continue
 
                         col1, col2 = st.columns([2, 1])
@@ -956,6 +1208,9 @@ def run():
                                 caption=row.get("ArchiveName", "Specimen image"),
                                 use_container_width=True
                             )
+                            if recortes:
+                                st.caption("Crops sent to Pl@ntNet:")
+                                st.image([dados for _, dados in recortes], width=160)
 
                         with col2:
                             st.subheader("Specimen Information")
@@ -970,18 +1225,31 @@ def run():
 
                             st.write(f"**URL:** [Open original image]({row.get('UrlExsicata')})")
 
+                            semelhantes = indice_hashes().semelhantes(file_id)
+                            if semelhantes:
+                                nomes = dict(zip(df["file_id"], df["ArchiveName"]))
+                                st.warning(
+                                    "Possible repeated scans of this image:\n\n" + "\n".join(
+                                        f"- {nomes.get(outro, outro)} ({distancia})" for outro, distancia in semelhantes
+                                    )
+                                )
+
                         st.info("Sending to Pl@ntNet...")
 
                         try:
-                            plantnet_response = identificar_com_plantnet(
-                                image_prepared_bytes,
-                                organ=organ_option
+                            # The plant crops in one identification, or the whole sheet
+                            plantnet_response = identificar_amostra(
+                                [dados for _, dados in recortes] or image_prepared_bytes,
+                                organ=organ_option,
+                                chave_cache=chave_identificacao(file_id, organ_option, recortar_planta)
                             )
 
                             mostrar_resultados_plantnet(plantnet_response)
 
                         except Exception as e:
-                            st.error(f"Error connecting to/processing the Pl@ntNet response: {redigir_api_key(e)}")
+                            st.error(f"Error connecting to/processing the Pl@ntNet response: {mensagem_erro(e, 'en')}")
+
+                        exsicatas_parecidas(df, file_id, img, "en")
 
 
         # -------------------------------------------------
@@ -1000,14 +1268,7 @@ def run():
                 st.warning("Enter a family or species name to search.")
 
             else:
-                taxon_busca = taxon_input.strip().upper()
-
-                resultado_taxon = df[
-                    (df["family"].astype(str).str.upper() == taxon_busca) |
-                    (df["scientificName"].astype(str).str.upper() == taxon_busca) |
-                    (df["family"].astype(str).str.upper().str.contains(taxon_busca, na=False)) |
-                    (df["scientificName"].astype(str).str.upper().str.contains(taxon_busca, na=False))
-                ]
+                resultado_taxon = buscar_por_taxon(df, taxon_input)
 
                 if resultado_taxon.empty:
                     st.warning(f"No image found for the taxon: {taxon_input}")
@@ -1038,7 +1299,7 @@ def run():
 
                     st.subheader("Image Gallery")
 
-                    items = list(resultado_taxon.iterrows())
+                    items = list(resultado_taxon[resultado_taxon["link_valido"]].iterrows())
 
                     for i in range(0, len(items), 4):
                         cols = st.columns(4)
@@ -1048,19 +1309,17 @@ def run():
                                 continue
 
                             _, row = items[i + j]
-                            file_id = drive_link_to_file_id(row.get("UrlExsicata"))
+                            file_id = row["file_id"]
 
                             with cols[j]:
-                                if not file_id:
-                                    st.warning("Invalid link")
-                                    continue
-
                                 try:
-                                    image_raw_bytes = download_drive_image(file_id)
-                                    img, _ = preparar_imagem_para_plantnet(image_raw_bytes)
+                                    # Visually identical scans share one cached thumbnail
+                                    indice = indice_hashes()
+                                    miniatura = miniatura_drive(file_id, chave=indice.representante(file_id), timeout=DRIVE_TIMEOUT)
+                                    indice.registrar(file_id, miniatura)
 
                                     st.image(
-                                        img,
+                                        miniatura,
                                         caption=f"{row.get('barcode', '')}",
                                         use_container_width=True
                                     )
@@ -1081,7 +1340,23 @@ def run():
                                 except Exception:
                                     st.error("Error loading image")
 
+        # -------------------------------------------------
+        # Repeated scans
+        # -------------------------------------------------
+        st.subheader("🧬 Repeated scans")
+        st.write(
+            "Find worksheet images that are the same sheet scanned again or copied into another subfolder. "
+            "Visually identical images share the thumbnail and any Pl@ntNet identification already obtained."
+        )
+        painel_repetidas(df, "en")
+
         # -------------------------------------------------
         # Pl@ntNet attribution
         # -------------------------------------------------
         mostrar_logo_plantnet()
+
+    # -----------------------------------------------
+    # Performance diagnostics (admin only, ?admin=<token>)
+    # -----------------------------------------------
+    if eh_admin():
+        painel_diagnostico("en")
@@ -0,0 +1,45 @@
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from biocurate.recorte import recortar_exsicata
+
+
+PAPEL = (235, 230, 215)
+VERDE = (60, 140, 50)
+CINZA_ESCURO = (45, 45, 45)
+
+
+def _exsicata():
+    """Sheet with a green branch, a dark dried leaf joined to it and a label."""
+    rgb = np.full((1800, 1200, 3), PAPEL, dtype=np.uint8)
+    cv2.line(rgb, (300, 1300), (800, 400), VERDE, 14)
+    for x, y in ((420, 1080), (560, 830), (690, 600)):
+        cv2.ellipse(rgb, (x, y), (90, 35), -30, 0, 360, VERDE, -1)
+    # Dark leaf at the tip of the branch
+    cv2.ellipse(rgb, (860, 330), (100, 45), -30, 0, 360, CINZA_ESCURO, -1)
+    # Label: dark text block away from the plant
+    cv2.rectangle(rgb, (750, 1550), (1100, 1700), CINZA_ESCURO, -1)
+    return Image.fromarray(rgb)
+
+
+def _escuros(dados):
+    rgb = np.asarray(Image.open(BytesIO(dados)).convert("RGB")).astype(int)
+    return int((np.abs(rgb - CINZA_ESCURO).max(axis=2) < 20).sum())
+
+
+def test_folha_escura_encostada_na_planta_fica_no_recorte():
+    recortes = recortar_exsicata(_exsicata())
+
+    caixa, dados = recortes[0]
+    x0, y0, x1, y1 = caixa
+    assert x1 > 860 and y0 < 330
+    # The dark leaf (about 14k pixels at full size) is still in the crop
+    assert _escuros(dados) > 5000
+
+
+def test_etiqueta_longe_da_planta_fica_fora_do_recorte():
+    for caixa, _ in recortar_exsicata(_exsicata()):
+        assert caixa[3] < 1550